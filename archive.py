@@ -0,0 +1,173 @@
+import json
+import os
+import logging
+import threading
+from collections import OrderedDict
+
+from records import encode_record, decode_record
+
+logger = logging.getLogger('InsuranceBot')
+
+# Sammlungen, deren abgeschlossene Datensätze ins kalte Archiv wandern
+ARCHIVE_COLLECTIONS = ("customers", "invoices")
+
+
+def is_archivable(collection, record):
+    """Prüft, ob ein Datensatz abgeschlossen ist und ins kalte Archiv gehört"""
+    if collection == "customers":
+        return record.status == "archiviert"
+    if collection == "invoices":
+        return bool(record.archived)
+    return False
+
+
+class ArchiveView:
+    """Lesende Sicht auf eine Sammlung des Archivs, dient den heißen Sammlungen als Fallback"""
+
+    def __init__(self, archive, collection):
+        self._archive = archive
+        self._collection = collection
+
+    def __contains__(self, key):
+        return self._archive.contains(self._collection, key)
+
+    def __len__(self):
+        return self._archive.count(self._collection)
+
+    def get(self, key, default=None):
+        return self._archive.get(self._collection, key, default)
+
+
+class ColdArchive:
+    """Kalter Speicher für abgeschlossene Datensätze.
+
+    Je Sammlung eine Datei mit einer Zeile ``<key>\\t<json>`` pro Datensatz.
+    Im Speicher liegt nur ein Index ``key -> Byte-Offset``; Datensätze werden
+    erst beim Zugriff gelesen und in einem kleinen LRU-Cache gehalten, damit
+    wiederholte Zugriffe dasselbe Objekt liefern. Wird ein Datensatz erneut
+    archiviert, zählt die neueste Zeile; veraltete Zeilen werden beim
+    Verdichten entfernt.
+    """
+
+    def __init__(self, directory, cache_size=256):
+        self.directory = directory
+        self.cache_size = cache_size
+        self._lock = threading.Lock()
+        self._cache = OrderedDict()
+        self._index = {}
+        self._dead = {}
+        self._readers = {}
+        self._writers = {}
+        os.makedirs(directory, exist_ok=True)
+        for collection in ARCHIVE_COLLECTIONS:
+            self._open(collection)
+
+    def _path(self, collection):
+        return os.path.join(self.directory, f"{collection}.jsonl")
+
+    def _open(self, collection):
+        path = self._path(collection)
+        index = {}
+        dead = 0
+        valid_size = 0
+        if os.path.exists(path):
+            with open(path, 'rb') as f:
+                for line in f:
+                    if not line.endswith(b"\n") or b"\t" not in line:
+                        break
+                    key = line[:line.index(b"\t")].decode('utf-8')
+                    if key in index:
+                        dead += 1
+                    index[key] = valid_size
+                    valid_size += len(line)
+            if valid_size != os.path.getsize(path):
+                logger.warning(f"Unvollständiger Archiv-Eintrag in {path} bei Byte {valid_size} verworfen")
+                with open(path, 'r+b') as f:
+                    f.truncate(valid_size)
+        self._index[collection] = index
+        self._dead[collection] = dead
+        self._writers[collection] = open(path, 'ab')
+        self._readers[collection] = open(path, 'rb')
+
+    def view(self, collection):
+        """Gibt die Fallback-Sicht für eine Sammlung zurück (``None``, falls sie nicht archiviert wird)"""
+        return ArchiveView(self, collection) if collection in ARCHIVE_COLLECTIONS else None
+
+    def files(self):
+        return [self._path(collection) for collection in ARCHIVE_COLLECTIONS if os.path.exists(self._path(collection))]
+
+    def contains(self, collection, key):
+        return key in self._index[collection]
+
+    def count(self, collection):
+        return len(self._index[collection])
+
+    def get(self, collection, key, default=None):
+        with self._lock:
+            cached = self._cache.get((collection, key))
+            if cached is not None:
+                self._cache.move_to_end((collection, key))
+                return cached
+            offset = self._index[collection].get(key)
+            if offset is None:
+                return default
+            reader = self._readers[collection]
+            reader.seek(offset)
+            record = decode_record(collection, json.loads(reader.readline().split(b"\t", 1)[1]))
+            self._remember(collection, key, record)
+            return record
+
+    def _remember(self, collection, key, record):
+        self._cache[(collection, key)] = record
+        self._cache.move_to_end((collection, key))
+        while len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
+
+    def encode(self, records):
+        """Kodiert ``(key, Datensatz)``-Paare; läuft im Event-Loop, damit der Stand konsistent ist"""
+        return [
+            (key, record, f"{key}\t{json.dumps(encode_record(record), ensure_ascii=False, separators=(',', ':'))}\n".encode('utf-8'))
+            for key, record in records
+        ]
+
+    def add(self, collection, encoded):
+        """Hängt mit ``encode`` kodierte Datensätze dauerhaft an das Archiv an"""
+        with self._lock:
+            writer = self._writers[collection]
+            writer.seek(0, os.SEEK_END)
+            offset = writer.tell()
+            writer.write(b"".join(line for _, _, line in encoded))
+            writer.flush()
+            os.fsync(writer.fileno())
+            index = self._index[collection]
+            for key, record, line in encoded:
+                if key in index:
+                    self._dead[collection] += 1
+                index[key] = offset
+                offset += len(line)
+                self._remember(collection, key, record)
+            if self._dead[collection] > max(1000, len(index)):
+                self._compact(collection)
+
+    def _compact(self, collection):
+        """Schreibt nur die jeweils neueste Zeile je Schlüssel neu"""
+        path = self._path(collection)
+        reader = self._readers[collection]
+        with open(path + ".tmp", 'wb') as f:
+            for offset in sorted(self._index[collection].values()):
+                reader.seek(offset)
+                f.write(reader.readline())
+            f.flush()
+            os.fsync(f.fileno())
+        self._writers[collection].close()
+        reader.close()
+        os.replace(path + ".tmp", path)
+        self._open(collection)
+        logger.info(f"Archiv {collection} verdichtet ({len(self._index[collection])} Datensätze)")
+
+    def close(self):
+        with self._lock:
+            for handle in (*self._readers.values(), *self._writers.values()):
+                handle.close()
+            self._readers = {}
+            self._writers = {}
@@ -0,0 +1,344 @@
+"""Voll- und differenzielle Backups des Datenbestands.
+
+Wiederherstellen ohne laufenden Bot:
+``python backups.py list [--dir backups]`` und
+``python backups.py restore <backup> [--dir backups] [-o insurance_data.json]``.
+Die erzeugte Datei kann per ``/reload`` eingespielt werden.
+``python backups.py prune`` wendet die Aufbewahrungsregeln sofort an.
+"""
+import argparse
+import hashlib
+import json
+import os
+import logging
+import tempfile
+import threading
+import time
+import zipfile
+from collections.abc import Mapping
+
+from records import encode_record
+from serializers import PRETTY_JSON, format_for_path
+
+logger = logging.getLogger('InsuranceBot')
+
+CHAIN_FILE = "chain.json"
+OBJECTS_DIR = "objects"
+# Aufbewahrung nach dem Großvater-Vater-Sohn-Prinzip: jeweils das neueste Backup je Stunde, Tag und Woche
+RETENTION = {"hourly": 24, "daily": 7, "weekly": 8}
+BUCKETS = {"hourly": "%Y%m%d%H", "daily": "%Y%m%d", "weekly": "%G%V"}
+
+
+def _hash_file(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def build_zip(files, part_size, spool_size=8 * 2**20):
+    """Packt ``(pfad, name im Archiv)``-Paare in ein ZIP und teilt es in Teile von höchstens ``part_size`` Bytes.
+
+    Für einen Worker-Thread gedacht. Geschrieben wird in temporäre Dateien, die
+    erst ab ``spool_size`` Bytes auf die Platte ausweichen; der Speicherbedarf
+    bleibt damit unabhängig von der Datenmenge begrenzt. Die Teile sind reine
+    Byte-Abschnitte (``cat backup.zip.* > backup.zip``). Gibt die zurückgespulten
+    Dateien zurück; der Aufrufer schließt sie.
+    """
+    archive = tempfile.SpooledTemporaryFile(max_size=spool_size)
+    with zipfile.ZipFile(archive, "w", zipfile.ZIP_DEFLATED) as zip_file:
+        for path, arcname in files:
+            if os.path.exists(path):
+                zip_file.write(path, arcname=arcname)
+    size = archive.seek(0, os.SEEK_END)
+    archive.seek(0)
+    if size <= part_size:
+        return [archive]
+    parts = []
+    with archive:
+        while archive.tell() < size:
+            part = tempfile.SpooledTemporaryFile(max_size=spool_size)
+            remaining = part_size
+            while remaining:
+                chunk = archive.read(min(remaining, 1 << 20))
+                if not chunk:
+                    break
+                part.write(chunk)
+                remaining -= len(chunk)
+            part.seek(0)
+            parts.append(part)
+    return parts
+
+
+def apply_diff(data, diff):
+    """Spielt ein differenzielles Backup auf einen vollständigen Bestand ein"""
+    for name, records in diff.items():
+        if name == "_meta":
+            continue
+        collection = data.setdefault(name, {})
+        for key, value in records.items():
+            if value is None:
+                collection.pop(key, None)
+            else:
+                collection[key] = value
+    data["_meta"] = dict(diff["_meta"], kind="full")
+    return data
+
+
+class BackupChain:
+    """Kette aus Voll- und differenziellen Backups in einem Verzeichnis.
+
+    Ein Vollbackup ist ein Export des gesamten Bestands. Ein differenzielles
+    Backup enthält nur die seit dem letzten Vollbackup geänderten Datensätze
+    (gelöschte als ``None``); jeder Stand lässt sich also aus seinem
+    Vollbackup plus höchstens einem differenziellen Backup herstellen.
+    Ein neues Vollbackup entsteht nach ``full_every`` Backups, wenn mehr als
+    ``full_ratio`` des Bestands geändert wurde oder die Änderungsliste des
+    Speichers unvollständig ist (Neustart, ``/reload``). ``chain.json``
+    verzeichnet alle Backups der Kette.
+
+    Die Dateien liegen inhaltsadressiert unter ``objects/`` (SHA-256):
+    identische Backups teilen sich eine Datei. Nach jedem Backup werden nur
+    die nach ``retention`` aufzubewahrenden Backups (plus deren Vollbackups)
+    behalten; Dateien, auf die kein Backup mehr verweist, werden gelöscht.
+    Listen und Aufräumen arbeiten allein auf ``chain.json``.
+
+    Mit ``adopt=False`` (nur lesende Werkzeuge) bleibt das Verzeichnis
+    unverändert; Backup-Dateien älterer Versionen werden dann nicht übernommen.
+    """
+
+    def __init__(self, directory, snapshot_format, full_every=8, full_ratio=0.5, retention=None, adopt=True):
+        self.directory = directory
+        self.format = snapshot_format
+        self.full_every = full_every
+        self.full_ratio = full_ratio
+        self.retention = dict(RETENTION, **(retention or {}))
+        self._lock = threading.Lock()
+        self.entries = self._read_chain()
+        if adopt:
+            os.makedirs(os.path.join(directory, OBJECTS_DIR), exist_ok=True)
+            self._adopt_files()
+
+    def _chain_path(self):
+        return os.path.join(self.directory, CHAIN_FILE)
+
+    def _read_chain(self):
+        try:
+            with open(self._chain_path(), 'r', encoding='utf-8') as f:
+                return json.load(f)["backups"]
+        except FileNotFoundError:
+            return []
+
+    def _write_chain(self):
+        tmp_path = self._chain_path() + ".tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({"backups": self.entries}, f, indent=4, ensure_ascii=False)
+        os.replace(tmp_path, self._chain_path())
+
+    def _store_object(self, path, suffix):
+        """Legt eine fertige Datei unter ihrem Hash ab; ist der Inhalt schon vorhanden, wird sie verworfen"""
+        digest = _hash_file(path)
+        name = os.path.join(digest[:2], digest + suffix)
+        target = os.path.join(self.directory, OBJECTS_DIR, name)
+        duplicate = os.path.exists(target)
+        if duplicate:
+            os.remove(path)
+        else:
+            os.makedirs(os.path.dirname(target), exist_ok=True)
+            os.replace(path, target)
+        return {"object": name, "size": os.path.getsize(target)}, duplicate
+
+    def loose_files(self):
+        """Backup-Dateien, die noch direkt im Verzeichnis liegen (ältere Versionen) und nicht im Objektspeicher"""
+        if not os.path.isdir(self.directory):
+            return []
+        return [
+            filename for filename in sorted(os.listdir(self.directory))
+            if filename.startswith("backup_") and not filename.endswith(".tmp")
+            and os.path.isfile(os.path.join(self.directory, filename))
+        ]
+
+    def _adopt_files(self):
+        """Übernimmt Backup-Dateien, die noch direkt im Verzeichnis liegen (ältere Versionen), in den Objektspeicher"""
+        known = {entry["name"]: entry for entry in self.entries}
+        adopted = duplicates = 0
+        for filename in self.loose_files():
+            path = os.path.join(self.directory, filename)
+            entry = known.get(filename)
+            if entry is None:
+                # Frühere Vollkopien ohne Eintrag in der Kette
+                entry = {"name": filename, "kind": "full", "base": filename, "generation": None}
+                self.entries.append(entry)
+            entry["created"] = entry.get("created", os.path.getmtime(path))
+            stored, duplicate = self._store_object(path, format_for_path(filename).suffix)
+            entry.update(stored)
+            adopted += 1
+            duplicates += duplicate
+        if adopted:
+            self.entries.sort(key=lambda entry: entry["created"])
+            self._write_chain()
+            logger.info(f"{adopted} Backup-Dateien in den Objektspeicher übernommen ({duplicates} Duplikate)")
+
+    def _object_path(self, entry):
+        return os.path.join(self.directory, OBJECTS_DIR, entry["object"])
+
+    def last_full(self):
+        return next((entry for entry in reversed(self.entries) if entry["kind"] == "full"), None)
+
+    def path(self, name):
+        return os.path.join(self.directory, name)
+
+    def plan(self, store, timestamp):
+        """Legt im Event-Loop fest, was gesichert wird; ``write`` führt den Plan später im Thread aus.
+
+        Differenzielle Backups werden hier bereits kodiert, damit sie einen
+        konsistenten Stand zeigen; der Aufwand hängt nur von der Zahl der Änderungen ab.
+        Der aktuelle Stand muss bereits geschrieben sein (``save_data`` und ``durable``).
+        """
+        changes = store.changes
+        base = self.last_full()
+        with self._lock:
+            since_full = sum(1 for entry in self.entries if base and entry["base"] == base["name"])
+        full = (
+            base is None or changes is None or not changes.complete
+            or changes.since != base["generation"] or since_full >= self.full_every
+        )
+        if not full:
+            total = sum(len(collection) for collection in store.data.values() if isinstance(collection, Mapping))
+            full = changes.count() > self.full_ratio * max(total, 1)
+        if full:
+            name = f"backup_{timestamp}_full{self.format.suffix}"
+            if changes is not None:
+                changes.reset(store.generation)
+            return {"name": name, "kind": "full", "base": name, "generation": store.generation}
+        diff = {}
+        for collection, keys in changes.keys.items():
+            records = store.data[collection]
+            diff[collection] = {}
+            for key in keys:
+                value = records.get_hot(key)
+                diff[collection][key] = None if value is None else encode_record(value)
+        diff["_meta"] = {"generation": store.generation, "kind": "diff", "base": base["name"], "since": base["generation"]}
+        return {
+            "name": f"backup_{timestamp}_diff{self.format.suffix}", "kind": "diff", "base": base["name"],
+            "generation": store.generation, "records": changes.count(), "payload": diff,
+        }
+
+    def write(self, store, plan):
+        """Schreibt ein mit ``plan`` vorbereitetes Backup, trägt es in die Kette ein und räumt auf"""
+        tmp_path = self.path(plan["name"] + ".tmp")
+        if plan["kind"] == "full":
+            store.export(tmp_path, self.format)
+        else:
+            self.format.dump(tmp_path, plan["payload"])
+        entry = {key: value for key, value in plan.items() if key != "payload"}
+        entry["created"] = time.time()
+        with self._lock:
+            stored, duplicate = self._store_object(tmp_path, self.format.suffix)
+            entry.update(stored)
+            self.entries.append(entry)
+            removed, reclaimed = self._prune()
+            self._write_chain()
+        state = "identisch mit vorhandenem Backup" if duplicate else f"{entry['size'] / 1024:.0f} KB"
+        logger.info(f"Backup {plan['name']} geschrieben ({plan['kind']}, {state})")
+        if removed:
+            logger.info(f"{removed} alte Backups entfernt, {reclaimed / 2**20:.1f} MB freigegeben")
+        return self._object_path(entry)
+
+    def retained(self):
+        """Gibt die Namen der Backups zurück, die nach den Aufbewahrungsregeln bleiben"""
+        ordered = sorted(self.entries, key=lambda entry: entry["created"], reverse=True)
+        keep = {entry["name"] for entry in ordered[:1]}
+        for rule, count in self.retention.items():
+            buckets = set()
+            for entry in ordered:
+                if len(buckets) >= count:
+                    break
+                bucket = time.strftime(BUCKETS[rule], time.localtime(entry["created"]))
+                if bucket not in buckets:
+                    buckets.add(bucket)
+                    keep.add(entry["name"])
+        # Differenzielle Backups brauchen ihr Vollbackup
+        keep |= {entry["base"] for entry in self.entries if entry["name"] in keep}
+        return keep
+
+    def _prune(self):
+        keep = self.retained()
+        removed = [entry for entry in self.entries if entry["name"] not in keep]
+        if not removed:
+            return 0, 0
+        self.entries = [entry for entry in self.entries if entry["name"] in keep]
+        referenced = {entry["object"] for entry in self.entries}
+        reclaimed = 0
+        for obj in {entry["object"] for entry in removed} - referenced:
+            path = os.path.join(self.directory, OBJECTS_DIR, obj)
+            try:
+                reclaimed += os.path.getsize(path)
+                os.remove(path)
+            except FileNotFoundError:
+                continue
+        return len(removed), reclaimed
+
+    def prune(self):
+        """Wendet die Aufbewahrungsregeln an; gibt ``(entfernte Backups, freigegebene Bytes)`` zurück"""
+        with self._lock:
+            result = self._prune()
+            self._write_chain()
+        return result
+
+    def disk_usage(self):
+        """Gibt ``(Summe aller Backups, tatsächlich belegter Platz)`` in Bytes zurück"""
+        objects = {entry["object"]: entry["size"] for entry in self.entries}
+        return sum(entry["size"] for entry in self.entries), sum(objects.values())
+
+    def restore(self, name):
+        """Stellt den Bestand zum Zeitpunkt des Backups ``name`` her"""
+        entry = next((entry for entry in self.entries if entry["name"] == name), None)
+        if entry is None:
+            raise ValueError(f"Backup {name} ist nicht in {self._chain_path()} verzeichnet")
+        base = next(candidate for candidate in self.entries if candidate["name"] == entry["base"])
+        base_path = self._object_path(base)
+        data = format_for_path(base_path).load(base_path)
+        if entry["kind"] == "diff":
+            path = self._object_path(entry)
+            data = apply_diff(data, format_for_path(path).load(path))
+        return data
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Backups von InsuranceGuard auflisten und wiederherstellen")
+    parser.add_argument("--dir", default="backups", help="Backup-Verzeichnis")
+    commands = parser.add_subparsers(dest="command", required=True)
+    commands.add_parser("list", help="Alle Backups der Kette anzeigen")
+    commands.add_parser("prune", help="Aufbewahrungsregeln anwenden und freigegebenen Platz melden")
+    restore = commands.add_parser("restore", help="Einen Stand als lesbares JSON wiederherstellen")
+    restore.add_argument("backup", help="Dateiname des Backups (siehe list)")
+    restore.add_argument("-o", "--output", default="insurance_data.restored.json")
+    args = parser.parse_args()
+
+    # Nur ``list`` lässt das Verzeichnis unverändert; ``prune`` und ``restore`` übernehmen ältere Dateien
+    chain = BackupChain(args.dir, None, adopt=args.command != "list")
+    if args.command == "list":
+        seen = set()
+        for entry in chain.entries:
+            created = time.strftime("%d.%m.%Y %H:%M", time.localtime(entry["created"]))
+            marker = "=" if entry["object"] in seen else " "
+            seen.add(entry["object"])
+            print(f"{entry['name']:<48} {entry['kind']:<5} {created}  {entry['size'] / 1024:>9.0f} KB {marker}")
+        total, used = chain.disk_usage()
+        print(f"{len(chain.entries)} Backups, {total / 2**20:.1f} MB, davon belegt {used / 2**20:.1f} MB (= bereits vorhanden)")
+        loose = chain.loose_files()
+        if loose:
+            print(f"{len(loose)} ältere Backup-Dateien noch nicht in der Kette (werden mit prune oder restore übernommen)")
+        return
+    if args.command == "prune":
+        removed, reclaimed = chain.prune()
+        print(f"{removed} Backups entfernt, {reclaimed / 2**20:.1f} MB freigegeben")
+        return
+    PRETTY_JSON.dump(args.output, chain.restore(args.backup))
+    print(f"{args.backup} nach {args.output} wiederhergestellt")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,773 @@
+"""Benchmarks für die Datenhaltung des Bots.
+
+Aufruf: ``python bench.py <benchmark> [--sizes 1000 10000 ...]``
+Alle Benchmarks arbeiten mit synthetischen Daten in einem temporären Verzeichnis.
+"""
+import argparse
+import asyncio
+import io
+import json
+import os
+import random
+import string
+import tempfile
+import time
+import tracemalloc
+import zipfile
+from datetime import datetime, timezone
+
+from archive import ColdArchive, is_archivable
+from backups import BackupChain, build_zip
+from dunning import DunningScheduler, ReminderAction, send_batch
+from ids import ID_MODES, IdAllocator, IdState
+from indexes import RecordIndexes, TrigramIndex, due_timestamp, trigrams
+from logstore import ActivityLog
+from outbound import OutboundQueue
+from recovery import recover
+from records import RECORD_TYPES, decode_record, encode_record
+from serializers import FORMATS
+from storage import JournalStore, PersistenceWorker, SqliteStore, TrackedDict
+
+INSURANCES = [
+    "Krankenversicherung (Privat)", "Haftpflichtversicherung", "Hausratversicherung", "Kfz-Versicherung",
+    "Rechtsschutzversicherung", "Berufsunfähigkeitsversicherung", "Bußgeldversicherung"
+]
+
+
+def make_dataset(invoices, customers=None, seed=42):
+    """Erzeugt einen synthetischen Datenbestand mit realistischen Feldern"""
+    rng = random.Random(seed)
+    customers = customers if customers is not None else max(1, invoices // 10)
+    data = {"customers": {}, "invoices": {}, "pending_auszahlungen": {}, "schadensmeldungen": {}}
+    customer_ids = []
+    for i in range(customers):
+        customer_id = f"VN-24{i:06d}"
+        customer_ids.append(customer_id)
+        versicherungen = rng.sample(INSURANCES, rng.randint(1, 3))
+        data["customers"][customer_id] = {
+            "rp_name": "".join(rng.choices(string.ascii_letters, k=8)) + " " + "".join(rng.choices(string.ascii_letters, k=10)),
+            "hbpay_nummer": "".join(rng.choices(string.digits, k=10)),
+            "economy_id": "".join(rng.choices(string.digits, k=6)),
+            "versicherungen": versicherungen,
+            "total_monthly_price": 10000.0 * len(versicherungen),
+            "thread_id": rng.randrange(10**17, 10**18),
+            "discord_user_id": rng.randrange(10**17, 10**18),
+            "created_at": "2024-12-01T12:00:00+01:00",
+            "created_by": rng.randrange(10**17, 10**18),
+            "status": "archiviert" if rng.random() < 0.2 else "aktiv",
+            "auszahlungen": {}
+        }
+    for i in range(invoices):
+        invoice_id = f"RE-2412-{i:06d}"
+        paid = rng.random() < 0.8
+        data["invoices"][invoice_id] = {
+            "customer_id": rng.choice(customer_ids),
+            "betrag": 21000.0,
+            "betrag_netto": 20000.0,
+            "steuer": 1000.0,
+            "original_betrag": 21000.0,
+            "paid": paid,
+            "message_id": rng.randrange(10**17, 10**18),
+            "channel_id": rng.randrange(10**17, 10**18),
+            "due_date": f"2024-12-{rng.randint(1, 28):02d}T12:00:00+01:00",
+            "reminder_count": 0,
+            "created_at": "2024-12-01T12:00:00+01:00",
+            "created_by": rng.randrange(10**17, 10**18),
+            **({"paid_at": "2024-12-05T12:00:00+01:00", "archived": True} if paid else {})
+        }
+    return data
+
+
+def make_logs(count, days=28, seed=42):
+    """Erzeugt ``count`` chronologisch sortierte Protokolleinträge, verteilt auf ``days`` Tage"""
+    rng = random.Random(seed)
+    per_day = max(1, count // days)
+    return [{
+        "timestamp": f"2024-{1 + i // per_day // 28 % 12:02d}-{1 + i // per_day % 28:02d}T{i % 24:02d}:00:00+01:00",
+        "action": rng.choice(["RECHNUNG_ERSTELLT", "RECHNUNG_ARCHIVIERT", "MAHNUNG_1", "TICKET_ERSTELLT"]),
+        "user_id": rng.randrange(10**17, 10**18),
+        "details": {"invoice_id": f"RE-2412-{i:06d}", "betrag": 21000.0}
+    } for i in range(count)]
+
+
+def timed(func, repeat=3):
+    """Gibt die beste Laufzeit von ``func`` in Millisekunden zurück"""
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - start)
+    return best * 1000
+
+
+def bench_snapshot(sizes):
+    """Schreibkosten einer einzelnen Rechnungsänderung in Abhängigkeit von der Bestandsgröße"""
+    print(f"{'Rechnungen':>10} | {'voll (alt)':>11} | {'Journal':>9} | {'Snapshot kodieren':>17} | {'Snapshot schreiben':>18}")
+    for size in sizes:
+        with tempfile.TemporaryDirectory() as tmp:
+            snapshot_path = os.path.join(tmp, "data.json")
+            plain = make_dataset(size)
+            with open(snapshot_path, 'w', encoding='utf-8') as f:
+                json.dump(plain, f)
+            store = JournalStore(snapshot_path, os.path.join(tmp, "data.journal"))
+            data = store.load()
+            store.compact()
+            invoice_id = next(iter(data["invoices"]))
+
+            def mutate():
+                data["invoices"][invoice_id].reminder_count += 1
+                return store.prepare("put", "invoices", invoice_id, data["invoices"][invoice_id])
+
+            full_ms = timed(lambda: json.dumps(plain, indent=4, ensure_ascii=False))
+            journal_ms = timed(lambda: store.write_batch([mutate()]))
+            entries = []
+            encode_ms = timed(lambda: entries.append((mutate(), store.snapshot_entry())))
+            write_ms = timed(lambda: store.write_batch([entries[-1][1]]), repeat=1)
+            store.close()
+        print(f"{size:>10} | {full_ms:>8.1f} ms | {journal_ms:>6.2f} ms | {encode_ms:>14.2f} ms | {write_ms:>15.1f} ms")
+    print("Snapshot kodieren läuft im Event-Loop, Snapshot schreiben im Persistenz-Thread.")
+
+
+def bench_logtail(sizes):
+    """``/logs_anzeigen`` (10 Einträge): altes Laden der Gesamtliste gegen Lesen der letzten Segmente"""
+    print(f"{'Einträge':>10} | {'Liste laden (alt)':>17} | {'Segmente (tail)':>15}")
+    for size in sizes:
+        logs = make_logs(size, days=90)
+        with tempfile.TemporaryDirectory() as tmp:
+            legacy_path = os.path.join(tmp, "logs.json")
+            with open(legacy_path, 'w', encoding='utf-8') as f:
+                json.dump({"logs": logs}, f, indent=4)
+            activity_log = ActivityLog(os.path.join(tmp, "activity_log"))
+            activity_log.migrate(logs)
+
+            def legacy_tail():
+                with open(legacy_path, 'r', encoding='utf-8') as f:
+                    return json.load(f)["logs"][-10:]
+
+            legacy_ms = timed(legacy_tail)
+            tail_ms = timed(lambda: activity_log.tail(10))
+            activity_log.close()
+        print(f"{size:>10} | {legacy_ms:>14.1f} ms | {tail_ms:>12.2f} ms")
+
+
+def bench_tiering(sizes):
+    """Heißer Bestand mit und ohne kaltes Archiv: Mahnlauf, Snapshot und Zugriff auf archivierte IDs"""
+    print(f"{'Rechnungen':>10} | {'Mahnlauf alt':>12} | {'Mahnlauf neu':>12} | {'Snapshot alt':>12} | {'Snapshot neu':>12} | {'Archivzugriff':>13}")
+    for size in sizes:
+        data = make_dataset(size)
+        with tempfile.TemporaryDirectory() as tmp:
+            archive = ColdArchive(os.path.join(tmp, "archive"), cache_size=0)
+            hot = {}
+            for name in ("customers", "invoices"):
+                records = {key: decode_record(name, raw) for key, raw in data[name].items()}
+                cold = [(key, record) for key, record in records.items() if is_archivable(name, record)]
+                archive.add(name, archive.encode(cold))
+                hot[name] = {key: data[name][key] for key, record in records.items() if not is_archivable(name, record)}
+
+            def walk(invoices):
+                return sum(1 for record in invoices.values() if not record.get("paid", False))
+
+            walk_old = timed(lambda: walk(data["invoices"]))
+            walk_new = timed(lambda: walk(hot["invoices"]))
+            snapshot_old = timed(lambda: json.dumps(data, indent=4, ensure_ascii=False), repeat=1)
+            snapshot_new = timed(lambda: json.dumps(hot, indent=4, ensure_ascii=False), repeat=1)
+            cold_keys = random.Random(1).sample(sorted(archive._index["invoices"]), min(1000, archive.count("invoices")))
+            lookup_us = timed(lambda: [archive.get("invoices", key) for key in cold_keys]) * 1000 / len(cold_keys)
+            archive.close()
+        print(f"{size:>10} | {walk_old:>9.2f} ms | {walk_new:>9.2f} ms | {snapshot_old:>9.1f} ms | {snapshot_new:>9.1f} ms | {lookup_us:>10.1f} µs")
+
+
+def _allocated(build):
+    """Misst den Speicher, den das von ``build`` erzeugte Objekt belegt"""
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    result = build()
+    after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return result, after - before
+
+
+def _peak(build):
+    """Misst den Spitzenspeicher während ``build``"""
+    tracemalloc.start()
+    result = build()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return result, peak
+
+
+def bench_memory(sizes):
+    """Speicherbedarf je Datensatz: dicts aus ``json.load`` gegen Datensatzklassen mit ``__slots__``"""
+    print(f"{'Datensätze':>10} | {'Sammlung':<20} | {'dict':>10} | {'Record':>10} | {'pro Stück':>17} | {'Ersparnis':>9}")
+    for size in sizes:
+        raw = json.dumps(make_dataset(size, customers=size))
+        for name in RECORD_TYPES:
+            if name == "pending_auszahlungen":
+                continue
+            # Beide Varianten frisch aus JSON, damit sich keine Strings zwischen ihnen teilen
+            dicts, dict_bytes = _allocated(lambda: json.loads(raw)[name])
+            parsed = json.loads(raw)[name]
+            records, record_bytes = _allocated(lambda: {key: decode_record(name, value) for key, value in json.loads(json.dumps(parsed)).items()})
+            del dicts, parsed, records
+            print(f"{size:>10} | {name:<20} | {dict_bytes / 2**20:>7.1f} MB | {record_bytes / 2**20:>7.1f} MB | "
+                  f"{dict_bytes / size:>5.0f} B -> {record_bytes / size:>4.0f} B | {1 - record_bytes / dict_bytes:>8.0%}")
+
+
+def bench_formats(sizes):
+    """Snapshot-Formate im Vergleich: Speichern, Laden und Dateigröße"""
+    print(f"{'Rechnungen':>10} | {'Format':<12} | {'Speichern':>10} | {'Laden':>10} | {'Größe':>9}")
+    for size in sizes:
+        data = make_dataset(size)
+        with tempfile.TemporaryDirectory() as tmp:
+            for fmt in FORMATS.values():
+                path = os.path.join(tmp, "snapshot" + fmt.suffix)
+                save_ms = timed(lambda: fmt.dump(path, data), repeat=2)
+                load_ms = timed(lambda: fmt.load(path), repeat=2)
+                print(f"{size:>10} | {fmt.name:<12} | {save_ms:>7.0f} ms | {load_ms:>7.0f} ms | {os.path.getsize(path) / 2**20:>6.1f} MB")
+
+
+def bench_startup(sizes):
+    """Start mit vollständigem Laden gegen Start über den Snapshot-Index (offene Vorgänge vorgeladen)"""
+    print(f"{'Rechnungen':>10} | {'Format':<8} | {'vollständig':>11} | {'lazy':>9} | {'erster Snapshot':>15} | {'geladen':>7}")
+    for size in sizes:
+        data = make_dataset(size)
+        with tempfile.TemporaryDirectory() as tmp:
+            for name in ("json", "marshal"):
+                fmt = FORMATS[name]
+                snapshot_path = os.path.join(tmp, "snapshot" + fmt.suffix)
+                journal_path = os.path.join(tmp, name + ".journal")
+                writer = JournalStore(snapshot_path, journal_path, snapshot_format=fmt)
+                writer.load()
+                writer.replace(json.loads(json.dumps(data)))
+                writer.close()
+
+                def start(lazy):
+                    store = JournalStore(snapshot_path, journal_path, snapshot_format=fmt, lazy=lazy)
+                    store.load()
+                    return store
+
+                eager_ms = timed(lambda: start(False).close())
+                lazy_ms = timed(lambda: start(True).close())
+                store = start(True)
+                loaded = sum(len(collection._items) for collection in store.data.values())
+                total = sum(len(collection) for collection in store.data.values())
+                encode_ms = timed(store.snapshot_entry, repeat=1)
+                store.close()
+                print(f"{size:>10} | {name:<8} | {eager_ms:>8.0f} ms | {lazy_ms:>6.0f} ms | {encode_ms:>12.0f} ms | {loaded / total:>7.0%}")
+    print("Erster Snapshot: Kodieren nach einem lazy Start (nicht geladene Datensätze werden unverändert übernommen).")
+
+
+def bench_backup(sizes, changes=100):
+    """Vollbackup gegen differenzielles Backup nach ``changes`` geänderten Rechnungen"""
+    print(f"{'Rechnungen':>10} | {'voll':>9} | {'Größe voll':>10} | {'differenziell':>13} | {'Größe diff':>10}")
+    for size in sizes:
+        with tempfile.TemporaryDirectory() as tmp:
+            store = JournalStore(os.path.join(tmp, "data.json"), os.path.join(tmp, "data.journal"), snapshot_format=FORMATS["json"])
+            store.load()
+            store.replace(make_dataset(size))
+            store.track_changes()
+            chain = BackupChain(os.path.join(tmp, "backups"), FORMATS["json.gz"], full_every=10**9)
+            timestamps = iter(range(10**6))
+            full_ms = timed(lambda: chain.write(store, chain.plan(store, f"full{next(timestamps)}")), repeat=1)
+            full_size = chain.entries[-1]["size"]
+            for key in list(store.data["invoices"])[:changes]:
+                store.data["invoices"][key].reminder_count += 1
+                store.put("invoices", key, store.data["invoices"][key])
+            diff_ms = timed(lambda: chain.write(store, chain.plan(store, f"diff{next(timestamps)}")))
+            diff_size = chain.entries[-1]["size"]
+            store.close()
+        print(f"{size:>10} | {full_ms:>6.0f} ms | {full_size / 1024:>7.0f} KB | {diff_ms:>10.1f} ms | {diff_size / 1024:>7.1f} KB")
+
+
+def bench_backupzip(sizes, part_size=10 * 2**20, spool_size=2**20):
+    """Spitzenspeicher beim Backup-ZIP: ``io.BytesIO`` (alt) gegen ``build_zip`` mit temporären Dateien (1 MB im Speicher)"""
+    print(f"{'Rechnungen':>10} | {'Datei':>8} | {'BytesIO':>9} | {'build_zip':>9} | {'Teile':>5}")
+    for size in sizes:
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "insurance_data.json")
+            with open(path, 'w', encoding='utf-8') as f:
+                json.dump(make_dataset(size), f, indent=4, ensure_ascii=False)
+
+            def in_memory():
+                buffer = io.BytesIO()
+                with zipfile.ZipFile(buffer, "w", zipfile.ZIP_DEFLATED) as zip_file:
+                    zip_file.write(path, arcname="insurance_data.json")
+                return buffer
+
+            _, old_peak = _peak(in_memory)
+            parts, new_peak = _peak(lambda: build_zip([(path, "insurance_data.json")], part_size, spool_size))
+            for part in parts:
+                part.close()
+            print(f"{size:>10} | {os.path.getsize(path) / 2**20:>5.0f} MB | {old_peak / 2**20:>6.1f} MB | {new_peak / 2**20:>6.1f} MB | {len(parts):>5}")
+
+
+def bench_recovery(sizes, days=30):
+    """Point-in-Time-Recovery: ``size`` Änderungen aus einem Monat über ein Vollbackup einspielen"""
+    print(f"{'Änderungen':>10} | {'Protokoll':>9} | {'Wiederherstellung':>17} | {'pro Sekunde':>11}")
+    for size in sizes:
+        with tempfile.TemporaryDirectory() as tmp:
+            store = JournalStore(os.path.join(tmp, "data.json"), os.path.join(tmp, "data.journal"), snapshot_format=FORMATS["json"])
+            store.load()
+            store.replace(make_dataset(10000))
+            store.track_changes()
+            chain = BackupChain(os.path.join(tmp, "backups"), FORMATS["json.gz"])
+            chain.write(store, chain.plan(store, "base"))
+            start = time.time() - days * 86400
+            chain.entries[-1]["created"] = start - 60
+
+            history = ActivityLog(os.path.join(tmp, "history"), name="history")
+            rng = random.Random(7)
+            keys = list(store.data["invoices"])
+            lines = []
+            for number in range(size):
+                t = start + number * days * 86400 / size
+                key = keys[rng.randrange(len(keys))]
+                value = dict(encode_record(store.data["invoices"][key]), reminder_count=number % 3)
+                entry = {"timestamp": datetime.fromtimestamp(t, timezone.utc).isoformat(), "t": t,
+                         "g": store.generation + number + 1, "op": "put", "c": "invoices", "k": key, "v": value}
+                lines.append(history.encode(entry))
+            history.write(lines)
+            history.close()
+            log_size = sum(os.path.getsize(os.path.join(tmp, "history", name)) for name in os.listdir(os.path.join(tmp, "history")))
+            results = []
+            recover_ms = timed(lambda: results.append(recover(chain, history, time.time())), repeat=1)
+            assert results[-1][1]["applied"] == size and not results[-1][1]["missing"]
+            store.close()
+        print(f"{size:>10} | {log_size / 2**20:>6.1f} MB | {recover_ms / 1000:>15.2f} s | {size / recover_ms * 1000:>11,.0f}")
+
+
+def bench_indexes(sizes, lookups=200):
+    """Abfragen über Sekundärindizes gegen lineare Suche, dazu Aufbau, Pflege und Konsistenzprüfung"""
+    print(f"{'Rechnungen':>10} | {'Abfrage':<27} | {'Suche (alt)':>11} | {'Index':>9}")
+    for size in sizes:
+        raw = make_dataset(size)
+        data = {name: TrackedDict({key: decode_record(name, value) for key, value in raw[name].items()})
+                for name in ("customers", "invoices")}
+        indexes = RecordIndexes(data)
+        build_ms = timed(lambda: indexes.rebuild(), repeat=1)
+        rng = random.Random(1)
+        customers = rng.choices(list(data["customers"]), k=lookups)
+        users = [data["customers"][key].discord_user_id for key in customers]
+        cutoff = datetime(2024, 12, 10, tzinfo=timezone.utc).timestamp()
+        invoices = data["invoices"]
+        # (Bezeichnung, Abfragen je Durchlauf, lineare Suche, Index)
+        queries = [
+            ("Rechnungen eines Kunden", lookups,
+             lambda: [[key for key, invoice in invoices.items() if invoice.customer_id == customer] for customer in customers],
+             lambda: [indexes.invoice_ids_for_customer(customer) for customer in customers]),
+            ("Akte zu Discord-User", lookups,
+             lambda: [[key for key, customer in data["customers"].items() if customer.discord_user_id == user] for user in users],
+             lambda: [indexes.customer_ids_for_user(user) for user in users]),
+            ("Offene Rechnungen vor Datum", 1,
+             lambda: [key for key, invoice in invoices.items() if not invoice.paid and due_timestamp(invoice) < cutoff],
+             lambda: indexes.invoices_due_before(cutoff)),
+            ("Akten mit Versicherung", 1,
+             lambda: [key for key, customer in data["customers"].items() if INSURANCES[0] in customer.versicherungen],
+             lambda: indexes.customer_ids_with_insurance(INSURANCES[0])),
+        ]
+        for label, per_query, scan, lookup in queries:
+            scan_ms = timed(scan, repeat=1) / per_query
+            index_ms = timed(lookup) / per_query
+            print(f"{size:>10} | {label:<27} | {scan_ms:>8.3f} ms | {index_ms * 1000:>6.1f} µs")
+        keys = rng.sample(list(invoices), min(1000, len(invoices)))
+
+        def mutate():
+            for key in keys:
+                invoice = invoices[key]
+                invoice.paid = not invoice.paid
+                indexes.update("invoices", key)
+
+        update_us = timed(mutate) * 1000 / len(keys)
+        check_ms = timed(lambda: indexes.check(), repeat=1)
+        sample_ms = timed(lambda: indexes.check(sample=200))
+        assert not indexes.check() and not indexes.check(sample=200)
+        print(f"{size:>10} | Aufbau {build_ms:.1f} ms, Pflege {update_us:.1f} µs je Änderung, "
+              f"Konsistenzprüfung {check_ms:.1f} ms (Stichprobe: {sample_ms:.2f} ms)")
+
+
+def bench_dunning(sizes):
+    """Mahnlauf: tägliche Prüfung aller Rechnungen (alt) gegen den Min-Heap, der nur fällige Mahnungen entnimmt"""
+    print(f"{'Rechnungen':>10} | {'offen':>7} | {'fällig':>6} | {'Vollprüfung (alt)':>17} | {'Heap aufbauen':>13} | {'Heap-Lauf':>9}")
+    for size in sizes:
+        raw = make_dataset(size)
+        invoices = {key: decode_record("invoices", value) for key, value in raw["invoices"].items()}
+        now = datetime(2024, 12, 15, 12, 0, tzinfo=timezone.utc)
+
+        def full_scan():
+            due = []
+            for key, invoice in invoices.items():
+                if invoice.paid:
+                    continue
+                due_date = datetime.fromisoformat(invoice.due_date)
+                if (now - due_date).days == invoice.reminder_count:
+                    due.append(key)
+            return due
+
+        scheduler = DunningScheduler()
+
+        def build():
+            scheduler.clear()
+            for key, invoice in invoices.items():
+                scheduler.update(key, invoice)
+
+        scan_ms = timed(full_scan)
+        build_ms = timed(build)
+        open_count = len(scheduler)
+        # Gemessen wird ein Lauf, der die Mahnungen eines ganzen Tages entnimmt
+        scheduler.pop_due(now.timestamp() - 86400)
+        due = []
+        run_ms = timed(lambda: due.extend(scheduler.pop_due(now.timestamp())), repeat=1)
+        print(f"{size:>10} | {open_count:>7} | {len(due):>6} | {scan_ms:>14.2f} ms | {build_ms:>10.2f} ms | {run_ms:>6.3f} ms")
+    print("Vollprüfung: einmal täglich, Mahnungen bis zu 24 h verspätet. Heap: Aufbau einmal beim Start, danach je Lauf nur die fälligen Einträge.")
+
+
+def bench_dunningbatch(sizes, latency=0.002, concurrency=4):
+    """Mahnlauf mit ``size`` fälligen Rechnungen: einzeln senden und speichern (alt) gegen gebündelten Lauf.
+
+    Jede Mahnung sind zwei Discord-Nachrichten (Kanal und Log), simuliert mit ``latency`` Sekunden.
+    """
+    print(f"{'fällig':>8} | {'einzeln (alt)':>13} | {'Batch':>9} | {'davon senden':>12} | {'davon speichern':>15}")
+    for size in sizes:
+        raw = make_dataset(size * 5)
+        with tempfile.TemporaryDirectory() as tmp:
+            snapshot_path = os.path.join(tmp, "data.json")
+            FORMATS["json"].dump(snapshot_path, raw)
+            store = JournalStore(snapshot_path, os.path.join(tmp, "data.journal"), snapshot_format=FORMATS["json"],
+                                 activity_log=ActivityLog(os.path.join(tmp, "activity_log")))
+            data = store.load()
+            due = [key for key, invoice in data["invoices"].items() if not invoice.paid][:size]
+
+            async def send(action):
+                await asyncio.sleep(latency)
+                await asyncio.sleep(latency)
+                return True
+
+            def log_entry(action):
+                return store.prepare_log({"timestamp": "2024-12-15T12:00:00+01:00", "action": f"MAHNUNG_{action.step}",
+                                          "user_id": 0, "details": {"invoice_id": action.invoice_id}})
+
+            def actions():
+                return [ReminderAction(key, data["invoices"][key], 1, 0, data["invoices"][key].betrag) for key in due]
+
+            async def sequential():
+                for action in actions():
+                    await send(action)
+                    action.invoice.reminder_count = 1
+                    store.write_batch(store.prepare_change("put", "invoices", action.invoice_id, action.invoice))
+                    store.write_batch([log_entry(action)])
+
+            async def batched():
+                batch = actions()
+                started = time.perf_counter()
+                await send_batch(batch, send, concurrency)
+                timings["send"] = (time.perf_counter() - started) * 1000
+                started = time.perf_counter()
+                entries = []
+                for action in batch:
+                    action.invoice.reminder_count = 1
+                    entries += store.prepare_change("put", "invoices", action.invoice_id, action.invoice)
+                    entries.append(log_entry(action))
+                store.write_batch(entries)
+                timings["persist"] = (time.perf_counter() - started) * 1000
+
+            timings = {}
+            old_ms = timed(lambda: asyncio.run(sequential()), repeat=1)
+            new_ms = timed(lambda: asyncio.run(batched()), repeat=1)
+            store.close()
+        print(f"{size:>8} | {old_ms / 1000:>11.2f} s | {new_ms / 1000:>7.2f} s | {timings['send'] / 1000:>10.2f} s | {timings['persist']:>12.1f} ms")
+    print(f"Simulierte Latenz {latency * 1000:.0f} ms je Nachricht, {concurrency} Mahnungen gleichzeitig.")
+
+
+def bench_autocomplete(sizes, queries=200):
+    """Autocomplete: Präfixsuche über den sortierten Index gegen lineare Suche (25 Treffer, gefiltert)"""
+    print(f"{'Akten':>8} | {'Aufbau':>9} | {'Suche (alt)':>11} | {'Index':>8} | {'Index, leer + Filter':>20}")
+    for size in sizes:
+        raw = make_dataset(size, customers=size)
+        data = {name: TrackedDict({key: decode_record(name, value) for key, value in raw[name].items()})
+                for name in ("customers", "invoices")}
+        indexes = RecordIndexes(data)
+        build_ms = timed(lambda: indexes.rebuild(), repeat=1)
+        rng = random.Random(1)
+        prefixes = [rng.choice(list(data["customers"].values())).rp_name[:3] for _ in range(queries)]
+
+        def scan(prefix):
+            prefix = prefix.casefold()
+            return [key for key, customer in data["customers"].items()
+                    if key.casefold().startswith(prefix) or any(word.startswith(prefix) for word in customer.rp_name.casefold().split())][:25]
+
+        def lookup(prefix, accept=lambda customer: True):
+            result = []
+            for key in indexes.search_customers(prefix):
+                if accept(data["customers"][key]):
+                    result.append(key)
+                    if len(result) == 25:
+                        break
+            return result
+
+        scan_ms = timed(lambda: [scan(prefix) for prefix in prefixes[:20]], repeat=1) / 20
+        index_ms = timed(lambda: [lookup(prefix) for prefix in prefixes]) / queries
+        # Schlechtester Fall: leere Eingabe und ein Filter, den nur wenige Akten erfüllen
+        sparse_ms = timed(lambda: lookup("", lambda customer: customer.status == "archiviert"))
+        print(f"{size:>8} | {build_ms:>6.0f} ms | {scan_ms:>8.2f} ms | {index_ms * 1000:>5.0f} µs | {sparse_ms * 1000:>17.0f} µs")
+    print("Discord erwartet die Antwort auf eine Autocomplete-Anfrage innerhalb von 3 s.")
+
+
+def _typo(text, rng):
+    """Ein zufälliger Tippfehler: Zeichen ersetzen, auslassen oder zwei vertauschen"""
+    position = rng.randrange(len(text) - 1)
+    kind = rng.randrange(3)
+    if kind == 0:
+        return text[:position] + rng.choice(string.ascii_lowercase) + text[position + 1:]
+    if kind == 1:
+        return text[:position] + text[position + 1:]
+    return text[:position] + text[position + 1] + text[position] + text[position + 2:]
+
+
+def bench_kundensuche(sizes, queries=200):
+    """/kunde_suchen: Trigramm-Index gegen lineare Suche, Anfragen mit je einem Tippfehler"""
+    print(f"{'Akten':>8} | {'Aufbau':>9} | {'Suche (alt)':>11} | {'Index Ø':>8} | {'Index p95':>9} | {'Top 10':>6}")
+    for size in sizes:
+        raw = make_dataset(size, customers=size)
+        data = {name: TrackedDict({key: decode_record(name, value) for key, value in raw[name].items()})
+                for name in ("customers", "invoices")}
+        indexes = RecordIndexes(data)
+        build_ms = timed(lambda: indexes.rebuild(), repeat=1)
+        rng = random.Random(1)
+        targets = rng.sample(sorted(data["customers"]), queries)
+        fields = ("rp_name", "rp_name", "hbpay_nummer", "economy_id")
+        cases = [(key, _typo(getattr(data["customers"][key], rng.choice(fields)), rng)) for key in targets]
+
+        def scan(query):
+            grams = trigrams(query)
+            scored = []
+            for key, customer in data["customers"].items():
+                score = max(2 * len(grams & trigrams(value)) / (len(grams) + len(trigrams(value)))
+                            for value in (customer.rp_name, customer.hbpay_nummer, customer.economy_id))
+                if score >= TrigramIndex.THRESHOLD:
+                    scored.append((score, key))
+            return sorted(scored, key=lambda result: (-result[0], result[1]))
+
+        scan_ms = timed(lambda: [scan(query) for _, query in cases[:2]], repeat=1) / 2
+        times = []
+        found = 0
+        for key, query in cases:
+            started = time.perf_counter()
+            results = indexes.find_customers(query)
+            times.append((time.perf_counter() - started) * 1000)
+            found += key in [result_key for _, result_key in results[:10]]
+        print(f"{size:>8} | {build_ms:>6.0f} ms | {scan_ms:>8.0f} ms | {sum(times) / len(times):>5.2f} ms | "
+              f"{sorted(times)[int(len(times) * 0.95)]:>6.2f} ms | {found * 100 / queries:>5.0f}%")
+    print("Top 10: Anteil der Anfragen, bei denen die gesuchte Akte unter den ersten zehn Treffern ist.")
+
+
+def bench_ids(sizes, per_period=250000):
+    """ID-Vergabe: Kollisionen der alten Zufalls-IDs gegen den Allokator in allen Modi (Rechnungs-IDs, 250 000 je Monat)"""
+    print(f"{'IDs':>9} | {'Duplikate (alt)':>15} | {'Modus':>10} | {'je ID':>8} | {'Kollisionen':>11} | {'eindeutig':>9}")
+    alphabet = string.ascii_uppercase + string.digits
+    for size in sizes:
+        months = [datetime(2025 + month // 12, month % 12 + 1, 15, tzinfo=timezone.utc) for month in range(-(-size // per_period))]
+        rng = random.Random(7)
+        old = set()
+        for i in range(size):
+            old.add(months[i // per_period].strftime("RE-%y%m-") + "".join(rng.choices(alphabet, k=4)))
+        for mode in ID_MODES:
+            with tempfile.TemporaryDirectory() as tmp:
+                existing = set()
+                state = IdState(os.path.join(tmp, "id_state.json")) if mode != "random" else None
+                allocator = IdAllocator("invoices", "RE-%y%m-", alphabet, 4, existing.__contains__, mode, state, rng=random.Random(7))
+                started = time.perf_counter()
+                for i in range(size):
+                    # Wie im Bot: die ID wird gleich danach gespeichert
+                    existing.add(allocator.allocate(months[i // per_period]))
+                per_id = (time.perf_counter() - started) / size * 1e6
+            print(f"{size:>9} | {size - len(old):>15} | {mode:>10} | {per_id:>5.1f} µs | {allocator.collisions:>11} | "
+                  f"{'ja' if len(existing) == size else 'NEIN':>9}")
+            if len(existing) != size:
+                raise AssertionError(f"{mode}: {size - len(existing)} doppelt vergebene IDs")
+    print("Duplikate (alt): IDs, die der bisherige Generator doppelt vergeben und damit überschrieben hätte.")
+
+
+def bench_idcheck(sizes, per_period=250000):
+    """Eindeutigkeit der ID-Vergabe: ``size`` Rechnungs-IDs je Modus, in den Nummernmodi mit Neustart nach der Hälfte.
+
+    Die Nummernmodi müssen ohne Bestandsprüfung eindeutig sein (``exists`` meldet
+    nie einen Treffer); im Zufallsmodus prüft ``exists`` wie im Bot gegen alle
+    bisher vergebenen IDs. Jede doppelt vergebene ID bricht mit ``AssertionError`` ab.
+    ``sequential`` speichert den Stand nach jeder ID und braucht für eine Million einige Minuten.
+    """
+    print(f"{'IDs':>9} | {'Modus':>10} | {'Zeiträume':>9} | {'Kollisionen':>11} | {'Duplikate':>9} | {'Dauer':>7}")
+    alphabet = string.ascii_uppercase + string.digits
+    for size in sizes:
+        months = [datetime(2025 + month // 12, month % 12 + 1, 15, tzinfo=timezone.utc) for month in range(-(-size // per_period))]
+        for mode in ID_MODES:
+            with tempfile.TemporaryDirectory() as tmp:
+                issued = set()
+                exists = issued.__contains__ if mode == "random" else (lambda key: False)
+
+                def start():
+                    state = IdState(os.path.join(tmp, "id_state.json")) if mode != "random" else None
+                    return IdAllocator("invoices", "RE-%y%m-", alphabet, 4, exists, mode, state, rng=random.Random(7))
+
+                allocator = start()
+                duplicates = collisions = 0
+                started = time.perf_counter()
+                for i in range(size):
+                    if i == size // 2 and mode != "random":
+                        collisions += allocator.collisions
+                        allocator = start()
+                    key = allocator.allocate(months[i // per_period])
+                    duplicates += key in issued
+                    issued.add(key)
+                collisions += allocator.collisions
+                elapsed = time.perf_counter() - started
+            print(f"{size:>9} | {mode:>10} | {len(months):>9} | {collisions:>11} | {duplicates:>9} | {elapsed:>5.1f} s")
+            if duplicates or len(issued) != size:
+                raise AssertionError(f"{mode}: {duplicates} doppelt vergebene IDs bei {size} IDs")
+    print("Alle IDs eindeutig.")
+
+
+class _RateLimitError(Exception):
+    def __init__(self, retry_after):
+        super().__init__("429 Too Many Requests")
+        self.status = 429
+        self.retry_after = retry_after
+
+
+class _EmbedStub:
+    """Platzhalter mit der Textlänge eines typischen Log-Embeds (``len`` wie bei ``discord.Embed``)"""
+
+    def __len__(self):
+        return 450
+
+
+class _FakeChannel:
+    """Kanal mit Discord-ähnlichem Limit (``rate`` Nachrichten je ``per`` Sekunden) und fester Antwortzeit"""
+
+    def __init__(self, rate=5, per=0.5, latency=0.03):
+        self.rate, self.per, self.latency = rate, per, latency
+        self.sent_at = []
+        self.requests = 0
+        self.limited = 0
+
+    async def send(self, embeds):
+        self.requests += 1
+        await asyncio.sleep(self.latency)
+        now = time.monotonic()
+        window = [at for at in self.sent_at[-self.rate:] if at > now - self.per]
+        if len(window) >= self.rate:
+            self.limited += 1
+            raise _RateLimitError(window[0] + self.per - now)
+        self.sent_at.append(now)
+
+
+def bench_logqueue(sizes):
+    """Log-Embeds: direkter Versand je Embed gegen die gebündelte Warteschlange (Limit 5 Nachrichten je 0,5 s)"""
+    print(f"{'Embeds':>7} | {'Modus':>13} | {'Wartezeit Ø':>11} | {'max':>8} | {'Anfragen':>8} | {'429':>5} | {'alle zugestellt':>15}")
+
+    async def inline(channel, count):
+        async def handler():
+            started = time.perf_counter()
+            # Wie bisher: der Handler wartet auf den Versand; bei 429 wartet er die genannte Zeit ab
+            while True:
+                try:
+                    await channel.send([_EmbedStub()])
+                    break
+                except _RateLimitError as e:
+                    await asyncio.sleep(e.retry_after)
+            return time.perf_counter() - started
+        started = time.perf_counter()
+        waits = await asyncio.gather(*(handler() for _ in range(count)))
+        return waits, time.perf_counter() - started
+
+    async def queued(channel, count):
+        queue = OutboundQueue(lambda destination, embeds: destination.send(embeds), rate=channel.rate, per=channel.per)
+        started = time.perf_counter()
+        waits = []
+        for _ in range(count):
+            handler_started = time.perf_counter()
+            queue.put(1, channel, _EmbedStub())
+            waits.append(time.perf_counter() - handler_started)
+        while queue.pending():
+            await asyncio.sleep(0.01)
+        return waits, time.perf_counter() - started
+
+    for size in sizes:
+        for mode, run in (("direkt (alt)", inline), ("Warteschlange", queued)):
+            channel = _FakeChannel()
+            waits, total = asyncio.run(run(channel, size))
+            print(f"{size:>7} | {mode:>13} | {sum(waits) / len(waits) * 1000:>8.1f} ms | {max(waits) * 1000:>5.0f} ms | "
+                  f"{channel.requests:>8} | {channel.limited:>5} | {total:>13.1f} s")
+
+
+def bench_reload(sizes):
+    """/reload auf beiden Backends: Austausch des Bestands samt Neuaufbau des Mahnplans; prüft, dass alle offenen Rechnungen eingeplant bleiben"""
+    print(f"{'Rechnungen':>10} | {'Backend':<7} | {'offen':>7} | {'eingeplant':>10} | {'Austausch':>9} | {'Mahnplan':>9}")
+
+    async def reload(store, new_data):
+        persistence = PersistenceWorker(store, window=0.001)
+        persistence.start()
+        try:
+            started = time.perf_counter()
+            data = await persistence.replace_durable(new_data)
+            replace_ms = (time.perf_counter() - started) * 1000
+            scheduler = DunningScheduler()
+            started = time.perf_counter()
+            scheduler.restore(None, data["invoices"].loaded_items())
+            schedule_ms = (time.perf_counter() - started) * 1000
+            return len(scheduler), replace_ms, schedule_ms
+        finally:
+            persistence.close()
+
+    for size in sizes:
+        raw = make_dataset(size)
+        expected = sum(1 for value in raw["invoices"].values() if not value["paid"])
+        with tempfile.TemporaryDirectory() as tmp:
+            backends = (
+                ("journal", JournalStore(os.path.join(tmp, "snapshot.json"), os.path.join(tmp, "journal"))),
+                ("sqlite", SqliteStore(os.path.join(tmp, "data.db"))),
+            )
+            for name, store in backends:
+                store.load()
+                # Wie bei /reload: vorher gibt es bereits einen (anderen) Bestand
+                store.replace(make_dataset(100, seed=7))
+                scheduled, replace_ms, schedule_ms = asyncio.run(reload(store, json.loads(json.dumps(raw))))
+                print(f"{size:>10} | {name:<7} | {expected:>7} | {scheduled:>10} | {replace_ms:>6.0f} ms | {schedule_ms:>6.1f} ms")
+                if scheduled != expected:
+                    raise AssertionError(f"{name}: nach dem Austausch sind {scheduled} von {expected} offenen Rechnungen eingeplant")
+    print("Eingeplant: offene Rechnungen im neu aufgebauten Mahnplan (muss der Zahl offener Rechnungen entsprechen).")
+
+
+BENCHMARKS = {
+    "snapshot": bench_snapshot,
+    "logtail": bench_logtail,
+    "tiering": bench_tiering,
+    "memory": bench_memory,
+    "formats": bench_formats,
+    "startup": bench_startup,
+    "backup": bench_backup,
+    "backupzip": bench_backupzip,
+    "recovery": bench_recovery,
+    "indexes": bench_indexes,
+    "dunning": bench_dunning,
+    "dunningbatch": bench_dunningbatch,
+    "autocomplete": bench_autocomplete,
+    "kundensuche": bench_kundensuche,
+    "ids": bench_ids,
+    "idcheck": bench_idcheck,
+    "logqueue": bench_logqueue,
+    "reload": bench_reload,
+}
+# Abweichende Standardgrößen (Anzahl Log-Embeds statt Datensätze, mindestens eine Million IDs)
+DEFAULT_SIZES = {"logqueue": [50, 200, 1000], "idcheck": [1000000]}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmarks für die Datenhaltung von InsuranceGuard")
+    parser.add_argument("benchmark", choices=sorted(BENCHMARKS))
+    parser.add_argument("--sizes", type=int, nargs="+")
+    args = parser.parse_args()
+    BENCHMARKS[args.benchmark](args.sizes or DEFAULT_SIZES.get(args.benchmark, [1000, 10000, 50000, 100000]))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,252 @@
+import asyncio
+import heapq
+import json
+import logging
+import os
+import time
+from dataclasses import asdict, dataclass, field
+
+from indexes import due_timestamp
+
+logger = logging.getLogger('InsuranceBot')
+
+DAY = 86400
+# Mahnstufe -> (Tage nach Fälligkeit, Mahngebühr in Prozent auf den ursprünglichen Betrag)
+DUNNING_STEPS = {1: (0, 0), 2: (1, 5), 3: (2, 10)}
+# Längste Schlafphase; danach wird neu geprüft, falls die Systemuhr gesprungen ist
+MAX_SLEEP = 3600
+# Abstand, nach dem Mahnungen eines fehlgeschlagenen Laufs erneut versucht werden
+RETRY_DELAY = 900
+
+
+def parse_schedule(text):
+    """Liest einen Mahnplan der Form ``"0:0,1:5,2:10"`` (je Stufe ``tage:gebühr``)"""
+    steps = {}
+    for number, item in enumerate(text.split(","), start=1):
+        try:
+            days, surcharge = item.split(":")
+            steps[number] = (float(days), int(surcharge))
+        except ValueError:
+            raise ValueError(f"Ungültige Mahnstufe {item!r} (erwartet tage:gebühr, z.B. 0:0,1:5,2:10)") from None
+    if not steps or any(steps[n][0] < steps[n - 1][0] for n in steps if n > 1):
+        raise ValueError("Mahnstufen müssen nach Tagen aufsteigend sortiert sein")
+    return steps
+
+
+def load_state(path):
+    """Liest den gespeicherten Mahnplan; fehlt die Datei oder ist sie beschädigt, gibt es ``None``"""
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+    except ValueError as e:
+        logger.warning(f"Mahnplan {path} beschädigt, wird neu aufgebaut: {e}")
+        return None
+
+
+def write_state(path, state):
+    with open(path + ".tmp", 'w', encoding='utf-8') as f:
+        json.dump(state, f, separators=(',', ':'))
+    os.replace(path + ".tmp", path)
+
+
+@dataclass
+class ReminderAction:
+    """Eine geplante Mahnung; ``betrag`` ist der Betrag nach Anwendung der Mahngebühr"""
+
+    invoice_id: str
+    invoice: object
+    step: int
+    surcharge: int
+    betrag: float
+    customer: object = None
+    channel: object = None
+
+
+@dataclass
+class DunningReport:
+    """Ergebnis und Laufzeiten eines Mahnlaufs"""
+
+    due: int = 0
+    sent: int = 0
+    skipped: int = 0
+    failed: int = 0
+    plan_ms: float = 0.0
+    send_ms: float = 0.0
+    persist_ms: float = 0.0
+    errors: list = field(default_factory=list)
+
+    def summary(self):
+        return (f"{self.due} fällig, {self.sent} versendet, {self.skipped} übersprungen, {self.failed} fehlgeschlagen "
+                f"(planen {self.plan_ms:.1f} ms, senden {self.send_ms:.0f} ms, speichern {self.persist_ms:.1f} ms)")
+
+    def as_dict(self):
+        return asdict(self)
+
+
+async def send_batch(actions, send, concurrency):
+    """Führt ``send(aktion)`` für alle Aktionen mit höchstens ``concurrency`` gleichzeitigen Aufrufen aus.
+
+    Gibt die Ergebnisse in der Reihenfolge der Aktionen zurück; Ausnahmen
+    werden als Ergebnis geliefert, damit ein Fehler den Lauf nicht abbricht.
+    """
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def guarded(action):
+        async with semaphore:
+            return await send(action)
+
+    return await asyncio.gather(*(guarded(action) for action in actions), return_exceptions=True)
+
+
+class DunningScheduler:
+    """Min-Heap der nächsten Mahnzeitpunkte aller offenen Rechnungen.
+
+    Einträge sind ``(zeitpunkt, rechnungs_id, stufe)``. Gültig ist jeweils nur
+    der in ``_next`` vermerkte Eintrag einer Rechnung; ältere Einträge bleiben
+    im Heap liegen und werden beim Entnehmen verworfen (Lazy Deletion). ``run``
+    schläft bis zum frühesten Zeitpunkt und wird geweckt, wenn eine Rechnung
+    früher fällig wird – der Aufwand je Lauf hängt nur von den fälligen
+    Mahnungen ab, nicht von der Zahl der Rechnungen.
+
+    Der Plan wird mit ``state`` gespeichert und beim Start mit ``restore``
+    wieder eingelesen; Zeitpunkte müssen dann nur für neue oder geänderte
+    Rechnungen berechnet werden. War der Bot länger offline, holt
+    ``overdue_step`` alle verpassten Stufen in einem Schritt nach.
+    """
+
+    def __init__(self, steps=DUNNING_STEPS, retry_delay=RETRY_DELAY):
+        self.steps = steps
+        self.retry_delay = retry_delay
+        self.last_run = None
+        self._heap = []
+        self._next = {}
+        self._wakeup = asyncio.Event()
+
+    def __len__(self):
+        return len(self._next)
+
+    def clear(self):
+        self._heap = []
+        self._next = {}
+        self._wakeup.set()
+
+    def _push(self, invoice_id, when, step):
+        if self._next.get(invoice_id) == (when, step):
+            return
+        head = self.next_time()
+        self._next[invoice_id] = (when, step)
+        heapq.heappush(self._heap, (when, invoice_id, step))
+        # Veraltete Einträge gelegentlich entfernen, damit der Heap nicht wächst
+        if len(self._heap) > 2 * len(self._next) + 64:
+            self._heap = [(at, key, level) for key, (at, level) in self._next.items()]
+            heapq.heapify(self._heap)
+        if head is None or when < head:
+            self._wakeup.set()
+
+    def update(self, invoice_id, invoice, earliest=None):
+        """Plant die nächste Mahnstufe einer Rechnung neu (``invoice=None`` oder bezahlt: austragen)"""
+        step = invoice.reminder_count + 1 if invoice is not None and not invoice.paid else None
+        if step not in self.steps:
+            self._next.pop(invoice_id, None)
+            return
+        when = self.step_time(invoice, step)
+        if earliest is not None:
+            when = max(when, earliest)
+        self._push(invoice_id, when, step)
+
+    def step_time(self, invoice, step):
+        return due_timestamp(invoice) + self.steps[step][0] * DAY
+
+    def overdue_step(self, invoice, now):
+        """Höchste bis ``now`` erreichte Mahnstufe; verpasste Zwischenstufen werden übersprungen"""
+        step = invoice.reminder_count + 1
+        while step + 1 in self.steps and self.step_time(invoice, step + 1) <= now:
+            step += 1
+        return step
+
+    def restore(self, state, invoices):
+        """Baut den Plan aus dem gespeicherten Stand und den offenen Rechnungen ``(id, rechnung)`` auf.
+
+        Gespeicherte Einträge gelten nur, wenn ihre Stufe noch zu ``reminder_count``
+        passt; für alle anderen Rechnungen wird der Zeitpunkt neu berechnet.
+        Gibt die Zahl der neu berechneten Rechnungen zurück.
+        """
+        self.clear()
+        state = state or {}
+        # Zeitpunkte aus einem anderen Mahnplan (geänderte Konfiguration) sind nicht verwendbar
+        schedule = state.get("schedule", {}) if state.get("steps") == self._steps_state() else {}
+        self.last_run = state.get("last_run")
+        computed = 0
+        for invoice_id, invoice in invoices:
+            if invoice.paid or invoice.reminder_count + 1 not in self.steps:
+                continue
+            saved = schedule.get(invoice_id)
+            if saved and saved[1] == invoice.reminder_count + 1 and saved[1] in self.steps:
+                self._next[invoice_id] = (saved[0], saved[1])
+            else:
+                self.update(invoice_id, invoice)
+                computed += 1
+        self._heap = [(when, key, step) for key, (when, step) in self._next.items()]
+        heapq.heapify(self._heap)
+        self._wakeup.set()
+        return computed
+
+    def state(self):
+        """Speicherbarer Stand: letzter Lauf und nächste Stufe je Rechnung"""
+        return {
+            "last_run": self.last_run,
+            "steps": self._steps_state(),
+            "schedule": {key: [when, step] for key, (when, step) in self._next.items()},
+        }
+
+    def _steps_state(self):
+        return [[step, days, surcharge] for step, (days, surcharge) in sorted(self.steps.items())]
+
+    def discard(self, invoice_id):
+        self._next.pop(invoice_id, None)
+
+    def next_time(self):
+        """Frühester gültiger Zeitpunkt oder ``None``"""
+        heap = self._heap
+        while heap and self._next.get(heap[0][1]) != (heap[0][0], heap[0][2]):
+            heapq.heappop(heap)
+        return heap[0][0] if heap else None
+
+    def pop_due(self, now):
+        """Entnimmt alle bis ``now`` fälligen Mahnungen als ``(rechnungs_id, stufe)``"""
+        due = []
+        while True:
+            when = self.next_time()
+            if when is None or when > now:
+                return due
+            _, invoice_id, step = heapq.heappop(self._heap)
+            del self._next[invoice_id]
+            due.append((invoice_id, step))
+
+    async def run(self, handler):
+        """Ruft ``handler([(rechnungs_id, stufe), ...])`` mit allen fälligen Mahnungen auf, pünktlich zum frühesten Zeitpunkt"""
+        while True:
+            self._wakeup.clear()
+            when = self.next_time()
+            timeout = MAX_SLEEP if when is None else min(MAX_SLEEP, max(0.0, when - time.time()))
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+            now = time.time()
+            self.last_run = now
+            due = self.pop_due(now)
+            if not due:
+                continue
+            try:
+                await handler(due)
+            except Exception as e:
+                logger.error(f"Fehler im Mahnlauf ({len(due)} Mahnungen), neuer Versuch in {self.retry_delay} s: {e}", exc_info=True)
+                # Die Einträge haben den Heap schon verlassen; was der Handler nicht neu eingeplant hat, erneut einplanen.
+                # Bereits versendete Stufen überspringt der Handler anhand von ``reminder_count``.
+                retry_at = now + self.retry_delay
+                for invoice_id, step in due:
+                    if invoice_id not in self._next:
+                        self._push(invoice_id, retry_at, step)
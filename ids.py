@@ -0,0 +1,122 @@
+import json
+import logging
+import os
+import random
+
+logger = logging.getLogger('InsuranceBot')
+
+# random: zufälliger Teil wie bisher, geprüft gegen Bestand und Archiv
+# sequential: laufende Nummer, jede Vergabe wird sofort gespeichert
+# block: laufende Nummer, reserviert werden Blöcke von ``block_size`` Nummern (nach einem Neustart bleibt eine Lücke)
+ID_MODES = ("random", "sequential", "block")
+ID_BLOCK_SIZE = 100
+# Versuche im Zufallsmodus, bevor der Zeitraum als voll gilt
+MAX_ATTEMPTS = 64
+
+
+class IdState:
+    """Reservierte laufende Nummern je ID-Art, gespeichert als kleine JSON-Datei.
+
+    Je Art wird nur der aktuelle Zeitraum gemerkt (``{"invoices": ["RE-2412-", 300]}``);
+    beginnt ein neuer Monat oder ein neues Jahr, wird der Eintrag ersetzt.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._reserved = {}
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                self._reserved = json.load(f)
+        except FileNotFoundError:
+            pass
+        except ValueError as e:
+            # Ohne Stand beginnt die Zählung neu; vergebene IDs werden per Bestandsprüfung übersprungen
+            logger.warning(f"ID-Stand {path} beschädigt, Zählung beginnt neu: {e}")
+
+    def reserved(self, name, series):
+        saved = self._reserved.get(name)
+        return saved[1] if saved and saved[0] == series else 0
+
+    def reserve(self, name, series, end):
+        self._reserved[name] = [series, end]
+        with open(self.path + ".tmp", 'w', encoding='utf-8') as f:
+            json.dump(self._reserved, f, separators=(',', ':'))
+        os.replace(self.path + ".tmp", self.path)
+
+
+class IdAllocator:
+    """Vergibt eindeutige IDs der Form ``<zeitraum><teil>``, z.B. ``RE-2412-`` + ``4K9Z``.
+
+    ``period_format`` ist ein ``strftime``-Muster für den festen Teil,
+    ``exists(id)`` prüft gegen den Live-Bestand samt kaltem Archiv (bei
+    ``TrackedDict`` und ``SqliteCollection`` ein Dict- bzw. Index-Zugriff).
+    Im Zufallsmodus werden zusätzlich die in diesem Prozess vergebenen IDs
+    gemerkt, damit zwei noch nicht gespeicherte Vorgänge nicht dieselbe ID
+    erhalten. Die Nummernmodi brauchen keine Wiederholungen; ``exists`` greift
+    dort nur, wenn der gespeicherte Stand fehlt oder im selben Zeitraum vorher
+    zufällige IDs vergeben wurden.
+    """
+
+    def __init__(self, name, period_format, alphabet, length, exists, mode="random", state=None,
+                 block_size=ID_BLOCK_SIZE, rng=None):
+        if mode not in ID_MODES:
+            raise ValueError(f"Unbekannter ID-Modus {mode!r} (erlaubt: {', '.join(ID_MODES)})")
+        if mode != "random" and state is None:
+            raise ValueError(f"ID-Modus {mode!r} braucht einen gespeicherten Stand")
+        self.name = name
+        self.period_format = period_format
+        self.alphabet = alphabet
+        self.length = length
+        self.exists = exists
+        self.mode = mode
+        self.state = state
+        self.block_size = 1 if mode == "sequential" else block_size
+        self.capacity = len(alphabet) ** length
+        # Laufende Nummern mit Ziffern zuerst, damit 0001 auf 0000 folgt
+        self._digits = sorted(alphabet)
+        self._rng = rng or random.Random()
+        self._series = None
+        self._issued = set()
+        self._next = 0
+        self._end = 0
+        # Übersprungene Kandidaten (Zufallsmodus: Kollisionen)
+        self.collisions = 0
+
+    def _start(self, series):
+        self._series = series
+        self._issued = set()
+        self._next = self._end = self.state.reserved(self.name, series) if self.state else 0
+
+    def encode(self, number):
+        base = len(self._digits)
+        digits = []
+        for _ in range(self.length):
+            number, rest = divmod(number, base)
+            digits.append(self._digits[rest])
+        return "".join(reversed(digits))
+
+    def allocate(self, now):
+        """Gibt eine neue, noch nicht vergebene ID für den Zeitraum von ``now`` zurück"""
+        series = now.strftime(self.period_format)
+        if series != self._series:
+            self._start(series)
+        if self.mode == "random":
+            for _ in range(MAX_ATTEMPTS):
+                candidate = series + "".join(self._rng.choices(self.alphabet, k=self.length))
+                if candidate not in self._issued and not self.exists(candidate):
+                    self._issued.add(candidate)
+                    return candidate
+                self.collisions += 1
+            raise RuntimeError(f"Keine freie ID für {series} nach {MAX_ATTEMPTS} Versuchen; "
+                               f"der Zeitraum ist nahezu voll (ID_MODE=block verwenden)")
+        while True:
+            if self._next >= self._end:
+                if self._next >= self.capacity:
+                    raise RuntimeError(f"Alle {self.capacity} IDs für {series} sind vergeben")
+                self._end = min(self._next + self.block_size, self.capacity)
+                self.state.reserve(self.name, series, self._end)
+            candidate = series + self.encode(self._next)
+            self._next += 1
+            if not self.exists(candidate):
+                return candidate
+            self.collisions += 1
@@ -0,0 +1,418 @@
+import bisect
+import gc
+import random
+from collections import Counter
+from datetime import datetime
+
+import pytz
+
+GERMANY_TZ = pytz.timezone('Europe/Berlin')
+
+
+def due_timestamp(invoice):
+    """Fälligkeit einer Rechnung als Unix-Zeit; Angaben ohne Zeitzone gelten als deutsche Zeit"""
+    due = datetime.fromisoformat(invoice.due_date)
+    if due.tzinfo is None:
+        due = GERMANY_TZ.localize(due)
+    return due.timestamp()
+
+
+def _add(index, value, key):
+    index.setdefault(value, set()).add(key)
+
+
+def _discard(index, value, key):
+    keys = index.get(value)
+    if keys is not None:
+        keys.discard(key)
+        if not keys:
+            del index[value]
+
+
+def search_terms(*values):
+    """Suchbegriffe für die Präfixsuche: jeder Wert vollständig und jedes Wort einzeln, ohne Groß-/Kleinschreibung"""
+    terms = []
+    for value in values:
+        if value:
+            value = str(value).casefold()
+            terms.append(value)
+            if " " in value:
+                terms += value.split()
+    return tuple(dict.fromkeys(terms))
+
+
+class PrefixIndex:
+    """Sortierte Liste ``(begriff, schlüssel)``; Präfixsuche per ``bisect`` statt linearer Suche"""
+
+    def __init__(self):
+        self._entries = []
+
+    def __eq__(self, other):
+        return isinstance(other, PrefixIndex) and self._entries == other._entries
+
+    def __len__(self):
+        return len(self._entries)
+
+    def add(self, terms, key, ordered=True):
+        for term in terms:
+            if ordered:
+                bisect.insort(self._entries, (term, key))
+            else:
+                self._entries.append((term, key))
+
+    def sort(self):
+        self._entries.sort()
+
+    def remove(self, terms, key):
+        for term in terms:
+            position = bisect.bisect_left(self._entries, (term, key))
+            if position < len(self._entries) and self._entries[position] == (term, key):
+                del self._entries[position]
+
+    def search(self, prefix):
+        """Liefert die Schlüssel aller Begriffe mit diesem Präfix in Sortierreihenfolge, jeden nur einmal"""
+        prefix = prefix.casefold().strip()
+        entries = self._entries
+        seen = set()
+        for position in range(bisect.bisect_left(entries, (prefix,)), len(entries)):
+            term, key = entries[position]
+            if not term.startswith(prefix):
+                return
+            if key not in seen:
+                seen.add(key)
+                yield key
+
+
+def trigrams(value):
+    """Trigramme eines Werts ohne Groß-/Kleinschreibung; Wortanfänge zählen durch das Auffüllen stärker"""
+    text = f"  {' '.join(str(value).casefold().split())} "
+    return frozenset(text[i:i + 3] for i in range(len(text) - 2))
+
+
+class TrigramIndex:
+    """Trigramm -> Schlüssel; unscharfe Suche, die auch Tippfehler findet.
+
+    Kandidaten sind die Schlüssel mit den meisten gemeinsamen Trigrammen;
+    sehr häufige (``"  m"``, ``"er "``) werden dabei übergangen, sie würden
+    sonst fast jeden Schlüssel liefern. Bewertet wird mit dem
+    Dice-Koeffizienten gegen das am besten passende Feld oder Wort, damit
+    eine Suche nach Nachname oder HBPay-Nummer nicht durch den übrigen
+    Namen verwässert wird. Je Schlüssel werden nur die Feldwerte gemerkt und die Trigramme bei
+    Bedarf neu gebildet, Postings sind Listen statt Mengen; so bleibt der
+    Index bei 100 000 Akten unter 50 MB.
+    """
+
+    # Mindestbewertung eines Treffers (1.0 = identisch)
+    THRESHOLD = 0.3
+    # Nur die Schlüssel mit den meisten gemeinsamen Trigrammen werden genau bewertet
+    CANDIDATES = 200
+
+    def __init__(self):
+        self._postings = {}
+        self._values = {}
+
+    def __eq__(self, other):
+        if not isinstance(other, TrigramIndex) or self._values != other._values or self._postings.keys() != other._postings.keys():
+            return False
+        # Die Reihenfolge innerhalb eines Postings hängt von der Reihenfolge der Änderungen ab
+        return all(len(keys) == len(other._postings[gram]) and set(keys) == set(other._postings[gram])
+                   for gram, keys in self._postings.items())
+
+    def __len__(self):
+        return len(self._values)
+
+    @staticmethod
+    def _grams(values):
+        return frozenset().union(*(trigrams(term) for term in search_terms(*values)))
+
+    def add(self, key, values):
+        self.remove(key)
+        values = self._values[key] = tuple(str(value) for value in values if value)
+        postings = self._postings
+        for gram in self._grams(values):
+            keys = postings.get(gram)
+            if keys is None:
+                postings[gram] = [key]
+            else:
+                keys.append(key)
+
+    def remove(self, key):
+        values = self._values.pop(key, None)
+        if values is None:
+            return
+        for gram in self._grams(values):
+            keys = self._postings[gram]
+            keys.remove(key)
+            if not keys:
+                del self._postings[gram]
+
+    def _candidates(self, grams):
+        postings = sorted((self._postings.get(gram, ()) for gram in grams), key=len)
+        # Sehr häufige Trigramme nur heranziehen, solange die seltenen nichts liefern
+        limit = max(1000, len(self._values) // 20)
+        counts = Counter()
+        for posting in postings:
+            if counts and len(posting) > limit:
+                break
+            counts.update(posting)
+        return [key for key, _ in counts.most_common(self.CANDIDATES)]
+
+    def search(self, query, threshold=THRESHOLD):
+        """Liefert ``(bewertung, schlüssel)`` der besten Treffer, beste zuerst"""
+        if not query.strip():
+            return []
+        grams = trigrams(query)
+        size = len(grams)
+        results = []
+        for key in self._candidates(grams):
+            score = 0.0
+            for term in search_terms(*self._values[key]):
+                field = trigrams(term)
+                score = max(score, 2 * len(grams & field) / (size + len(field)))
+            if score >= threshold:
+                results.append((score, key))
+        results.sort(key=lambda result: (-result[0], result[1]))
+        return results
+
+
+class RecordIndexes:
+    """Sekundärindizes über die heißen Akten und Rechnungen.
+
+    Je Schlüssel werden die zuletzt indizierten Werte gemerkt, damit eine
+    Änderung (Datensätze werden in ``main.py`` direkt verändert und dann mit
+    ``save_record`` gespeichert) die alten Einträge gezielt entfernen kann.
+    Aufgebaut wird erst bei der ersten Abfrage, damit der Start über den
+    Snapshot-Index nicht alle Datensätze laden muss; bis dahin sind
+    ``update`` und ``remove`` kostenlos.
+    """
+
+    def __init__(self, data):
+        self.reset(data)
+
+    def reset(self, data):
+        """Bindet die Indizes an einen neuen Bestand (nach ``load`` oder ``replace``)"""
+        self._data = data
+        self._built = False
+        self._customers = {}
+        self._invoices = {}
+        self.customers_by_user = {}
+        self.customers_by_insurance = {}
+        self.invoices_by_customer = {}
+        self.unpaid = set()
+        self.paid = set()
+        # (Fälligkeit, Rechnungs-ID) aller offenen Rechnungen, aufsteigend sortiert
+        self.due = []
+        # Präfixsuche über IDs und RP-Namen (Autocomplete)
+        self.customer_prefixes = PrefixIndex()
+        self.invoice_prefixes = PrefixIndex()
+        # Unscharfe Suche über RP-Name, HBPay-Nummer und Economy-ID (/kunde_suchen)
+        self.customer_trigrams = TrigramIndex()
+
+    def _build(self):
+        self._built = True
+        # Der Aufbau erzeugt sehr viele langlebige Objekte; die zyklische GC würde dabei wiederholt den ganzen Bestand durchlaufen
+        enabled = gc.isenabled()
+        gc.disable()
+        try:
+            for key, customer in self._data["customers"].items():
+                self._add_customer(key, customer, ordered=False)
+            for key, invoice in self._data["invoices"].items():
+                self._add_invoice(key, invoice)
+            self.due.sort()
+            self.customer_prefixes.sort()
+            self.invoice_prefixes.sort()
+        finally:
+            if enabled:
+                gc.enable()
+
+    def _ensure(self):
+        if not self._built:
+            self._build()
+
+    def _add_customer(self, key, customer, ordered=True):
+        indexed = self._customers[key] = (
+            customer.discord_user_id, tuple(customer.versicherungen), search_terms(key, customer.rp_name)
+        )
+        _add(self.customers_by_user, indexed[0], key)
+        for insurance in indexed[1]:
+            _add(self.customers_by_insurance, insurance, key)
+        self.customer_prefixes.add(indexed[2], key, ordered)
+        self.customer_trigrams.add(key, (customer.rp_name, customer.hbpay_nummer, customer.economy_id))
+
+    def _remove_customer(self, key):
+        indexed = self._customers.pop(key, None)
+        if indexed is None:
+            return
+        _discard(self.customers_by_user, indexed[0], key)
+        for insurance in indexed[1]:
+            _discard(self.customers_by_insurance, insurance, key)
+        self.customer_prefixes.remove(indexed[2], key)
+        self.customer_trigrams.remove(key)
+
+    def _add_invoice(self, key, invoice, ordered=False):
+        due = None if invoice.paid else due_timestamp(invoice)
+        terms = search_terms(key, invoice.customer_id)
+        self._invoices[key] = (invoice.customer_id, due, terms)
+        _add(self.invoices_by_customer, invoice.customer_id, key)
+        self.invoice_prefixes.add(terms, key, ordered)
+        if due is None:
+            self.paid.add(key)
+            return
+        self.unpaid.add(key)
+        if ordered:
+            bisect.insort(self.due, (due, key))
+        else:
+            self.due.append((due, key))
+
+    def _remove_invoice(self, key):
+        indexed = self._invoices.pop(key, None)
+        if indexed is None:
+            return
+        customer_id, due, terms = indexed
+        _discard(self.invoices_by_customer, customer_id, key)
+        self.invoice_prefixes.remove(terms, key)
+        self.paid.discard(key)
+        self.unpaid.discard(key)
+        if due is not None:
+            position = bisect.bisect_left(self.due, (due, key))
+            if position < len(self.due) and self.due[position] == (due, key):
+                del self.due[position]
+
+    def update(self, collection, key):
+        """Übernimmt den aktuellen Stand eines Datensatzes (fehlt er im heißen Bestand, wird er entfernt)"""
+        if not self._built or collection not in ("customers", "invoices"):
+            return
+        record = self._data[collection].get_hot(key)
+        if collection == "customers":
+            self._remove_customer(key)
+            if record is not None:
+                self._add_customer(key, record)
+        else:
+            self._remove_invoice(key)
+            if record is not None:
+                self._add_invoice(key, record, ordered=True)
+
+    def remove(self, collection, key):
+        """Entfernt einen Datensatz, z.B. nach dem Verschieben ins kalte Archiv"""
+        if not self._built:
+            return
+        if collection == "customers":
+            self._remove_customer(key)
+        elif collection == "invoices":
+            self._remove_invoice(key)
+
+    # Abfragen
+    def customer_ids_for_user(self, discord_user_id):
+        self._ensure()
+        return set(self.customers_by_user.get(discord_user_id, ()))
+
+    def customer_ids_with_insurance(self, insurance):
+        self._ensure()
+        return set(self.customers_by_insurance.get(insurance, ()))
+
+    def invoice_ids_for_customer(self, customer_id):
+        self._ensure()
+        return set(self.invoices_by_customer.get(customer_id, ()))
+
+    def unpaid_invoice_ids(self):
+        self._ensure()
+        return set(self.unpaid)
+
+    def paid_invoice_ids(self):
+        self._ensure()
+        return set(self.paid)
+
+    def invoices_due_before(self, timestamp):
+        """Offene Rechnungen mit Fälligkeit vor ``timestamp`` als ``(fälligkeit, id)``, älteste zuerst"""
+        self._ensure()
+        return self.due[:bisect.bisect_left(self.due, (timestamp,))]
+
+    def search_customers(self, prefix):
+        """Akten, deren ID, RP-Name oder ein Wort des Namens mit ``prefix`` beginnt"""
+        self._ensure()
+        return self.customer_prefixes.search(prefix)
+
+    def find_customers(self, query):
+        """Unscharfe Suche über RP-Name, HBPay-Nummer und Economy-ID als ``(bewertung, id)``, beste zuerst"""
+        self._ensure()
+        return self.customer_trigrams.search(query)
+
+    def search_invoices(self, prefix):
+        """Rechnungen, deren ID oder Kunden-ID mit ``prefix`` beginnt"""
+        self._ensure()
+        return self.invoice_prefixes.search(prefix)
+
+    def check(self, sample=None):
+        """Vergleicht die Indizes mit einem frisch aufgebauten Stand und gibt die Abweichungen zurück.
+
+        Mit ``sample`` werden nur die Anzahlen und je Sammlung ``sample``
+        zufällige Datensätze geprüft; das ist auch im laufenden Bot günstig,
+        während der vollständige Vergleich alle Indizes ein zweites Mal aufbaut.
+        """
+        if not self._built:
+            return []
+        if sample is not None:
+            return self._check_sample(sample)
+        fresh = RecordIndexes(self._data)
+        fresh._build()
+        problems = []
+        for name in ("_customers", "_invoices", "customers_by_user", "customers_by_insurance",
+                     "invoices_by_customer", "unpaid", "paid", "due", "customer_prefixes", "invoice_prefixes",
+                     "customer_trigrams"):
+            expected = getattr(fresh, name)
+            actual = getattr(self, name)
+            if actual != expected:
+                if isinstance(expected, dict):
+                    wrong = {key for key in expected.keys() | actual.keys() if expected.get(key) != actual.get(key)}
+                elif isinstance(expected, set):
+                    wrong = expected ^ actual
+                elif isinstance(expected, PrefixIndex):
+                    wrong = set(expected._entries) ^ set(actual._entries)
+                elif isinstance(expected, TrigramIndex):
+                    wrong = {key for key in expected._values.keys() | actual._values.keys()
+                             if expected._values.get(key) != actual._values.get(key)} or {"Postings"}
+                else:
+                    wrong = set(expected) ^ set(actual)
+                problems.append(f"{name.lstrip('_')}: {len(wrong)} Abweichungen (z.B. {sorted(map(str, wrong))[:3]})")
+        return problems
+
+    def _check_sample(self, sample):
+        fresh = RecordIndexes(self._data)
+        fresh._built = True
+        problems = []
+        for name, indexed, add in (("customers", self._customers, fresh._add_customer),
+                                   ("invoices", self._invoices, fresh._add_invoice)):
+            collection = self._data[name]
+            total = len(collection)
+            if total != len(indexed):
+                problems.append(f"{name}: {len(indexed)} indiziert, {total} im Bestand")
+            wrong = []
+            for key in random.sample(list(indexed), min(sample, len(indexed))):
+                record = collection.get_hot(key)
+                if record is None:
+                    wrong.append(key)
+                    continue
+                add(key, record)
+                if not self._matches(fresh, name, key):
+                    wrong.append(key)
+            if wrong:
+                problems.append(f"{name}: {len(wrong)} von {min(sample, len(indexed))} Stichproben abweichend (z.B. {sorted(wrong)[:3]})")
+        return problems
+
+    def _matches(self, fresh, name, key):
+        """Vergleicht die Einträge eines Datensatzes mit denen aus ``fresh``"""
+        if name == "customers":
+            indexed = fresh._customers[key]
+            return (self._customers.get(key) == indexed
+                    and key in self.customers_by_user.get(indexed[0], ())
+                    and all(key in self.customers_by_insurance.get(insurance, ()) for insurance in indexed[1])
+                    and self.customer_trigrams._values.get(key) == fresh.customer_trigrams._values.get(key))
+        customer_id, due, _ = indexed = fresh._invoices[key]
+        return (self._invoices.get(key) == indexed
+                and key in self.invoices_by_customer.get(customer_id, ())
+                and (key in self.paid) == (due is None)
+                and (key in self.unpaid) == (due is not None))
+
+    def rebuild(self):
+        self.reset(self._data)
+        self._build()
@@ -0,0 +1,129 @@
+import gzip
+import json
+import os
+import logging
+import shutil
+import threading
+
+logger = logging.getLogger('InsuranceBot')
+
+# Länge des Zeitstempel-Präfixes, nach dem segmentiert wird
+PARTITIONS = {"day": 10, "month": 7}
+
+
+class ActivityLog:
+    """Append-only Aktivitätsprotokoll in zeitlich partitionierten Segmentdateien.
+
+    Jedes Segment (``activity-2024-12-01.jsonl``) enthält eine Zeile pro
+    Eintrag. Abgeschlossene Segmente werden optional mit gzip komprimiert.
+    Das Protokoll wird nie komplett geladen; ``tail`` liest nur so viele der
+    neuesten Segmente, wie für die gewünschte Anzahl Einträge nötig sind.
+    Dieselbe Klasse dient auch als Änderungsprotokoll der Speicher (``Storage.history``).
+    """
+
+    def __init__(self, directory, partition="day", compress=True, name="activity"):
+        self.directory = directory
+        self.name = name
+        self.prefix_length = PARTITIONS[partition]
+        self.compress = compress
+        self._lock = threading.Lock()
+        self._current = None
+        self._handle = None
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, segment, compressed=False):
+        return os.path.join(self.directory, f"{self.name}-{segment}.jsonl" + (".gz" if compressed else ""))
+
+    def segments(self):
+        """Gibt die vorhandenen Segmente aufsteigend sortiert zurück"""
+        names = set()
+        prefix = f"{self.name}-"
+        for filename in os.listdir(self.directory):
+            if filename.startswith(prefix) and filename.endswith((".jsonl", ".jsonl.gz")):
+                names.add(filename[len(prefix):].split(".jsonl")[0])
+        return sorted(names)
+
+    def encode(self, entry):
+        """Kodiert einen Eintrag; das Ergebnis wird später von ``write`` geschrieben"""
+        return (entry["timestamp"][:self.prefix_length], json.dumps(entry, ensure_ascii=False) + "\n")
+
+    def write(self, encoded):
+        """Hängt kodierte Einträge an ihre Segmente an und schließt veraltete Segmente ab"""
+        with self._lock:
+            for segment, line in encoded:
+                if segment != self._current:
+                    self._switch(segment)
+                self._handle.write(line)
+            if self._handle:
+                self._handle.flush()
+
+    def _switch(self, segment):
+        if self._handle:
+            self._handle.close()
+        self._current = segment
+        self._handle = open(self._path(segment), 'a', encoding='utf-8')
+        # Auch Segmente abschließen, die vor einem Neustart offen geblieben sind
+        for older in self.segments():
+            if older < segment:
+                self._close_segment(older)
+
+    def _close_segment(self, segment):
+        path = self._path(segment)
+        if not self.compress or not os.path.exists(path):
+            return
+        compressed = self._path(segment, compressed=True)
+        # Wurde das Segment nachträglich wieder geöffnet (Migration, wiederholter Batch), bleibt das
+        # bisherige Archiv erhalten; gzip erlaubt aneinandergehängte Member
+        if os.path.exists(compressed):
+            shutil.copyfile(compressed, compressed + ".tmp")
+        else:
+            open(compressed + ".tmp", 'wb').close()
+        with open(path, 'rb') as src, gzip.open(compressed + ".tmp", 'ab') as dst:
+            dst.write(src.read())
+        os.replace(compressed + ".tmp", compressed)
+        os.remove(path)
+        logger.info(f"Protokollsegment {segment} komprimiert")
+
+    def _read_segment(self, segment):
+        entries = []
+        # Komprimierte Einträge sind älter als die noch offene Datei
+        for compressed in (True, False):
+            path = self._path(segment, compressed)
+            try:
+                opener = gzip.open if compressed else open
+                with opener(path, 'rt', encoding='utf-8') as f:
+                    for line in f:
+                        if not line.endswith("\n"):
+                            break
+                        entries.append(json.loads(line))
+            except FileNotFoundError:
+                continue
+        return entries
+
+    def tail(self, count):
+        """Gibt die letzten ``count`` Einträge in chronologischer Reihenfolge zurück"""
+        if count <= 0:
+            return []
+        collected = []
+        for segment in reversed(self.segments()):
+            collected[:0] = self._read_segment(segment)
+            if len(collected) >= count:
+                break
+        return collected[-count:]
+
+    def entries(self, since=None):
+        """Liefert alle Einträge ab dem Segment ``since`` (z.B. ``"2024-12-01"``) in chronologischer Reihenfolge"""
+        for segment in self.segments():
+            if since is None or segment >= since[:self.prefix_length]:
+                yield from self._read_segment(segment)
+
+    def migrate(self, entries):
+        """Übernimmt Einträge aus dem früheren ``data['logs']`` in die Segmente"""
+        self.write(sorted((self.encode(entry) for entry in entries), key=lambda item: item[0]))
+
+    def close(self):
+        with self._lock:
+            if self._handle:
+                self._handle.close()
+                self._handle = None
+                self._current = None
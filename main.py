@@ -3,12 +3,31 @@ from discord import app_commands
 from discord.ext import commands, tasks
 import json
 import os
+import asyncio
+import atexit
 from datetime import datetime, timedelta
 import logging
-import random
 import string
+import tempfile
+import time
+import aiohttp
 import pytz
 from werkzeug.datastructures import auth
+from storage import JournalStore, SqliteStore, PersistenceWorker
+from logstore import ActivityLog
+from outbound import OutboundQueue, WebhookTransport
+from archive import ColdArchive, ARCHIVE_COLLECTIONS, is_archivable
+from ids import IdAllocator, IdState
+from indexes import RecordIndexes
+from dunning import DunningScheduler, DunningReport, ReminderAction, load_state, parse_schedule, send_batch, write_state
+from backups import BackupChain, build_zip
+from recovery import recover, parse_time, read_upload, stage_reload
+from records import Customer, Invoice, PendingAuszahlung
+from roles import RoleRegistry
+from serializers import FORMATS, PRETTY_JSON, get_format
+
+# Startzeitpunkt für die Messung bis zur Einsatzbereitschaft
+STARTED_AT = time.perf_counter()
 
 # Zeitzone konfigurieren
 GERMANY_TZ = pytz.timezone('Europe/Berlin')
@@ -36,7 +55,70 @@ bot = commands.Bot(command_prefix="!", intents=intents)
 
 # Datenspeicherung
 DATA_FILE = "insurance_data.json"
+JOURNAL_FILE = "insurance_data.journal"
+SQLITE_FILE = "insurance_data.db"
 CONFIG_FILE = "bot_config.json"
+# Aktivitätsprotokoll: ein Segment pro Tag, abgeschlossene Segmente werden komprimiert
+ACTIVITY_LOG_DIR = "activity_log"
+ACTIVITY_LOG_PARTITION = os.getenv('ACTIVITY_LOG_PARTITION', 'day')
+ACTIVITY_LOG_COMPRESS = os.getenv('ACTIVITY_LOG_COMPRESS', '1') == '1'
+# Änderungsprotokoll aller Datensätze für die Wiederherstellung zu einem Zeitpunkt
+HISTORY_DIR = "history"
+# Kaltes Archiv für archivierte Akten und Rechnungen
+ARCHIVE_DIR = "archive"
+JOURNAL_COMPACT_THRESHOLD = 1000
+# Mahnplan je Stufe "tage nach Fälligkeit:Mahngebühr in Prozent"; der Stand wird in DUNNING_STATE_FILE gespeichert
+DUNNING_SCHEDULE = parse_schedule(os.getenv('DUNNING_SCHEDULE', '0:0,1:5,2:10'))
+DUNNING_STATE_FILE = "dunning_state.json"
+# Mahnläufe: gleichzeitig versendete Mahnungen und Wartezeit (Sekunden) vor einem erneuten Versuch
+DUNNING_CONCURRENCY = int(os.getenv('DUNNING_CONCURRENCY', '4'))
+DUNNING_RETRY = 900
+# Vergabe neuer IDs: "random" (wie bisher zufällig, mit Kollisionsprüfung), "sequential" oder "block" (laufende Nummern, Stand in ID_STATE_FILE)
+ID_MODE = os.getenv('ID_MODE', 'random')
+ID_STATE_FILE = "id_state.json"
+# Versand von Logs, Rechnungen und Mahnungen: "channel" (über den Bot) oder "webhook" (eigener Webhook je Kanal)
+DELIVERY_TRANSPORT = os.getenv('DELIVERY_TRANSPORT', 'channel')
+WEBHOOK_NAME = "InsuranceGuard"
+# Zeitfenster (Sekunden), in dem Änderungen zu einem Schreibvorgang zusammengefasst werden
+PERSISTENCE_WINDOW = float(os.getenv('PERSISTENCE_WINDOW', '0.05'))
+# Datensätze je Sammlung, die bei der regelmäßigen Indexprüfung verglichen werden
+INDEX_CHECK_SAMPLE = 200
+
+# Format des Live-Snapshots und der lokalen Backups: json-pretty, json, json.gz, json.xz oder marshal.
+# insurance_data.json bleibt als lesbarer Export erhalten.
+SNAPSHOT_FORMAT = get_format(os.getenv('SNAPSHOT_FORMAT', 'json'))
+BACKUP_FORMAT = get_format(os.getenv('BACKUP_FORMAT', 'json.gz'))
+# Lokale Backups: nach BACKUP_FULL_EVERY Backups (oder vielen Änderungen) ein Vollbackup, sonst nur die Änderungen
+BACKUP_DIR = "backups"
+BACKUP_FULL_EVERY = int(os.getenv('BACKUP_FULL_EVERY', '8'))
+# Aufbewahrung: jeweils das neueste Backup der letzten N Stunden, Tage und Wochen
+BACKUP_RETENTION = {
+    "hourly": int(os.getenv('BACKUP_KEEP_HOURLY', '24')),
+    "daily": int(os.getenv('BACKUP_KEEP_DAILY', '7')),
+    "weekly": int(os.getenv('BACKUP_KEEP_WEEKLY', '8')),
+}
+SNAPSHOT_FILE = DATA_FILE if SNAPSHOT_FORMAT is PRETTY_JSON else "insurance_data.snapshot" + SNAPSHOT_FORMAT.suffix
+# Beim Start nur den Index lesen und Datensätze erst bei Bedarf laden (nur json und marshal)
+LAZY_STARTUP = os.getenv('LAZY_STARTUP', '1') == '1'
+
+# Speicher-Backend: "journal" (Snapshot + Journal) oder "sqlite"
+STORAGE_BACKEND = os.getenv('STORAGE_BACKEND', 'journal')
+activity_log = ActivityLog(ACTIVITY_LOG_DIR, partition=ACTIVITY_LOG_PARTITION, compress=ACTIVITY_LOG_COMPRESS)
+history_log = ActivityLog(HISTORY_DIR, name="history")
+cold_archive = ColdArchive(ARCHIVE_DIR)
+if STORAGE_BACKEND == 'sqlite':
+    store = SqliteStore(SQLITE_FILE, import_path=DATA_FILE, activity_log=activity_log, cold_archive=cold_archive,
+                        history=history_log)
+else:
+    store = JournalStore(
+        SNAPSHOT_FILE, JOURNAL_FILE, compact_threshold=JOURNAL_COMPACT_THRESHOLD,
+        activity_log=activity_log, cold_archive=cold_archive, history=history_log, snapshot_format=SNAPSHOT_FORMAT,
+        # Erst Snapshots anderer Formate (passend zum Journal), dann der lesbare Export
+        fallback_paths=["insurance_data.snapshot" + fmt.suffix for fmt in FORMATS.values()] + [DATA_FILE],
+        lazy=LAZY_STARTUP
+    )
+persistence = PersistenceWorker(store, window=PERSISTENCE_WINDOW)
+backup_chain = BackupChain(BACKUP_DIR, BACKUP_FORMAT, full_every=BACKUP_FULL_EVERY, retention=BACKUP_RETENTION)
 
 def load_config():
     if os.path.exists(CONFIG_FILE):
@@ -56,80 +138,180 @@ def save_config(config):
 config = load_config()
 
 def load_data():
-    if os.path.exists(DATA_FILE):
-        with open(DATA_FILE, 'r', encoding='utf-8') as f:
-            logger.info("Daten erfolgreich geladen")
-            return json.load(f)
+    if store.exists():
+        loaded = store.load()
+        logger.info(f"Daten erfolgreich geladen ({STORAGE_BACKEND})")
+        migrated = store.migrate_logs()
+        if migrated:
+            logger.info(f"{migrated} Protokolleinträge ins Aktivitätsprotokoll verschoben")
+        if store.needs_compaction():
+            store.compact()
+        store.track_changes()
+        return loaded
     logger.warning("Keine Datendatei gefunden, erstelle neue Datenstruktur")
-    return {"customers": {}, "invoices": {}, "logs": [], "schadensmeldungen": {}}
-
-def save_data(data):
-    with open(DATA_FILE, 'w', encoding='utf-8') as f:
-        json.dump(data, f, indent=4, ensure_ascii=False)
-    global _last_data_hash
-    _last_data_hash = _get_data_hash()
-    logger.info("Daten erfolgreich gespeichert")
-
-def _get_data_hash() -> str:
-    """Gibt einen Hash des aktuellen Dateiinhalts zurück"""
-    import hashlib
-    if not os.path.exists(DATA_FILE):
-        return ""
-    with open(DATA_FILE, 'rb') as f:
-        return hashlib.md5(f.read()).hexdigest()
-
-_last_data_hash: str = ""
+    loaded = store.load()
+    store.track_changes()
+    return loaded
+
+def save_data():
+    """Stellt einen vollständigen, konsistenten Stand zum Schreiben in die Warteschlange"""
+    persistence.compact()
+    logger.info("Daten-Snapshot zum Speichern eingereiht")
+
+def save_record(collection, key):
+    """Stellt den aktuellen Stand eines einzelnen Datensatzes zum Schreiben in die Warteschlange"""
+    save_records(collection, [key])
+
+def save_records(collection, keys):
+    """Stellt mehrere Datensätze gemeinsam zum Schreiben ein; die Verdichtung wird nur einmal geprüft"""
+    for key in keys:
+        persistence.put(collection, key, data[collection][key])
+        indexes.update(collection, key)
+        if collection == "invoices":
+            dunning.update(key, data[collection].get_hot(key))
+    if persistence.needs_compaction():
+        save_data()
+
+async def move_to_archive(collection, keys):
+    """Verschiebt abgeschlossene Datensätze aus dem heißen Bestand ins kalte Archiv"""
+    encoded = cold_archive.encode([(key, data[collection][key]) for key in keys])
+    if not encoded:
+        return 0
+    await asyncio.to_thread(cold_archive.add, collection, encoded)
+    for key, _, _ in encoded:
+        persistence.delete(collection, key)
+        indexes.remove(collection, key)
+        dunning.discard(key)
+    if persistence.needs_compaction():
+        save_data()
+    logger.info(f"{len(encoded)} Datensätze aus {collection} ins Archiv verschoben")
+    return len(encoded)
+
+def verify_indexes():
+    """Prüft die Sekundärindizes stichprobenartig gegen den Bestand und verwirft sie bei Abweichungen.
+
+    Ein vollständiger Vergleich würde alle Indizes im Event-Loop ein zweites Mal
+    aufbauen; verworfene Indizes werden bei der nächsten Abfrage neu aufgebaut.
+    """
+    problems = indexes.check(sample=INDEX_CHECK_SAMPLE)
+    if problems:
+        logger.warning(f"Sekundärindizes inkonsistent, werden neu aufgebaut: {'; '.join(problems)}")
+        indexes.reset(data)
+    return problems
+
+async def replace_data(new_data):
+    """Ersetzt den gesamten Bestand, wartet auf das Schreiben und baut Sekundärindizes und Mahnplan neu auf"""
+    global data
+    # Bei SQLite sehen die neuen Sichten den Bestand erst nach dem Schreiben; vorher wäre der Mahnplan leer
+    data = await persistence.replace_durable(new_data)
+    indexes.reset(data)
+    schedule_dunning()
+    return data
+
+def schedule_dunning(state=None):
+    """Trägt alle offenen Rechnungen in den Mahnplan ein; mit ``state`` werden gespeicherte Zeitpunkte übernommen.
+
+    Offene Rechnungen liegen immer im Speicher, daher reichen die bereits geladenen Datensätze.
+    """
+    return dunning.restore(state, data['invoices'].loaded_items())
+
+def save_dunning_state():
+    # Vor dem Start des Mahnplans würde ein leerer Plan den gespeicherten überschreiben
+    if _dunning_task is not None:
+        write_state(DUNNING_STATE_FILE, dunning.state())
+
+# Generation des Datenbestands beim letzten automatischen Backup
+_last_backup_generation: int = 0
+# Sekunden vom Prozessstart bis zum ersten on_ready
+_ready_after = None
+
+# Eindeutige IDs: geprüft gegen Bestand und kaltes Archiv (``in`` fällt auf das Archiv zurück)
+id_state = IdState(ID_STATE_FILE) if ID_MODE != "random" else None
+id_allocators = {
+    "customers": IdAllocator("customers", "VN-%y", string.digits, 6, lambda key: key in data['customers'], ID_MODE, id_state),
+    "invoices": IdAllocator("invoices", "RE-%y%m-", string.ascii_uppercase + string.digits, 4, lambda key: key in data['invoices'], ID_MODE, id_state),
+    "schadensmeldungen": IdAllocator("schadensmeldungen", "SM-%y%m-", string.ascii_uppercase + string.digits, 4, lambda key: key in data['schadensmeldungen'], ID_MODE, id_state),
+    "pending_auszahlungen": IdAllocator("pending_auszahlungen", "AZ-%y%m-", string.ascii_uppercase + string.digits, 4, lambda key: key in data['pending_auszahlungen'], ID_MODE, id_state),
+}
 
 def generate_customer_id():
-    prefix = "VN"
-    year = get_now().strftime("%y")
-    random_part = ''.join(random.choices(string.digits, k=6))
-    return f"{prefix}-{year}{random_part}"
+    return id_allocators["customers"].allocate(get_now())
 
 def generate_invoice_id():
-    prefix = "RE"
-    year = get_now().strftime("%y")
-    month = get_now().strftime("%m")
-    random_part = ''.join(random.choices(string.ascii_uppercase + string.digits, k=4))
-    return f"{prefix}-{year}{month}-{random_part}"
+    return id_allocators["invoices"].allocate(get_now())
 
 def generate_schaden_id():
-    prefix = "SM"
-    year = get_now().strftime("%y")
-    month = get_now().strftime("%m")
-    random_part = ''.join(random.choices(string.ascii_uppercase + string.digits, k=4))
-    return f"{prefix}-{year}{month}-{random_part}"
+    return id_allocators["schadensmeldungen"].allocate(get_now())
 
 def generate_auszahlung_id():
-    prefix = "AZ"
-    year = get_now().strftime("%y")
-    month = get_now().strftime("%m")
-    random_part = ''.join(random.choices(string.ascii_uppercase + string.digits, k=4))
-    return f"{prefix}-{year}{month}-{random_part}"
+    return id_allocators["pending_auszahlungen"].allocate(get_now())
+
+def webhook_profile():
+    return {"username": bot.user.name, "avatar_url": bot.user.display_avatar.url} if bot.user else {}
+
+# Logs, Rechnungen und Mahnungen wahlweise über einen Webhook je Kanal (eigene Rate-Limits, Rückfall auf den Bot)
+transport = WebhookTransport(WEBHOOK_NAME, webhook_profile, enabled=DELIVERY_TRANSPORT == "webhook")
+
+async def deliver_log(channel, embeds):
+    await transport.send(channel, embeds=embeds)
+    logger.info(f"{len(embeds)} Log(s) an Channel {channel.id} gesendet")
+
+# Log-Embeds werden im Hintergrund gebündelt (bis zu 10 je Nachricht) und gedrosselt versendet
+log_queue = OutboundQueue(deliver_log)
 
 async def send_to_log_channel(guild, embed):
-    """Sendet eine Nachricht in den Log-Channel"""
+    """Reiht eine Nachricht für den Log-Channel ein; der Aufrufer wartet nicht auf den Versand"""
     if config["log_channel_id"]:
-        try:
-            log_channel = guild.get_channel(config["log_channel_id"])
-            if log_channel:
-                await log_channel.send(embed=embed)
-                logger.info(f"Log an Channel {config['log_channel_id']} gesendet")
-        except Exception as e:
-            logger.error(f"Fehler beim Senden an Log-Channel: {e}")
-
-def create_backup():
-    """Erstellt ein Backup der aktuellen Datendatei"""
+        log_channel = guild.get_channel(config["log_channel_id"])
+        if log_channel:
+            log_queue.put(log_channel.id, log_channel, embed)
+
+# Reserve für den Rest der Nachricht, wenn ein Backup-ZIP an das Upload-Limit angepasst wird
+ATTACHMENT_RESERVE = 64 * 1024
+DEFAULT_ATTACHMENT_LIMIT = 10 * 1024 * 1024
+
+def _backup_files():
+    """Dateien des ZIP-Backups als ``(pfad, name im Archiv)``"""
+    files = [(DATA_FILE, "insurance_data.json"), (CONFIG_FILE, "bot_config.json")]
+    files += [(path, f"archive/{os.path.basename(path)}") for path in cold_archive.files()]
+    return files
+
+async def build_backup_zip(prefix, guild):
+    """Baut das Backup-ZIP im Worker-Thread; gibt ``(datei, dateiname)``-Paare passend zum Upload-Limit zurück"""
+    limit = guild.filesize_limit if guild else DEFAULT_ATTACHMENT_LIMIT
+    parts = await asyncio.to_thread(build_zip, _backup_files(), limit - ATTACHMENT_RESERVE)
+    filename = f"{prefix}_{get_now().strftime('%Y%m%d_%H%M%S')}.zip"
+    if len(parts) == 1:
+        return [(parts[0], filename)]
+    logger.info(f"Backup-ZIP in {len(parts)} Teile aufgeteilt (Limit {limit / 2**20:.0f} MB)")
+    return [(part, f"{filename}.{index:03d}") for index, part in enumerate(parts, start=1)]
+
+# Hochgeladene Dateien bis zu dieser Größe bleiben im Speicher, größere landen auf der Festplatte
+UPLOAD_SPOOL_SIZE = 8 * 1024 * 1024
+
+async def spool_attachment(attachment):
+    """Lädt einen Anhang blockweise in eine temporäre Datei, statt ihn vollständig im Speicher zu halten"""
+    spool = tempfile.SpooledTemporaryFile(max_size=UPLOAD_SPOOL_SIZE)
+    try:
+        async with aiohttp.ClientSession() as session:
+            async with session.get(attachment.url) as response:
+                response.raise_for_status()
+                async for chunk in response.content.iter_chunked(64 * 1024):
+                    spool.write(chunk)
+    except BaseException:
+        spool.close()
+        raise
+    spool.seek(0)
+    return spool
+
+async def create_backup():
+    """Erstellt ein Voll- oder differenzielles Backup, ohne den Event-Loop zu blockieren"""
     try:
-        if not os.path.exists("backups"):
-            os.makedirs("backups")
         timestamp = get_now().strftime("%Y%m%d_%H%M%S")
-        backup_path = f"backups/backup_{timestamp}.json"
-        with open(DATA_FILE, 'r', encoding='utf-8') as f:
-            data_to_backup = json.load(f)
-        with open(backup_path, 'w', encoding='utf-8') as f:
-            json.dump(data_to_backup, f, indent=4, ensure_ascii=False)
-        return backup_path
+        save_data()
+        await persistence.durable()
+        plan = backup_chain.plan(store, timestamp)
+        return await asyncio.to_thread(backup_chain.write, store, plan)
     except Exception as e:
         logger.error(f"Fehler beim Erstellen des Backups: {e}")
         return None
@@ -141,11 +323,20 @@ def add_log_entry(action, user_id, details):
         "user_id": user_id,
         "details": details
     }
-    data['logs'].append(log_entry)
-    save_data(data)
+    persistence.log(log_entry)
     logger.info(f"Log erstellt: {action} von User {user_id}")
 
 data = load_data()
+# Sekundärindizes (Discord-User, Kunde, offene Rechnungen, Fälligkeit, Versicherung); werden über save_record gepflegt
+indexes = RecordIndexes(data)
+# Mahnplan: Min-Heap der nächsten Mahnzeitpunkte, wird in on_ready gefüllt und gestartet
+dunning = DunningScheduler(DUNNING_SCHEDULE, retry_delay=DUNNING_RETRY)
+_dunning_task = None
+# Bericht des letzten Mahnlaufs (für /health)
+_last_dunning_report = None
+persistence.start()
+atexit.register(persistence.close)
+atexit.register(save_dunning_state)
 
 # Versicherungstypen
 INSURANCE_TYPES = {
@@ -199,32 +390,48 @@ MITARBEITER_ROLE_ID = 1408800823571513537
 LEITUNGSEBENE_ROLE_ID = 1408797319134187601
 FIRMENKONTOROLLE_ROLE_ID = 1474047313025433684
 
+# Versicherungs- und Mitarbeiterrollen je Server, aktuell gehalten über die Rollen-Ereignisse
+role_registry = RoleRegistry(
+    names={insurance["role"] for insurance in INSURANCE_TYPES.values()},
+    ids=(MITARBEITER_ROLE_ID, LEITUNGSEBENE_ROLE_ID, FIRMENKONTOROLLE_ROLE_ID)
+)
+
 def is_mitarbeiter(interaction: discord.Interaction) -> bool:
-    mitarbeiter_role = interaction.guild.get_role(MITARBEITER_ROLE_ID)
-    leitungsebene_role = interaction.guild.get_role(LEITUNGSEBENE_ROLE_ID)
-    return (mitarbeiter_role and mitarbeiter_role in interaction.user.roles) or \
-    (leitungsebene_role and leitungsebene_role in interaction.user.roles)
+    return role_registry.has_any(interaction.user, MITARBEITER_ROLE_ID, LEITUNGSEBENE_ROLE_ID)
 
 def is_leitungsebene(interaction: discord.Interaction) -> bool:
-    leitungsebene_role = interaction.guild.get_role(LEITUNGSEBENE_ROLE_ID)
-    return leitungsebene_role and leitungsebene_role in interaction.user.roles
+    return role_registry.has_any(interaction.user, LEITUNGSEBENE_ROLE_ID)
 
 def is_firmenkontorolle(interaction: discord.Interaction) -> bool:
-    firmenkontorolle_role = interaction.guild.get_role(FIRMENKONTOROLLE_ROLE_ID)
-    return firmenkontorolle_role and firmenkontorolle_role in interaction.user.roles
+    return role_registry.has_any(interaction.user, FIRMENKONTOROLLE_ROLE_ID)
 
 def get_verfuegbares_guthaben(customer_id: str, versicherung: str) -> float:
     limit = INSURANCE_TYPES.get(versicherung, {}).get("auszahlung_limit", 0.0)
-    customer = data['customers'].get(customer_id, {})
-    auszahlungen = customer.get("auszahlungen", {})
+    customer = data['customers'].get(customer_id)
+    auszahlungen = customer.auszahlungen if customer else {}
     bereits_ausgezahlt = auszahlungen.get(versicherung, 0.0)
     return max(0.0, limit - bereits_ausgezahlt)
 
+@bot.event
+async def on_guild_role_create(role):
+    role_registry.changed(role)
+
+@bot.event
+async def on_guild_role_update(before, after):
+    role_registry.changed(after, before)
+
+@bot.event
+async def on_guild_role_delete(role):
+    role_registry.changed(role)
+
 @bot.event
 async def on_ready():
     logger.info(f'{bot.user} erfolgreich gestartet')
-    global _last_data_hash
-    _last_data_hash = _get_data_hash()
+    global _last_backup_generation, _ready_after, _dunning_task
+    if _ready_after is None:
+        _ready_after = time.perf_counter() - STARTED_AT
+        logger.info(f"Einsatzbereit nach {_ready_after:.2f} s")
+    _last_backup_generation = store.generation
     bot.add_view(KundenkontaktView())
     bot.add_view(SchadensmeldungView())
     bot.add_view(TicketCloseView(0, ""))
@@ -233,7 +440,13 @@ async def on_ready():
     try:
         synced = await bot.tree.sync()
         logger.info(f'{len(synced)} Slash Commands synchronisiert')
-        check_invoices.start()
+        if _dunning_task is None:
+            state = load_state(DUNNING_STATE_FILE)
+            computed = schedule_dunning(state)
+            if dunning.last_run:
+                logger.info(f"Letzter Mahnlauf am {datetime.fromtimestamp(dunning.last_run, GERMANY_TZ).strftime('%d.%m.%Y, %H:%M Uhr')}, verpasste Mahnstufen werden nachgeholt")
+            _dunning_task = asyncio.create_task(dunning.run(run_dunning))
+            logger.info(f"Mahnplan gestartet ({len(dunning)} offene Rechnungen, {computed} neu berechnet)")
         auto_backup.start()
     except Exception as e:
         logger.error(f'Fehler beim Synchronisieren der Commands: {e}')
@@ -253,22 +466,96 @@ async def backup_download(interaction: discord.Interaction):
         return
 
     await interaction.response.defer(ephemeral=True)
+    parts = []
     try:
-        import zipfile
-        import io
-        data_backup = create_backup()
-        zip_buffer = io.BytesIO()
-        with zipfile.ZipFile(zip_buffer, "w", zipfile.ZIP_DEFLATED) as zip_file:
-            if os.path.exists(DATA_FILE):
-                zip_file.write(DATA_FILE, arcname="insurance_data.json")
-            if os.path.exists(CONFIG_FILE):
-                zip_file.write(CONFIG_FILE, arcname="bot_config.json")
-        zip_buffer.seek(0)
-        file = discord.File(zip_buffer, filename=f"insurance_full_backup_{get_now().strftime('%Y%m%d_%H%M%S')}.zip")
-        await interaction.followup.send("<:2141file:1473009449412071484> Vollständiger Datenbank-Export (Daten & Konfiguration)", file=file, ephemeral=True)
+        data_backup = await create_backup()
+        await asyncio.to_thread(store.export_json, DATA_FILE)
+        parts = await build_backup_zip("insurance_full_backup", interaction.guild)
+        message = "<:2141file:1473009449412071484> Vollständiger Datenbank-Export (Daten & Konfiguration)"
+        if len(parts) > 1:
+            message += f"\n> Aufgeteilt in {len(parts)} Teile, zusammensetzen mit `cat {parts[0][1][:-4]}.* > backup.zip`"
+        for index, (part, filename) in enumerate(parts, start=1):
+            content = message if index == 1 else f"Teil {index}/{len(parts)}"
+            await interaction.followup.send(content, file=discord.File(part, filename=filename), ephemeral=True)
     except Exception as e:
         logger.error(f"Backup-ZIP-Fehler: {e}")
         await interaction.followup.send(f"<:3518crossmark:1473009455473098894> Fehler beim Erstellen des ZIP-Backups: {e}", ephemeral=True)
+    finally:
+        for part, _ in parts:
+            part.close()
+
+# Anzeigenamen der Sammlungen in der Vorschau von /reload
+RELOAD_COLLECTION_NAMES = {
+    "customers": "<:7549member:1473009494794698794> Akten",
+    "invoices": "<:6224mail:1473009484753277130> Rechnungen",
+    "pending_auszahlungen": "<:2141file:1473009449412071484> Auszahlungsanträge",
+    "schadensmeldungen": "<:2141file:1473009449412071484> Schadensmeldungen",
+}
+
+def reload_preview_embed(staged, filename):
+    """Zeigt, was /reload am Datenbestand ändern würde"""
+    embed = discord.Embed(
+        title="Wiederherstellung bestätigen",
+        description=f"> `{filename}` wurde geprüft. Der aktuelle Bestand wird erst nach Bestätigung ersetzt und vorher gesichert.",
+        color=COLOR_WARNING
+    )
+    for collection, label in RELOAD_COLLECTION_NAMES.items():
+        counts = staged.summary.get(collection)
+        if not counts or not any(counts.values()):
+            value = "> Keine Änderungen"
+        else:
+            value = f"> `{counts['neu']}` neu\n> `{counts['entfernt']}` entfernt\n> `{counts['geändert']}` geändert"
+            if counts["archiv"]:
+                value += f"\n> `{counts['archiv']}` aus dem Archiv zurückgeholt"
+        embed.add_field(name=label, value=value, inline=True)
+    embed.set_footer(text="Copyright © InsuranceGuard v2", icon_url="https://images-ext-1.discordapp.net/external/apH8DmRAkI4ThoO_8isatg__epwxlBRj4YKfqu5DB2E/%3Fsize%3D4096/https/cdn.discordapp.com/avatars/1452736308077133935/f059c923cd5a8e10650f706126df6549.png?format=webp&quality=lossless&width=309&height=309")
+    return embed
+
+class ReloadConfirmView(discord.ui.View):
+    """Spielt einen geprüften Bestand aus /reload erst nach Bestätigung ein"""
+
+    def __init__(self, staged, filename, user_id):
+        super().__init__(timeout=300)
+        self.staged = staged
+        self.filename = filename
+        self.user_id = user_id
+        self.message = None
+
+    async def interaction_check(self, interaction: discord.Interaction):
+        return interaction.user.id == self.user_id
+
+    async def finish(self, content):
+        self.stop()
+        self.staged = None
+        if self.message:
+            await self.message.edit(content=content, embed=None, view=None)
+
+    @discord.ui.button(label="Einspielen", style=discord.ButtonStyle.green, emoji="<:3518checkmark:1473009454202228959>")
+    async def einspielen(self, interaction: discord.Interaction, button: discord.ui.Button):
+        # Weitere Klicks während des Einspielens nicht mehr annehmen
+        self.stop()
+        await interaction.response.defer()
+        staged = self.staged
+        try:
+            # Der aktuelle Stand bleibt als Backup erhalten und kann selbst wieder eingespielt werden
+            await create_backup()
+            if store.generation != staged.generation:
+                await self.finish("<:3518crossmark:1473009455473098894> Der Datenbestand wurde seit der Prüfung geändert. Bitte `/reload` erneut ausführen.")
+                return
+            await replace_data(staged.data)
+            await self.finish(f"<:3518checkmark:1473009454202228959> `{self.filename}` (Kundendaten) erfolgreich wiederhergestellt.")
+            logger.info(f"Datenbank {DATA_FILE} reloaded von User {interaction.user.id}")
+        except Exception as e:
+            logger.error(f"Reload-Fehler: {e}")
+            await self.finish(f"<:3518crossmark:1473009455473098894> Fehler beim Wiederherstellen: {e}")
+
+    @discord.ui.button(label="Abbrechen", style=discord.ButtonStyle.danger, emoji="<:3518crossmark:1473009455473098894>")
+    async def abbrechen(self, interaction: discord.Interaction, button: discord.ui.Button):
+        await interaction.response.defer()
+        await self.finish("Wiederherstellung abgebrochen, der Datenbestand bleibt unverändert.")
+
+    async def on_timeout(self):
+        await self.finish("Wiederherstellung nicht bestätigt, der Datenbestand bleibt unverändert.")
 
 @bot.tree.command(name="reload", description="Stellt eine Datenbank-Datei (JSON) wieder her")
 @app_commands.describe(datei="Die hochzuladende Datei (insurance_data.json oder bot_config.json)")
@@ -298,30 +585,44 @@ async def reload_backup(interaction: discord.Interaction, datei: discord.Attachm
         return
 
     await interaction.response.defer(ephemeral=True)
+    spool = None
     try:
-        create_backup()
-        content = await datei.read()
-        json_data = json.loads(content.decode('utf-8'))
-        target_file = None
-        if "customers" in json_data and "logs" in json_data:
-            target_file = DATA_FILE
-            global data
-            data = json_data
-            save_data(data)
-            msg = "<:3518checkmark:1473009454202228959> `insurance_data.json` (Kundendaten) erfolgreich wiederhergestellt."
-        elif "log_channel_id" in json_data or "kundenkontakt_category_id" in json_data:
-            target_file = CONFIG_FILE
+        spool = await spool_attachment(datei)
+        json_data = await asyncio.to_thread(read_upload, spool)
+        if isinstance(json_data, dict) and ("customers" in json_data or "invoices" in json_data):
+            # Kundendaten werden erst geprüft und nach Bestätigung eingespielt
+            save_data()
+            await persistence.durable()
+            staged = await asyncio.to_thread(stage_reload, json_data, store, cold_archive)
+            if staged.error_count:
+                error_embed = discord.Embed(
+                    title="Datei ungültig!",
+                    description=f"> `{datei.filename}` wurde nicht eingespielt, da `{staged.error_count}` Datensätze nicht dem Schema entsprechen.",
+                    color=COLOR_ERROR
+                )
+                error_embed.add_field(name="<:2141file:1473009449412071484> Fehler", value="\n".join(f"> `{error}`" for error in staged.errors[:10])[:1024], inline=False)
+                error_embed.set_footer(text="Copyright © InsuranceGuard v2", icon_url="https://images-ext-1.discordapp.net/external/apH8DmRAkI4ThoO_8isatg__epwxlBRj4YKfqu5DB2E/%3Fsize%3D4096/https/cdn.discordapp.com/avatars/1452736308077133935/f059c923cd5a8e10650f706126df6549.png?format=webp&quality=lossless&width=309&height=309")
+                await interaction.followup.send(embed=error_embed, ephemeral=True)
+                return
+            view = ReloadConfirmView(staged, datei.filename, interaction.user.id)
+            view.message = await interaction.followup.send(embed=reload_preview_embed(staged, datei.filename), view=view, ephemeral=True, wait=True)
+        elif isinstance(json_data, dict) and ("log_channel_id" in json_data or "kundenkontakt_category_id" in json_data):
+            await create_backup()
             global config
             config = json_data
             save_config(config)
-            msg = "<:3518checkmark:1473009454202228959> `bot_config.json` (Konfiguration) erfolgreich wiederhergestellt."
+            await interaction.followup.send("<:3518checkmark:1473009454202228959> `bot_config.json` (Konfiguration) erfolgreich wiederhergestellt.", ephemeral=True)
+            logger.info(f"Datenbank {CONFIG_FILE} reloaded von User {interaction.user.id}")
         else:
-            return await interaction.followup.send("<:3518crossmark:1473009455473098894> Fehler: Unbekanntes Dateiformat. Die Datei muss entweder Kundendaten oder Konfigurationsdaten enthalten.", ephemeral=True)
-        await interaction.followup.send(msg, ephemeral=True)
-        logger.info(f"Datenbank {target_file} reloaded von User {interaction.user.id}")
+            await interaction.followup.send("<:3518crossmark:1473009455473098894> Fehler: Unbekanntes Dateiformat. Die Datei muss entweder Kundendaten oder Konfigurationsdaten enthalten.", ephemeral=True)
+    except ValueError as e:
+        await interaction.followup.send(f"<:3518crossmark:1473009455473098894> Die Datei kann nicht gelesen werden: {e}", ephemeral=True)
     except Exception as e:
         logger.error(f"Reload-Fehler: {e}")
         await interaction.followup.send(f"<:3518crossmark:1473009455473098894> Fehler beim Wiederherstellen: {e}", ephemeral=True)
+    finally:
+        if spool:
+            spool.close()
 
 @bot.tree.command(name="log_channel_setzen", description="Setzt den Channel für System-Logs")
 @app_commands.describe(channel="Der Channel für Log-Nachrichten")
@@ -516,7 +817,7 @@ class AuszahlungAntragsModal(discord.ui.Modal, title="Auszahlungsantrag"):
         max_length=500
     )
 
-    def __init__(self, customer_id: str, customer: dict, versicherung: str):
+    def __init__(self, customer_id: str, customer: Customer, versicherung: str):
         super().__init__()
         self.customer_id = customer_id
         self.customer = customer
@@ -562,7 +863,7 @@ class AuszahlungAntragsModal(discord.ui.Modal, title="Auszahlungsantrag"):
                 timestamp=get_now()
             )
             embed.add_field(name="__Antragsinformationen__", value=f"> <:6224mail:1473009484753277130> - `{auszahlung_id}`\n> <:9654dollar:1473009529414357053> - `{betrag_float:,.2f} €`", inline=False)
-            embed.add_field(name="__Versicherungsnehmer__", value=f"> <:7549member:1473009494794698794> - {self.customer['rp_name']}\n> <:4189search:1473009466902315048> - `{self.customer_id}`", inline=False)
+            embed.add_field(name="__Versicherungsnehmer__", value=f"> <:7549member:1473009494794698794> - {self.customer.rp_name}\n> <:4189search:1473009466902315048> - `{self.customer_id}`", inline=False)
             embed.add_field(name="__Versicherungsinformationen__", value=f"> <:4748ticket:1473009472422154311> - `{self.versicherung}`\n> Für diese Versicherung sind noch `{verfuegbar:,.2f} €` von `{limit:,.2f} €` verfügbar, welche dem Kunden beim eintreten eines Versicherungsfalles gezahlt werden.", inline=False)
             beschreibung_text = self.beschreibung.value.strip() if self.beschreibung.value else "—"
             embed.add_field(name="__Optionale Beschreibung__", value=f"```{beschreibung_text}```", inline=False)
@@ -570,7 +871,7 @@ class AuszahlungAntragsModal(discord.ui.Modal, title="Auszahlungsantrag"):
             embed.add_field(name="Status", value="> <:3684sync:1473009462628323523> - Ausstehend!", inline=True)
             embed.set_footer(text="Copyright © InsuranceGuard v2", icon_url="https://images-ext-1.discordapp.net/external/apH8DmRAkI4ThoO_8isatg__epwxlBRj4YKfqu5DB2E/%3Fsize%3D4096/https/cdn.discordapp.com/avatars/1452736308077133935/f059c923cd5a8e10650f706126df6549.png?format=webp&quality=lossless&width=309&height=309")
 
-            firmenkontorolle_role = interaction.guild.get_role(FIRMENKONTOROLLE_ROLE_ID)
+            firmenkontorolle_role = role_registry.by_id(interaction.guild, FIRMENKONTOROLLE_ROLE_ID)
             ping_text = firmenkontorolle_role.mention if firmenkontorolle_role else "@Firmenkontorolle"
 
             action_view = AuszahlungActionView(auszahlung_id, self.customer_id, betrag_float)
@@ -580,25 +881,23 @@ class AuszahlungAntragsModal(discord.ui.Modal, title="Auszahlungsantrag"):
                 view=action_view
             )
 
-            if "pending_auszahlungen" not in data:
-                data["pending_auszahlungen"] = {}
-            data["pending_auszahlungen"][auszahlung_id] = {
-                "customer_id": self.customer_id,
-                "versicherung": self.versicherung,
-                "betrag": betrag_float,
-                "beschreibung": beschreibung_text,
-                "requester_id": interaction.user.id,
-                "message_id": msg.id,
-                "channel_id": auszahlung_channel_id,
-                "status": "ausstehend",
-                "created_at": get_now().isoformat()
-            }
-            save_data(data)
+            data["pending_auszahlungen"][auszahlung_id] = PendingAuszahlung(
+                customer_id=self.customer_id,
+                versicherung=self.versicherung,
+                betrag=betrag_float,
+                beschreibung=beschreibung_text,
+                requester_id=interaction.user.id,
+                message_id=msg.id,
+                channel_id=auszahlung_channel_id,
+                status="ausstehend",
+                created_at=get_now().isoformat()
+            )
+            save_record("pending_auszahlungen", auszahlung_id)
 
             add_log_entry("AUSZAHLUNG_EINGEREICHT", interaction.user.id, {
                 "auszahlung_id": auszahlung_id,
                 "customer_id": self.customer_id,
-                "customer_name": self.customer['rp_name'],
+                "customer_name": self.customer.rp_name,
                 "versicherung": self.versicherung,
                 "betrag": betrag_float
             })
@@ -610,7 +909,7 @@ class AuszahlungAntragsModal(discord.ui.Modal, title="Auszahlungsantrag"):
                 timestamp=get_now()
             )
             log_embed.add_field(name="<:6224mail:1473009484753277130> Antrags-ID", value=f"> `{auszahlung_id}`", inline=False)
-            log_embed.add_field(name="<:7549member:1473009494794698794> Versicherungsnehmer", value=f"> {self.customer['rp_name']}\n> `{self.customer_id}`", inline=False)
+            log_embed.add_field(name="<:7549member:1473009494794698794> Versicherungsnehmer", value=f"> {self.customer.rp_name}\n> `{self.customer_id}`", inline=False)
             log_embed.add_field(name="<:9654dollar:1473009529414357053> Betrag", value=f"> `{betrag_float:,.2f} €`", inline=False)
             log_embed.add_field(name="<:4748ticket:1473009472422154311> Versicherung", value=f"> `{self.versicherung}`", inline=False)
             log_embed.add_field(name="<:7549member:1473009494794698794> Eingereicht von", value=f"> {interaction.user.mention}\n> - `{interaction.user.name}`\n> - `{interaction.user.id}`", inline=False)
@@ -634,14 +933,14 @@ class AuszahlungAntragsModal(discord.ui.Modal, title="Auszahlungsantrag"):
 
 
 class AuszahlungSelectView(discord.ui.View):
-    def __init__(self, customer_id: str, customer: dict):
+    def __init__(self, customer_id: str, customer: Customer):
         super().__init__(timeout=300)
         self.customer_id = customer_id
         self.customer = customer
         self._selected: str | None = None
 
         options = []
-        for versicherung in customer.get("versicherungen", []):
+        for versicherung in customer.versicherungen:
             verfuegbar = get_verfuegbares_guthaben(customer_id, versicherung)
             limit = INSURANCE_TYPES.get(versicherung, {}).get("auszahlung_limit", 0.0)
             bereits = limit - verfuegbar
@@ -701,13 +1000,13 @@ class AuszahlungBestaetigenModal(discord.ui.Modal, title="Auszahlung bestätigen
                 await interaction.followup.send("<:3518crossmark:1473009455473098894> Auszahlungsantrag nicht gefunden.", ephemeral=True)
                 return
 
-            if pending.get("status") != "ausstehend":
+            if pending.status != "ausstehend":
                 await interaction.followup.send("<:3518crossmark:1473009455473098894> Dieser Antrag wurde bereits bearbeitet.", ephemeral=True)
                 return
 
-            customer_id = pending["customer_id"]
-            versicherung = pending["versicherung"]
-            betrag = pending["betrag"]
+            customer_id = pending.customer_id
+            versicherung = pending.versicherung
+            betrag = pending.betrag
             customer = data['customers'].get(customer_id)
 
             if not customer:
@@ -722,18 +1021,17 @@ class AuszahlungBestaetigenModal(discord.ui.Modal, title="Auszahlung bestätigen
                 )
                 return
 
-            if "auszahlungen" not in data['customers'][customer_id]:
-                data['customers'][customer_id]["auszahlungen"] = {}
-            data['customers'][customer_id]["auszahlungen"][versicherung] = \
-                data['customers'][customer_id]["auszahlungen"].get(versicherung, 0.0) + betrag
+            customer.auszahlungen[versicherung] = customer.auszahlungen.get(versicherung, 0.0) + betrag
 
-            data["pending_auszahlungen"][self.auszahlung_id]["status"] = "bestaetigt"
-            data["pending_auszahlungen"][self.auszahlung_id]["bestaetigt_von"] = self.confirmer.id
-            data["pending_auszahlungen"][self.auszahlung_id]["bestaetigt_am"] = get_now().isoformat()
-            data["pending_auszahlungen"][self.auszahlung_id]["auszahlungs_link"] = self.auszahlungs_link.value
-            save_data(data)
+            data["pending_auszahlungen"][self.auszahlung_id].status = "bestaetigt"
+            data["pending_auszahlungen"][self.auszahlung_id].bestaetigt_von = self.confirmer.id
+            data["pending_auszahlungen"][self.auszahlung_id].bestaetigt_am = get_now().isoformat()
+            data["pending_auszahlungen"][self.auszahlung_id].auszahlungs_link = self.auszahlungs_link.value
+            save_record("customers", customer_id)
+            save_record("pending_auszahlungen", self.auszahlung_id)
+            await persistence.durable()
 
-            thread_id = customer.get("thread_id")
+            thread_id = customer.thread_id
             if thread_id:
                 try:
                     thread = self.guild.get_thread(thread_id)
@@ -756,9 +1054,9 @@ class AuszahlungBestaetigenModal(discord.ui.Modal, title="Auszahlung bestätigen
                     logger.error(f"Fehler beim Posten des Vermerks in Akte: {e}")
 
             try:
-                az_channel = self.guild.get_channel(pending["channel_id"])
+                az_channel = self.guild.get_channel(pending.channel_id)
                 if az_channel:
-                    orig_msg = await az_channel.fetch_message(pending["message_id"])
+                    orig_msg = await az_channel.fetch_message(pending.message_id)
                     if orig_msg.embeds:
                         updated_embed = orig_msg.embeds[0]
                         updated_embed.color = COLOR_SUCCESS
@@ -775,7 +1073,7 @@ class AuszahlungBestaetigenModal(discord.ui.Modal, title="Auszahlung bestätigen
             add_log_entry("AUSZAHLUNG_BESTAETIGT", self.confirmer.id, {
                 "auszahlung_id": self.auszahlung_id,
                 "customer_id": customer_id,
-                "customer_name": customer['rp_name'],
+                "customer_name": customer.rp_name,
                 "versicherung": versicherung,
                 "betrag": betrag,
                 "auszahlungs_link": self.auszahlungs_link.value
@@ -787,7 +1085,7 @@ class AuszahlungBestaetigenModal(discord.ui.Modal, title="Auszahlung bestätigen
                 timestamp=get_now()
             )
             log_embed.add_field(name="<:6224mail:1473009484753277130> Antrags-ID", value=f"> `{self.auszahlung_id}`", inline=False)
-            log_embed.add_field(name="<:7549member:1473009494794698794> Versicherungsnehmer", value=f"> {customer['rp_name']}\n> `{customer_id}`", inline=False)
+            log_embed.add_field(name="<:7549member:1473009494794698794> Versicherungsnehmer", value=f"> {customer.rp_name}\n> `{customer_id}`", inline=False)
             log_embed.add_field(name="<:9654dollar:1473009529414357053> Betrag", value=f"> `{betrag:,.2f} €`", inline=False)
             log_embed.add_field(name="<:4748ticket:1473009472422154311> Versicherung", value=f"> `{versicherung}`", inline=False)
             log_embed.add_field(name="<:3518checkmark:1473009454202228959> Genehmigt von", value=f"> {self.confirmer.mention}\n> - `{self.confirmer.name}`\n> - `{self.confirmer.id}`", inline=False)
@@ -833,7 +1131,7 @@ class AuszahlungActionView(discord.ui.View):
             return
 
         pending = data.get("pending_auszahlungen", {}).get(self.auszahlung_id)
-        if not pending or pending.get("status") != "ausstehend":
+        if not pending or pending.status != "ausstehend":
             await interaction.response.send_message("<:3518crossmark:1473009455473098894> Dieser Antrag wurde bereits bearbeitet.", ephemeral=True)
             return
 
@@ -855,14 +1153,15 @@ class AuszahlungActionView(discord.ui.View):
             return
 
         pending = data.get("pending_auszahlungen", {}).get(self.auszahlung_id)
-        if not pending or pending.get("status") != "ausstehend":
+        if not pending or pending.status != "ausstehend":
             await interaction.response.send_message("<:3518crossmark:1473009455473098894> Dieser Antrag wurde bereits bearbeitet.", ephemeral=True)
             return
 
-        data["pending_auszahlungen"][self.auszahlung_id]["status"] = "abgelehnt"
-        data["pending_auszahlungen"][self.auszahlung_id]["abgelehnt_von"] = interaction.user.id
-        data["pending_auszahlungen"][self.auszahlung_id]["abgelehnt_am"] = get_now().isoformat()
-        save_data(data)
+        data["pending_auszahlungen"][self.auszahlung_id].status = "abgelehnt"
+        data["pending_auszahlungen"][self.auszahlung_id].abgelehnt_von = interaction.user.id
+        data["pending_auszahlungen"][self.auszahlung_id].abgelehnt_am = get_now().isoformat()
+        save_record("pending_auszahlungen", self.auszahlung_id)
+        await persistence.durable()
 
         try:
             if interaction.message.embeds:
@@ -929,12 +1228,12 @@ async def auszahlung_einreichen(interaction: discord.Interaction, customer_id: s
 
     customer = data['customers'][customer_id]
 
-    if not customer.get("versicherungen"):
+    if not customer.versicherungen:
         await interaction.response.send_message("<:3518crossmark:1473009455473098894> Dieser Kunde hat keine abgeschlossenen Versicherungen.", ephemeral=True)
         return
 
     limits_text = ""
-    for versicherung in customer.get("versicherungen", []):
+    for versicherung in customer.versicherungen:
         verfuegbar = get_verfuegbares_guthaben(customer_id, versicherung)
         limit = INSURANCE_TYPES.get(versicherung, {}).get("auszahlung_limit", 0.0)
         status = "💰" if verfuegbar > 0 else "🚫"
@@ -942,7 +1241,7 @@ async def auszahlung_einreichen(interaction: discord.Interaction, customer_id: s
 
     select_embed = discord.Embed(
         title="💰 Auszahlungsantrag einreichen",
-        description=f"**Versicherungsnehmer:** {customer['rp_name']} (`{customer_id}`)\n\nBitte wählen Sie im Dropdown die Versicherung aus — es öffnet sich ein Formular für Betrag und Begründung.",
+        description=f"**Versicherungsnehmer:** {customer.rp_name} (`{customer_id}`)\n\nBitte wählen Sie im Dropdown die Versicherung aus — es öffnet sich ein Formular für Betrag und Begründung.",
         color=COLOR_INFO
     )
     select_embed.add_field(name="Auszahlungsguthaben Übersicht", value=limits_text if limits_text else "Keine Daten", inline=False)
@@ -1099,31 +1398,35 @@ async def create_customer(
             embed=embed
         )
 
-        data['customers'][customer_id] = {
-            "rp_name": rp_name,
-            "hbpay_nummer": hbpay_nummer,
-            "economy_id": economy_id,
-            "versicherungen": insurance_list,
-            "total_monthly_price": total_price,
-            "thread_id": thread.thread.id,
-            "discord_user_id": user.id,
-            "created_at": get_now().isoformat(),
-            "created_by": interaction.user.id,
-            "status": "aktiv",
-            "auszahlungen": {}
-        }
-        save_data(data)
+        data['customers'][customer_id] = Customer(
+            rp_name=rp_name,
+            hbpay_nummer=hbpay_nummer,
+            economy_id=economy_id,
+            versicherungen=insurance_list,
+            total_monthly_price=total_price,
+            thread_id=thread.thread.id,
+            discord_user_id=user.id,
+            created_at=get_now().isoformat(),
+            created_by=interaction.user.id,
+            status="aktiv",
+            auszahlungen={}
+        )
+        save_record('customers', customer_id)
 
         member = user
         assigned_roles = []
+        roles = []
         for insurance in insurance_list:
             role_name = INSURANCE_TYPES[insurance]["role"]
-            role = discord.utils.get(interaction.guild.roles, name=role_name)
+            role = role_registry.by_name(interaction.guild, role_name)
             if not role:
                 role = await interaction.guild.create_role(name=role_name, color=discord.Color.from_rgb(44, 62, 80))
                 logger.info(f"Rolle erstellt: {role_name}")
-            await member.add_roles(role)
+            roles.append(role)
             assigned_roles.append(role_name)
+        # atomic=False: ein Aufruf für alle Rollen statt einer Anfrage je Rolle
+        if roles:
+            await member.add_roles(*roles, atomic=False)
 
         add_log_entry("KUNDENAKTE_ERSTELLT", interaction.user.id, {
             "customer_id": customer_id,
@@ -1203,7 +1506,7 @@ async def create_invoice(interaction: discord.Interaction, customer_id: str, cha
 
         customer = data['customers'][customer_id]
         invoice_id = generate_invoice_id()
-        betrag_netto = customer['total_monthly_price']
+        betrag_netto = customer.total_monthly_price
         steuer = betrag_netto * 0.05
         betrag_brutto = betrag_netto + steuer
         due_date = get_now() + timedelta(days=3)
@@ -1215,11 +1518,11 @@ async def create_invoice(interaction: discord.Interaction, customer_id: str, cha
             timestamp=get_now()
         )
         embed.add_field(name="__Rechnungsinformationen__", value=f"> <:6224mail:1473009484753277130> - `{invoice_id}`")
-        embed.add_field(name="__Versicherungsnehmer__", value=f"> <:7549member:1473009494794698794> - {customer['rp_name']}\n> <:4189search:1473009466902315048> - `{customer_id}`", inline=False)
-        embed.add_field(name="__Zahlungsmethoden__", value=f"> <:8312card:1473009505041256501> - `{customer['hbpay_nummer']}`\n> <:9847public:1473009530962055291> - `{customer['economy_id']}`", inline=False)
+        embed.add_field(name="__Versicherungsnehmer__", value=f"> <:7549member:1473009494794698794> - {customer.rp_name}\n> <:4189search:1473009466902315048> - `{customer_id}`", inline=False)
+        embed.add_field(name="__Zahlungsmethoden__", value=f"> <:8312card:1473009505041256501> - `{customer.hbpay_nummer}`\n> <:9847public:1473009530962055291> - `{customer.economy_id}`", inline=False)
         insurance_details = "\n".join(
             f"> {ins}\n> ▸ `{INSURANCE_TYPES[ins]['price']:,.2f} €`"
-            for ins in customer['versicherungen']
+            for ins in customer.versicherungen
         )
         embed.add_field(name="__Abgeschlossene Versicherungen__", value=insurance_details, inline=False)
         embed.add_field(name="__Abrechnung__", value="", inline=False)
@@ -1229,28 +1532,28 @@ async def create_invoice(interaction: discord.Interaction, customer_id: str, cha
         embed.add_field(name="__Status: Zahlung ausstehend!__", value=f"> Sie haben bis zum **{due_date.strftime('%d.%m.%Y')}** Zeit diese Rechnung zu begleichen. Sollten sie diese Frist nicht einhalten, behalten wir uns weitere (rechtliche) Schritte gegen sie vor. Sollten sie Probleme bei dem Transfer des Geldes haben melden sie sich bitte im Ticket!", inline=False)
         embed.set_footer(text="Copyright © InsuranceGuard v2", icon_url="https://images-ext-1.discordapp.net/external/apH8DmRAkI4ThoO_8isatg__epwxlBRj4YKfqu5DB2E/%3Fsize%3D4096/https/cdn.discordapp.com/avatars/1452736308077133935/f059c923cd5a8e10650f706126df6549.png?format=webp&quality=lossless&width=309&height=309")
 
-        message = await channel.send(embed=embed)
-
-        data['invoices'][invoice_id] = {
-            "customer_id": customer_id,
-            "betrag": betrag_brutto,
-            "betrag_netto": betrag_netto,
-            "steuer": steuer,
-            "original_betrag": betrag_brutto,
-            "paid": False,
-            "message_id": message.id,
-            "channel_id": channel.id,
-            "due_date": due_date.isoformat(),
-            "reminder_count": 0,
-            "created_at": get_now().isoformat(),
-            "created_by": interaction.user.id
-        }
-        save_data(data)
+        message = await transport.send(channel, embed=embed)
+
+        data['invoices'][invoice_id] = Invoice(
+            customer_id=customer_id,
+            betrag=betrag_brutto,
+            betrag_netto=betrag_netto,
+            steuer=steuer,
+            original_betrag=betrag_brutto,
+            paid=False,
+            message_id=message.id,
+            channel_id=channel.id,
+            due_date=due_date.isoformat(),
+            reminder_count=0,
+            created_at=get_now().isoformat(),
+            created_by=interaction.user.id
+        )
+        save_record('invoices', invoice_id)
 
         add_log_entry("RECHNUNG_ERSTELLT", interaction.user.id, {
             "invoice_id": invoice_id,
             "customer_id": customer_id,
-            "customer_name": customer['rp_name'],
+            "customer_name": customer.rp_name,
             "betrag_netto": betrag_netto,
             "steuer": steuer,
             "betrag_brutto": betrag_brutto,
@@ -1266,7 +1569,7 @@ async def create_invoice(interaction: discord.Interaction, customer_id: str, cha
             timestamp=get_now()
         )
         log_embed.add_field(name="__Rechnungsnummer__", value=f"> <:6224mail:1473009484753277130> - `{invoice_id}`", inline=False)
-        log_embed.add_field(name="__Versicherungsnehmer__", value=f"> <:7549member:1473009494794698794> - {customer['rp_name']}\n> <:4189search:1473009466902315048> - `{customer_id}`", inline=False)
+        log_embed.add_field(name="__Versicherungsnehmer__", value=f"> <:7549member:1473009494794698794> - {customer.rp_name}\n> <:4189search:1473009466902315048> - `{customer_id}`", inline=False)
         log_embed.add_field(name="__Fällig__", value=f"> {due_date.strftime('%d.%m.%Y')}", inline=False)
         log_embed.add_field(name="__Abrechnung__", value=f"> Netto: `{betrag_netto:,.2f} €`\n> Steuer (5%): `+ {steuer:,.2f} €`\n> <:912926arrow:1473009547282092124> Brutto: **`{betrag_brutto:,.2f} €`**", inline=False)
         log_embed.add_field(name="<:7549member:1473009494794698794> Aussteller", value=f"> {interaction.user.mention}\n> - `{interaction.user.name}`\n> - `{interaction.user.id}`", inline=False)
@@ -1324,7 +1627,7 @@ async def issue_manual_reminder(interaction: discord.Interaction, invoice_id: st
 
         invoice = data['invoices'][invoice_id]
 
-        if invoice.get('paid', False):
+        if invoice.paid:
             info_embed = discord.Embed(
                 title="Rechnung bereits bezahlt!",
                 description=f"Die Rechnung `{invoice_id}` wurde bereits als bezahlt markiert.",
@@ -1335,7 +1638,7 @@ async def issue_manual_reminder(interaction: discord.Interaction, invoice_id: st
             await interaction.followup.send(embed=info_embed, ephemeral=True)
             return
 
-        customer = data['customers'].get(invoice['customer_id'])
+        customer = data['customers'].get(invoice.customer_id)
         if not customer:
             error_embed = discord.Embed(
                 title="Kunde nicht gefunden!",
@@ -1347,22 +1650,24 @@ async def issue_manual_reminder(interaction: discord.Interaction, invoice_id: st
             await interaction.followup.send(embed=error_embed, ephemeral=True)
             return
 
-        reminder_count = invoice.get('reminder_count', 0) + 1
-        surcharge_percent = 0
-        if reminder_count == 2:
-            surcharge_percent = 5
-            new_amount = invoice['original_betrag'] * 1.05
-            data['invoices'][invoice_id]['betrag'] = new_amount
-        elif reminder_count >= 3:
-            surcharge_percent = 10
-            new_amount = invoice['original_betrag'] * 1.10
-            data['invoices'][invoice_id]['betrag'] = new_amount
+        reminder_count = invoice.reminder_count + 1
+        # Über die letzte Stufe hinaus bleibt es bei deren Mahngebühr
+        surcharge_percent = dunning.steps[min(reminder_count, max(dunning.steps))][1]
+        if surcharge_percent:
+            new_amount = invoice.original_betrag * (1 + surcharge_percent / 100)
+            data['invoices'][invoice_id].betrag = new_amount
         else:
-            new_amount = invoice['betrag']
+            new_amount = invoice.betrag
 
-        data['invoices'][invoice_id]['reminder_count'] = reminder_count
-        save_data(data)
-        await send_reminder(invoice_id, invoice, reminder_count, surcharge_percent)
+        data['invoices'][invoice_id].reminder_count = reminder_count
+        save_record('invoices', invoice_id)
+        action = ReminderAction(invoice_id, invoice, reminder_count, surcharge_percent, invoice.betrag,
+                                customer=customer, channel=bot.get_channel(invoice.channel_id))
+        try:
+            if await send_reminder(action):
+                log_reminder(action)
+        except Exception as e:
+            logger.error(f"Fehler beim Senden der Mahnung: {e}", exc_info=True)
 
         success_embed = discord.Embed(
             title="Mahnung erfolgreich ausgestellt!",
@@ -1414,7 +1719,7 @@ async def archive_customer(interaction: discord.Interaction, customer_id: str):
 
         customer = data['customers'][customer_id]
 
-        if customer.get('status') == 'archiviert':
+        if customer.status == 'archiviert':
             info_embed = discord.Embed(
                 title="Akte bereits archiviert!",
                 description=f"Die Akte `{customer_id}` ist bereits archiviert.",
@@ -1425,17 +1730,17 @@ async def archive_customer(interaction: discord.Interaction, customer_id: str):
             await interaction.followup.send(embed=info_embed, ephemeral=True)
             return
 
-        data['customers'][customer_id]['status'] = 'archiviert'
-        data['customers'][customer_id]['archived_at'] = get_now().isoformat()
-        data['customers'][customer_id]['archived_by'] = interaction.user.id
-        save_data(data)
+        data['customers'][customer_id].status = 'archiviert'
+        data['customers'][customer_id].archived_at = get_now().isoformat()
+        data['customers'][customer_id].archived_by = interaction.user.id
+        save_record('customers', customer_id)
 
-        thread_id = customer.get('thread_id')
+        thread_id = customer.thread_id
         if thread_id:
             try:
                 thread = interaction.guild.get_thread(thread_id)
                 if thread:
-                    await thread.edit(name=f"🗄️ [ARCHIV] {customer_id} | {customer['rp_name']}")
+                    await thread.edit(name=f"🗄️ [ARCHIV] {customer_id} | {customer.rp_name}")
                     archive_embed = discord.Embed(
                         title="Akte archiviert!",
                         description="Diese Kundenakte wurde archiviert und ist nicht mehr aktiv.",
@@ -1449,18 +1754,17 @@ async def archive_customer(interaction: discord.Interaction, customer_id: str):
             except Exception as e:
                 logger.error(f"Fehler beim Aktualisieren des Threads: {e}")
 
-        member = interaction.guild.get_member(customer['discord_user_id'])
+        member = interaction.guild.get_member(customer.discord_user_id)
         if member:
-            for insurance in customer.get('versicherungen', []):
-                role_name = INSURANCE_TYPES[insurance]["role"]
-                role = discord.utils.get(interaction.guild.roles, name=role_name)
-                if role and role in member.roles:
-                    await member.remove_roles(role)
+            roles = [role for role in (role_registry.by_name(interaction.guild, INSURANCE_TYPES[insurance]["role"]) for insurance in customer.versicherungen)
+                     if role and member.get_role(role.id)]
+            if roles:
+                await member.remove_roles(*roles, atomic=False)
 
         add_log_entry("AKTE_ARCHIVIERT", interaction.user.id, {
             "customer_id": customer_id,
-            "customer_name": customer['rp_name'],
-            "versicherungen": customer.get('versicherungen', []),
+            "customer_name": customer.rp_name,
+            "versicherungen": customer.versicherungen,
             "archived_at": get_now().isoformat()
         })
 
@@ -1470,12 +1774,14 @@ async def archive_customer(interaction: discord.Interaction, customer_id: str):
             timestamp=get_now()
         )
         log_embed.add_field(name="<:4189search:1473009466902315048> Kunden-ID", value=f"> `{customer_id}`", inline=False)
-        log_embed.add_field(name="<:7549member:1473009494794698794> Kunde", value=f"> {customer['rp_name']}", inline=False)
+        log_embed.add_field(name="<:7549member:1473009494794698794> Kunde", value=f"> {customer.rp_name}", inline=False)
         log_embed.add_field(name="<:7549member:1473009494794698794> Archiviert von", value=f"> {interaction.user.mention}\n> - `{interaction.user.name}`\n> - `{interaction.user.id}`", inline=False)
         log_embed.add_field(name="<:1158refresh:1473009444077178993> Zeitstempel", value=f"> {get_now().strftime('%d.%m.%Y, %H:%M:%S Uhr')}", inline=False)
         log_embed.set_footer(text=f"Copyright © InsuranceGuard v2")
         await send_to_log_channel(interaction.guild, log_embed)
 
+        await move_to_archive('customers', [customer_id])
+
         success_embed = discord.Embed(
             title="Akte erfolgreich archiviert!",
             description=f"Die Kundenakte `{customer_id}` wurde archiviert.",
@@ -1524,7 +1830,7 @@ async def archive_invoice(interaction: discord.Interaction, invoice_id: str):
 
         invoice = data['invoices'][invoice_id]
 
-        if invoice.get('paid', False):
+        if invoice.paid:
             info_embed = discord.Embed(
                 title="Rechnung bereits archiviert!",
                 description=f"Die Rechnung `{invoice_id}` wurde bereits als bezahlt markiert.",
@@ -1533,7 +1839,7 @@ async def archive_invoice(interaction: discord.Interaction, invoice_id: str):
             await interaction.followup.send(embed=info_embed, ephemeral=True)
             return
 
-        customer_id = invoice['customer_id']
+        customer_id = invoice.customer_id
         customer = data['customers'].get(customer_id)
 
         if not customer:
@@ -1545,17 +1851,17 @@ async def archive_invoice(interaction: discord.Interaction, invoice_id: str):
             await interaction.followup.send(embed=error_embed, ephemeral=True)
             return
 
-        data['invoices'][invoice_id]['paid'] = True
-        data['invoices'][invoice_id]['paid_by'] = interaction.user.id
-        data['invoices'][invoice_id]['paid_at'] = get_now().isoformat()
-        data['invoices'][invoice_id]['archived'] = True
-        data['invoices'][invoice_id]['reminder_count'] = 0
-        save_data(data)
+        data['invoices'][invoice_id].paid = True
+        data['invoices'][invoice_id].paid_by = interaction.user.id
+        data['invoices'][invoice_id].paid_at = get_now().isoformat()
+        data['invoices'][invoice_id].archived = True
+        data['invoices'][invoice_id].reminder_count = 0
+        save_record('invoices', invoice_id)
 
         try:
-            channel = interaction.guild.get_channel(invoice['channel_id'])
+            channel = interaction.guild.get_channel(invoice.channel_id)
             if channel:
-                message = await channel.fetch_message(invoice['message_id'])
+                message = await channel.fetch_message(invoice.message_id)
                 updated_embed = message.embeds[0]
                 for i, field in enumerate(updated_embed.fields):
                     if "Status" in field.name:
@@ -1567,7 +1873,7 @@ async def archive_invoice(interaction: discord.Interaction, invoice_id: str):
                         )
                         break
                 updated_embed.color = COLOR_SUCCESS
-                await message.edit(embed=updated_embed)
+                await transport.edit(channel, message, embed=updated_embed)
                 logger.info(f"Rechnung {invoice_id} im Channel als bezahlt markiert")
         except Exception as e:
             logger.error(f"Fehler beim Aktualisieren der Rechnung im Channel: {e}")
@@ -1575,12 +1881,12 @@ async def archive_invoice(interaction: discord.Interaction, invoice_id: str):
         add_log_entry("RECHNUNG_ARCHIVIERT", interaction.user.id, {
             "invoice_id": invoice_id,
             "customer_id": customer_id,
-            "customer_name": customer['rp_name'],
-            "betrag": invoice['betrag'],
-            "betrag_netto": invoice.get('betrag_netto', 0),
-            "steuer": invoice.get('steuer', 0),
+            "customer_name": customer.rp_name,
+            "betrag": invoice.betrag,
+            "betrag_netto": invoice.betrag_netto,
+            "steuer": invoice.steuer,
             "paid_at": get_now().isoformat(),
-            "channel_id": invoice['channel_id']
+            "channel_id": invoice.channel_id
         })
 
         log_embed = discord.Embed(
@@ -1589,15 +1895,15 @@ async def archive_invoice(interaction: discord.Interaction, invoice_id: str):
             timestamp=get_now()
         )
         log_embed.add_field(name="<:6224mail:1473009484753277130> Rechnungsnummer", value=f"> `{invoice_id}`", inline=False)
-        log_embed.add_field(name="<:7549member:1473009494794698794> Versicherungsnehmer", value=f"> {customer['rp_name']}\n> `{customer_id}`", inline=False)
-        log_embed.add_field(name="__Abrechnung__", value=f"> Netto: `{invoice.get('betrag_netto', 0):,.2f} €`\n> Steuer (5%): `+ {invoice.get('steuer', 0):,.2f} €`\n> <:912926arrow:1473009547282092124> Brutto: **`{invoice['betrag']:,.2f} €`**", inline=False)
+        log_embed.add_field(name="<:7549member:1473009494794698794> Versicherungsnehmer", value=f"> {customer.rp_name}\n> `{customer_id}`", inline=False)
+        log_embed.add_field(name="__Abrechnung__", value=f"> Netto: `{invoice.betrag_netto:,.2f} €`\n> Steuer (5%): `+ {invoice.steuer:,.2f} €`\n> <:912926arrow:1473009547282092124> Brutto: **`{invoice.betrag:,.2f} €`**", inline=False)
         log_embed.add_field(name="<:7549member:1473009494794698794> Archiviert von", value=f"> {interaction.user.mention}\n> - `{interaction.user.name}`\n> - `{interaction.user.id}`", inline=False)
         log_embed.add_field(name="<:1158refresh:1473009444077178993> Zeitstempel", value=f"> {get_now().strftime('%d.%m.%Y, %H:%M:%S Uhr')}", inline=False)
         log_embed.set_footer(text=f"Copyright © InsuranceGuard v2")
         await send_to_log_channel(interaction.guild, log_embed)
 
         # In Kundenakte eintragen
-        thread_id = customer.get('thread_id')
+        thread_id = customer.thread_id
         if thread_id:
             try:
                 thread = interaction.guild.get_thread(thread_id)
@@ -1608,11 +1914,11 @@ async def archive_invoice(interaction: discord.Interaction, invoice_id: str):
                         color=COLOR_SUCCESS,
                         timestamp=get_now()
                     )
-                    archive_embed.add_field(name="__Rechnungsinformationen__", value=f"> <:6224mail:1473009484753277130> - `{invoice_id}`\n> <:1158refresh:1473009444077178993> Rechnungsdatum: {datetime.fromisoformat(invoice['created_at']).strftime('%d.%m.%Y')}\n> <:3518checkmark:1473009454202228959> Zahlungsdatum: {get_now().strftime('%d.%m.%Y')}", inline=False)
-                    insurance_list = customer.get('versicherungen', [])
+                    archive_embed.add_field(name="__Rechnungsinformationen__", value=f"> <:6224mail:1473009484753277130> - `{invoice_id}`\n> <:1158refresh:1473009444077178993> Rechnungsdatum: {datetime.fromisoformat(invoice.created_at).strftime('%d.%m.%Y')}\n> <:3518checkmark:1473009454202228959> Zahlungsdatum: {get_now().strftime('%d.%m.%Y')}", inline=False)
+                    insurance_list = customer.versicherungen
                     insurance_text = "\n".join(f"> ▸ {ins}" for ins in insurance_list)
                     archive_embed.add_field(name="__Positionen__", value=insurance_text if insurance_text else "> Keine", inline=False)
-                    archive_embed.add_field(name="__Abrechnung__", value=f"> Netto: `{invoice.get('betrag_netto', 0):,.2f} €`\n> Steuer (5%): `+ {invoice.get('steuer', 0):,.2f} €`\n> <:912926arrow:1473009547282092124> Brutto: **`{invoice['betrag']:,.2f} €`**", inline=False)
+                    archive_embed.add_field(name="__Abrechnung__", value=f"> Netto: `{invoice.betrag_netto:,.2f} €`\n> Steuer (5%): `+ {invoice.steuer:,.2f} €`\n> <:912926arrow:1473009547282092124> Brutto: **`{invoice.betrag:,.2f} €`**", inline=False)
                     archive_embed.add_field(name="<:7549member:1473009494794698794> Archiviert von", value=f"> {interaction.user.mention}\n> - `{interaction.user.name}`", inline=False)
                     archive_embed.set_footer(text=f"Copyright © InsuranceGuard v2 • {get_now().strftime('%d.%m.%Y • %H:%M:%S')}")
                     await thread.send(embed=archive_embed)
@@ -1625,11 +1931,13 @@ async def archive_invoice(interaction: discord.Interaction, invoice_id: str):
             description=f"Die Rechnung `{invoice_id}` wurde als bezahlt markiert und archiviert.",
             color=COLOR_SUCCESS
         )
-        success_embed.add_field(name="<:7549member:1473009494794698794> Kunde", value=f"> {customer['rp_name']}", inline=False)
-        success_embed.add_field(name="<:9654dollar:1473009529414357053> Betrag", value=f"> `{invoice['betrag']:,.2f} €`", inline=False)
+        success_embed.add_field(name="<:7549member:1473009494794698794> Kunde", value=f"> {customer.rp_name}", inline=False)
+        success_embed.add_field(name="<:9654dollar:1473009529414357053> Betrag", value=f"> `{invoice.betrag:,.2f} €`", inline=False)
         await interaction.followup.send(embed=success_embed, ephemeral=True)
         logger.info(f"Rechnung {invoice_id} erfolgreich archiviert von User {interaction.user.id}")
 
+        await move_to_archive('invoices', [invoice_id])
+
     except Exception as e:
         logger.error(f"Fehler beim Archivieren der Rechnung: {e}", exc_info=True)
         error_embed = discord.Embed(
@@ -1639,62 +1947,329 @@ async def archive_invoice(interaction: discord.Interaction, invoice_id: str):
         )
         await interaction.followup.send(embed=error_embed, ephemeral=True)
 
-@tasks.loop(hours=24)
-async def check_invoices():
+# Autocomplete für Akten- und Rechnungsnummern (Präfixsuche über IDs und RP-Namen)
+AUTOCOMPLETE_LIMIT = 25
+
+def customer_choices(current, accept):
+    """Bis zu 25 passende Akten, gefiltert mit ``accept(akte)``"""
+    choices = []
+    for customer_id in indexes.search_customers(current):
+        customer = data['customers'].get_hot(customer_id)
+        if customer is None or not accept(customer):
+            continue
+        choices.append(app_commands.Choice(name=f"{customer_id} – {customer.rp_name}"[:100], value=customer_id))
+        if len(choices) == AUTOCOMPLETE_LIMIT:
+            break
+    return choices
+
+def invoice_choices(current, accept):
+    """Bis zu 25 passende Rechnungen, gefiltert mit ``accept(rechnung)``"""
+    choices = []
+    for invoice_id in indexes.search_invoices(current):
+        invoice = data['invoices'].get_hot(invoice_id)
+        if invoice is None or not accept(invoice):
+            continue
+        customer = data['customers'].get(invoice.customer_id)
+        name = customer.rp_name if customer else invoice.customer_id
+        choices.append(app_commands.Choice(name=f"{invoice_id} – {name} – {invoice.betrag:,.2f} €"[:100], value=invoice_id))
+        if len(choices) == AUTOCOMPLETE_LIMIT:
+            break
+    return choices
+
+def _active_customer(customer):
+    return customer.status != 'archiviert'
+
+def _unpaid_invoice(invoice):
+    return not invoice.paid
+
+@create_invoice.autocomplete('customer_id')
+@archive_customer.autocomplete('customer_id')
+@auszahlung_einreichen.autocomplete('customer_id')
+async def active_customer_autocomplete(interaction: discord.Interaction, current: str):
+    return customer_choices(current, _active_customer)
+
+@issue_manual_reminder.autocomplete('invoice_id')
+@archive_invoice.autocomplete('invoice_id')
+async def unpaid_invoice_autocomplete(interaction: discord.Interaction, current: str):
+    return invoice_choices(current, _unpaid_invoice)
+
+# Unscharfe Kundensuche (Trigramm-Index über RP-Name, HBPay-Nummer und Economy-ID)
+KUNDENSUCHE_PAGE_SIZE = 10
+
+def kundensuche_embed(suchbegriff, results, page):
+    pages = max(1, -(-len(results) // KUNDENSUCHE_PAGE_SIZE))
+    embed = discord.Embed(
+        title="Kundensuche",
+        description=f"**{len(results)}** Treffer für `{suchbegriff}`",
+        color=COLOR_PRIMARY
+    )
+    for score, customer_id in results[page * KUNDENSUCHE_PAGE_SIZE:(page + 1) * KUNDENSUCHE_PAGE_SIZE]:
+        customer = data['customers'].get(customer_id)
+        if customer is None:
+            continue
+        status = " (archiviert)" if customer.status == 'archiviert' else ""
+        embed.add_field(
+            name=f"{customer.rp_name}{status}"[:256],
+            value=f"> <:7549member:1473009494794698794> `{customer_id}` · Übereinstimmung `{score:.0%}`\n> <:8312card:1473009505041256501> `{customer.hbpay_nummer}` · <:9847public:1473009530962055291> `{customer.economy_id}`",
+            inline=False
+        )
+    embed.set_footer(text=f"Seite {page + 1}/{pages} · Copyright © InsuranceGuard v2", icon_url="https://images-ext-1.discordapp.net/external/apH8DmRAkI4ThoO_8isatg__epwxlBRj4YKfqu5DB2E/%3Fsize%3D4096/https/cdn.discordapp.com/avatars/1452736308077133935/f059c923cd5a8e10650f706126df6549.png?format=webp&quality=lossless&width=309&height=309")
+    return embed
+
+class KundensucheView(discord.ui.View):
+    """Blättert durch die Treffer von /kunde_suchen"""
+
+    def __init__(self, suchbegriff, results, user_id):
+        super().__init__(timeout=300)
+        self.suchbegriff = suchbegriff
+        self.results = results
+        self.user_id = user_id
+        self.page = 0
+        self.pages = max(1, -(-len(results) // KUNDENSUCHE_PAGE_SIZE))
+        self.message = None
+        self.update_buttons()
+
+    def update_buttons(self):
+        self.zurueck.disabled = self.page == 0
+        self.weiter.disabled = self.page >= self.pages - 1
+
+    async def interaction_check(self, interaction: discord.Interaction):
+        return interaction.user.id == self.user_id
+
+    async def show(self, interaction, page):
+        self.page = page
+        self.update_buttons()
+        await interaction.response.edit_message(embed=kundensuche_embed(self.suchbegriff, self.results, page), view=self)
+
+    @discord.ui.button(label="Zurück", style=discord.ButtonStyle.secondary, emoji="◀️")
+    async def zurueck(self, interaction: discord.Interaction, button: discord.ui.Button):
+        await self.show(interaction, max(0, self.page - 1))
+
+    @discord.ui.button(label="Weiter", style=discord.ButtonStyle.secondary, emoji="▶️")
+    async def weiter(self, interaction: discord.Interaction, button: discord.ui.Button):
+        await self.show(interaction, min(self.pages - 1, self.page + 1))
+
+    async def on_timeout(self):
+        if self.message:
+            await self.message.edit(view=None)
+
+@bot.tree.command(name="kunde_suchen", description="Sucht Kundenakten nach RP-Name, HBPay-Nummer oder Economy-ID (tippfehlertolerant)")
+@app_commands.describe(suchbegriff="RP-Name, HBPay-Nummer oder Economy-ID (auch unvollständig)")
+async def kunde_suchen(interaction: discord.Interaction, suchbegriff: str):
+    if not is_mitarbeiter(interaction):
+        error_embed = discord.Embed(
+            title="Zugriff verweigert!",
+            description="> Nur Mitarbeiter oder die Leitungsebene können Kundenakten durchsuchen! Sollte ein Problem vorliegen wende dich an die Leitungsebene in [#kontaktbüro](https://discord.com/channels/1408794976615268384/1408814352538009780).",
+            color=COLOR_ERROR
+        )
+        error_embed.set_author(name="Automatische Berechtigungsprüfung", icon_url="https://media.discordapp.net/attachments/1473692441726029874/1473692787156455474/1072-automod.png?ex=699722dc&is=6995d15c&hm=08ad340d3673e1f1076cbf73d235ea3b0e8ef10b07abb8d24ea66d85c6b59edb&=&format=webp&quality=lossless&width=250&height=250")
+        error_embed.add_field(name="<:7842privacy:1473009500775776256> Benötigte Berechtigung", value="> `Leitungsebene`\n> `Mitarbeiter`", inline=False)
+        error_embed.set_footer(text="Copyright © InsuranceGuard v2", icon_url="https://images-ext-1.discordapp.net/external/apH8DmRAkI4ThoO_8isatg__epwxlBRj4YKfqu5DB2E/%3Fsize%3D4096/https/cdn.discordapp.com/avatars/1452736308077133935/f059c923cd5a8e10650f706126df6549.png?format=webp&quality=lossless&width=309&height=309")
+        await interaction.response.send_message(embed=error_embed, ephemeral=True)
+        return
+
+    results = indexes.find_customers(suchbegriff)
+    if not results:
+        info_embed = discord.Embed(
+            title="Keine Treffer!",
+            description=f"Für `{suchbegriff}` wurde keine passende Kundenakte gefunden.",
+            color=COLOR_INFO
+        )
+        await interaction.response.send_message(embed=info_embed, ephemeral=True)
+        return
+
+    view = KundensucheView(suchbegriff, results, interaction.user.id)
+    await interaction.response.send_message(embed=kundensuche_embed(suchbegriff, results, 0), view=view, ephemeral=True)
+    view.message = await interaction.original_response()
+    logger.info(f"Kundensuche von User {interaction.user.id}: {len(results)} Treffer")
+
+@bot.tree.command(name="archiv_auslagern", description="Verschiebt alle archivierten Akten und Rechnungen ins Langzeitarchiv")
+async def move_archived_records(interaction: discord.Interaction):
+    if not is_leitungsebene(interaction):
+        error_embed = discord.Embed(
+            title="Zugriff verweigert!",
+            description="> Nur die Leitungsebene kann das Archiv auslagern! Sollte ein Problem vorliegen wende dich an die Leitungsebene in [#kontaktbüro](https://discord.com/channels/1408794976615268384/1408814352538009780).",
+            color=COLOR_ERROR
+        )
+        error_embed.set_author(name="Automatische Berechtigungsprüfung", icon_url="https://media.discordapp.net/attachments/1473692441726029874/1473692787156455474/1072-automod.png?ex=699722dc&is=6995d15c&hm=08ad340d3673e1f1076cbf73d235ea3b0e8ef10b07abb8d24ea66d85c6b59edb&=&format=webp&quality=lossless&width=250&height=250")
+        error_embed.add_field(name="<:7842privacy:1473009500775776256> Benötigte Berechtigung", value="> `Leitungsebene`", inline=False)
+        error_embed.set_footer(text="Copyright © InsuranceGuard v2", icon_url="https://images-ext-1.discordapp.net/external/apH8DmRAkI4ThoO_8isatg__epwxlBRj4YKfqu5DB2E/%3Fsize%3D4096/https/cdn.discordapp.com/avatars/1452736308077133935/f059c923cd5a8e10650f706126df6549.png?format=webp&quality=lossless&width=309&height=309")
+        await interaction.response.send_message(embed=error_embed, ephemeral=True)
+        return
+
+    await interaction.response.defer(ephemeral=True)
+    try:
+        moved = {}
+        for collection in ARCHIVE_COLLECTIONS:
+            # Archivierbare Rechnungen sind immer bezahlt, dafür reicht der Index
+            candidates = indexes.paid_invoice_ids() if collection == "invoices" else data[collection].keys()
+            keys = [key for key in candidates if is_archivable(collection, data[collection][key])]
+            moved[collection] = await move_to_archive(collection, keys)
+        await persistence.durable()
+
+        add_log_entry("ARCHIV_AUSGELAGERT", interaction.user.id, {
+            "akten": moved['customers'],
+            "rechnungen": moved['invoices']
+        })
+
+        success_embed = discord.Embed(
+            title="Archiv erfolgreich ausgelagert!",
+            description="Archivierte Datensätze wurden ins Langzeitarchiv verschoben. Sie bleiben über ihre ID weiterhin abrufbar.",
+            color=COLOR_SUCCESS
+        )
+        success_embed.add_field(name="<:7549member:1473009494794698794> Akten", value=f"> `{moved['customers']}` verschoben\n> `{cold_archive.count('customers')}` im Archiv", inline=False)
+        success_embed.add_field(name="<:6224mail:1473009484753277130> Rechnungen", value=f"> `{moved['invoices']}` verschoben\n> `{cold_archive.count('invoices')}` im Archiv", inline=False)
+        success_embed.set_footer(text="Copyright © InsuranceGuard v2", icon_url="https://images-ext-1.discordapp.net/external/apH8DmRAkI4ThoO_8isatg__epwxlBRj4YKfqu5DB2E/%3Fsize%3D4096/https/cdn.discordapp.com/avatars/1452736308077133935/f059c923cd5a8e10650f706126df6549.png?format=webp&quality=lossless&width=309&height=309")
+        await interaction.followup.send(embed=success_embed, ephemeral=True)
+    except Exception as e:
+        logger.error(f"Fehler beim Auslagern des Archivs: {e}", exc_info=True)
+        await interaction.followup.send(f"<:3518crossmark:1473009455473098894> Fehler beim Auslagern des Archivs: {e}", ephemeral=True)
+
+@bot.tree.command(name="zeitpunkt_wiederherstellen", description="Stellt den Datenbestand zu einem früheren Zeitpunkt wieder her")
+@app_commands.describe(zeitpunkt="Zeitpunkt im Format TT.MM.JJJJ HH:MM (deutsche Zeit)")
+async def restore_point_in_time(interaction: discord.Interaction, zeitpunkt: str):
+    if not is_leitungsebene(interaction):
+        error_embed = discord.Embed(
+            title="Zugriff verweigert!",
+            description="> Nur die Leitungsebene kann einen früheren Stand wiederherstellen! Sollte ein Problem vorliegen wende dich an die Leitungsebene in [#kontaktbüro](https://discord.com/channels/1408794976615268384/1408814352538009780).",
+            color=COLOR_ERROR
+        )
+        error_embed.set_author(name="Automatische Berechtigungsprüfung", icon_url="https://media.discordapp.net/attachments/1473692441726029874/1473692787156455474/1072-automod.png?ex=699722dc&is=6995d15c&hm=08ad340d3673e1f1076cbf73d235ea3b0e8ef10b07abb8d24ea66d85c6b59edb&=&format=webp&quality=lossless&width=250&height=250")
+        error_embed.add_field(name="<:7842privacy:1473009500775776256> Benötigte Berechtigung", value="> `Leitungsebene`", inline=False)
+        error_embed.set_footer(text="Copyright © InsuranceGuard v2", icon_url="https://images-ext-1.discordapp.net/external/apH8DmRAkI4ThoO_8isatg__epwxlBRj4YKfqu5DB2E/%3Fsize%3D4096/https/cdn.discordapp.com/avatars/1452736308077133935/f059c923cd5a8e10650f706126df6549.png?format=webp&quality=lossless&width=309&height=309")
+        await interaction.response.send_message(embed=error_embed, ephemeral=True)
+        return
+
+    try:
+        until = parse_time(zeitpunkt)
+    except ValueError:
+        await interaction.response.send_message("<:3518crossmark:1473009455473098894> Ungültiger Zeitpunkt. Bitte im Format `TT.MM.JJJJ HH:MM` angeben.", ephemeral=True)
+        return
+
+    await interaction.response.defer(ephemeral=True)
     try:
-        now = get_now()
-        for invoice_id, invoice_data in list(data['invoices'].items()):
-            if invoice_data.get('paid', False):
-                continue
-            due_date = datetime.fromisoformat(invoice_data['due_date'])
-            if due_date.tzinfo is None:
-                due_date = due_date.replace(tzinfo=GERMANY_TZ)
-            days_overdue = (now - due_date).days
-            if days_overdue < 0:
-                continue
-            reminder_count = invoice_data.get('reminder_count', 0)
-            if days_overdue == 0 and reminder_count == 0:
-                await send_reminder(invoice_id, invoice_data, 1, 0)
-                data['invoices'][invoice_id]['reminder_count'] = 1
-                save_data(data)
-            elif days_overdue == 1 and reminder_count == 1:
-                new_amount = invoice_data['original_betrag'] * 1.05
-                data['invoices'][invoice_id]['betrag'] = new_amount
-                await send_reminder(invoice_id, invoice_data, 2, 5)
-                data['invoices'][invoice_id]['reminder_count'] = 2
-                save_data(data)
-            elif days_overdue == 2 and reminder_count == 2:
-                new_amount = invoice_data['original_betrag'] * 1.10
-                data['invoices'][invoice_id]['betrag'] = new_amount
-                await send_reminder(invoice_id, invoice_data, 3, 10)
-                data['invoices'][invoice_id]['reminder_count'] = 3
-                save_data(data)
+        # Der aktuelle Stand bleibt als Backup erhalten und ist damit selbst wiederherstellbar
+        await create_backup()
+        restored, info = await asyncio.to_thread(recover, backup_chain, history_log, until)
+        await replace_data(restored)
+
+        add_log_entry("ZEITPUNKT_WIEDERHERGESTELLT", interaction.user.id, {
+            "zeitpunkt": zeitpunkt,
+            "backup": info["base"],
+            "aenderungen": info["applied"],
+            "fehlend": info["missing"]
+        })
+
+        success_embed = discord.Embed(
+            title="Zeitpunkt erfolgreich wiederhergestellt!",
+            description=f"Der Datenbestand entspricht nun dem Stand vom `{zeitpunkt}` Uhr.",
+            color=COLOR_SUCCESS
+        )
+        success_embed.add_field(name="<:2141file:1473009449412071484> Grundlage", value=f"> Backup `{info['base']}`\n> `{info['applied']}` Änderungen nachgespielt", inline=False)
+        if info["missing"]:
+            success_embed.add_field(name="<:6523information:1473009486351565024> Unvollständiges Protokoll", value=f"> `{info['missing']}` Änderungen fehlen im Änderungsprotokoll (z.B. nach einem Absturz) und konnten nicht nachgespielt werden.", inline=False)
+        success_embed.add_field(name="<:6523information:1473009486351565024> Rückgängig machen", value="> Der vorherige Stand wurde vorher gesichert und kann ebenfalls über diesen Befehl wiederhergestellt werden.", inline=False)
+        success_embed.set_footer(text="Copyright © InsuranceGuard v2", icon_url="https://images-ext-1.discordapp.net/external/apH8DmRAkI4ThoO_8isatg__epwxlBRj4YKfqu5DB2E/%3Fsize%3D4096/https/cdn.discordapp.com/avatars/1452736308077133935/f059c923cd5a8e10650f706126df6549.png?format=webp&quality=lossless&width=309&height=309")
+        await interaction.followup.send(embed=success_embed, ephemeral=True)
+        logger.info(f"Stand vom {zeitpunkt} wiederhergestellt ({info['base']} + {info['applied']} Änderungen, {info['missing']} fehlend) von User {interaction.user.id}")
+    except ValueError as e:
+        await interaction.followup.send(f"<:3518crossmark:1473009455473098894> Wiederherstellung nicht möglich: {e}", ephemeral=True)
     except Exception as e:
-        logger.error(f"Fehler bei Mahnungsprüfung: {e}", exc_info=True)
+        logger.error(f"Fehler bei der Wiederherstellung zu einem Zeitpunkt: {e}", exc_info=True)
+        await interaction.followup.send(f"<:3518crossmark:1473009455473098894> Fehler bei der Wiederherstellung: {e}", ephemeral=True)
+
+def plan_dunning(due, now):
+    """Prüft fällige Mahnungen gegen den aktuellen Stand und gibt die zu versendenden Aktionen zurück.
+
+    Nach einer Pause des Bots wird direkt die höchste erreichte Stufe gemahnt.
+    """
+    actions = []
+    for invoice_id, step in due:
+        invoice_data = data['invoices'].get_hot(invoice_id)
+        if not invoice_data or invoice_data.paid or invoice_data.reminder_count != step - 1:
+            continue
+        step = dunning.overdue_step(invoice_data, now)
+        surcharge = dunning.steps[step][1]
+        betrag = invoice_data.original_betrag * (1 + surcharge / 100) if surcharge else invoice_data.betrag
+        actions.append(ReminderAction(
+            invoice_id, invoice_data, step, surcharge, betrag,
+            customer=data['customers'].get(invoice_data.customer_id),
+            channel=bot.get_channel(invoice_data.channel_id)
+        ))
+    return actions
+
+async def run_dunning(due):
+    """Mahnlauf: alle fälligen Mahnungen planen, mit begrenzter Parallelität senden und einmal speichern"""
+    global _last_dunning_report
+    report = DunningReport(due=len(due))
+    started = time.perf_counter()
+    now = time.time()
+    actions = plan_dunning(due, now)
+    report.skipped = len(due) - len(actions)
+    report.plan_ms = (time.perf_counter() - started) * 1000
+
+    started = time.perf_counter()
+    results = await send_batch(actions, send_reminder, DUNNING_CONCURRENCY)
+    report.send_ms = (time.perf_counter() - started) * 1000
+
+    started = time.perf_counter()
+    now = time.time()
+    changed = []
+    for action, result in zip(actions, results):
+        invoice_data = action.invoice
+        if isinstance(result, Exception):
+            report.failed += 1
+            report.errors.append(f"{action.invoice_id}: {result}")
+            logger.error(f"Mahnung {action.step} für {action.invoice_id} fehlgeschlagen: {result}")
+            dunning.update(action.invoice_id, invoice_data, earliest=now + DUNNING_RETRY)
+            continue
+        if invoice_data.paid:
+            # Während des Versands bezahlt
+            report.skipped += 1
+            continue
+        if result:
+            report.sent += 1
+            log_reminder(action)
+        else:
+            report.skipped += 1
+        # Wie bisher rückt die Mahnstufe auch vor, wenn Channel oder Akte fehlen
+        invoice_data.betrag = action.betrag
+        invoice_data.reminder_count = action.step
+        changed.append(action.invoice_id)
+    save_records('invoices', changed)
+    await persistence.durable()
+    # Den Stand im Event-Loop erfassen; ``dunning.update`` ändert den Plan aus dem Loop heraus
+    await asyncio.to_thread(write_state, DUNNING_STATE_FILE, dunning.state())
+    report.persist_ms = (time.perf_counter() - started) * 1000
+    _last_dunning_report = report
+    logger.info(f"Mahnlauf: {report.summary()}")
 
 @tasks.loop(hours=3)
 async def auto_backup():
-    global _last_data_hash
+    global _last_backup_generation
+    parts = []
     try:
+        verify_indexes()
         if not config.get("log_channel_id"):
             logger.info("Auto-Backup: Kein Log-Kanal konfiguriert, überspringe.")
             return
-        current_hash = _get_data_hash()
-        if current_hash == _last_data_hash:
+        current_generation = store.generation
+        if current_generation == _last_backup_generation:
             logger.info("Auto-Backup: Keine Änderungen seit dem letzten Backup – wird übersprungen.")
             return
+        save_data()
+        await persistence.durable()
+        await asyncio.to_thread(store.export_json, DATA_FILE)
 
-        import zipfile, io
-        zip_buffer = io.BytesIO()
-        with zipfile.ZipFile(zip_buffer, "w", zipfile.ZIP_DEFLATED) as zip_file:
-            if os.path.exists(DATA_FILE):
-                zip_file.write(DATA_FILE, arcname="insurance_data.json")
-            if os.path.exists(CONFIG_FILE):
-                zip_file.write(CONFIG_FILE, arcname="bot_config.json")
-        zip_buffer.seek(0)
-
-        timestamp_str = get_now().strftime("%Y%m%d_%H%M%S")
-        file = discord.File(zip_buffer, filename=f"auto_backup_{timestamp_str}.zip")
+        log_channel = None
+        for guild in bot.guilds:
+            log_channel = guild.get_channel(config["log_channel_id"])
+            if log_channel:
+                break
+        if not log_channel:
+            logger.warning("Auto-Backup: Log-Kanal nicht gefunden, überspringe.")
+            return
+        parts = await build_backup_zip("auto_backup", log_channel.guild)
 
         embed = discord.Embed(
             title="Automatisches Datenbank-Backup",
@@ -1702,77 +2277,77 @@ async def auto_backup():
             timestamp=get_now()
         )
         embed.add_field(name="<:6523information:1473009486351565024> Information", value="> Alle `3 Stunden` werden die kompletten Daten des Bots in diesen Kanal gesendet, damit es bei einem Neustart zu keinem Datenverlust kommt.", inline=False)
-        embed.add_field(name="<:2141file:1473009449412071484> Enthaltene Dateien", value="> <:2141file:1473009449412071484> - `insurance_data.json`\n> <:2141file:1473009449412071484> - `bot_config.json`", inline=False)
+        embed.add_field(name="<:2141file:1473009449412071484> Enthaltene Dateien", value="> <:2141file:1473009449412071484> - `insurance_data.json`\n> <:2141file:1473009449412071484> - `bot_config.json`\n> <:2141file:1473009449412071484> - `archive/*.jsonl`", inline=False)
         embed.add_field(name="<:1158refresh:1473009444077178993> Zeitstempel", value=f"> {get_now().strftime('%d.%m.%Y, %H:%M:%S Uhr')}", inline=False)
+        if len(parts) > 1:
+            embed.add_field(name="<:6523information:1473009486351565024> Aufgeteilt", value=f"> Das Archiv ist größer als das Upload-Limit und wurde in `{len(parts)}` Teile aufgeteilt.\n> Zusammensetzen mit `cat {parts[0][1][:-4]}.* > backup.zip`", inline=False)
         embed.set_footer(text="Copyright © InsuranceGuard v2", icon_url="https://images-ext-1.discordapp.net/external/apH8DmRAkI4ThoO_8isatg__epwxlBRj4YKfqu5DB2E/%3Fsize%3D4096/https/cdn.discordapp.com/avatars/1452736308077133935/f059c923cd5a8e10650f706126df6549.png?format=webp&quality=lossless&width=309&height=309")
 
-        for guild in bot.guilds:
-            log_channel = guild.get_channel(config["log_channel_id"])
-            if log_channel:
-                await log_channel.send(embed=embed, file=file)
-                break
+        for index, (part, filename) in enumerate(parts, start=1):
+            if index == 1:
+                await log_channel.send(embed=embed, file=discord.File(part, filename=filename))
+            else:
+                await log_channel.send(content=f"Teil {index}/{len(parts)}", file=discord.File(part, filename=filename))
 
-        _last_data_hash = current_hash
+        _last_backup_generation = current_generation
         logger.info(f"Auto-Backup erfolgreich gesendet um {get_now().strftime('%H:%M:%S')}")
 
     except Exception as e:
         logger.error(f"Fehler beim automatischen Backup: {e}", exc_info=True)
+    finally:
+        for part, _ in parts:
+            part.close()
+
+def log_reminder(action):
+    add_log_entry(f"MAHNUNG_{action.step}", 0, {
+        "invoice_id": action.invoice_id,
+        "customer_id": action.invoice.customer_id,
+        "customer_name": action.customer.rp_name,
+        "surcharge": action.surcharge,
+        "original_betrag": action.invoice.original_betrag,
+        "neuer_betrag": action.betrag,
+        "channel_id": action.invoice.channel_id
+    })
 
-async def send_reminder(invoice_id, invoice_data, reminder_number, surcharge_percent):
-    """Sendet eine Mahnung"""
-    try:
-        for guild in bot.guilds:
-            channel = guild.get_channel(invoice_data['channel_id'])
-            if not channel:
-                continue
-            customer = data['customers'].get(invoice_data['customer_id'])
-            if not customer:
-                continue
-            customer_user = guild.get_member(customer['discord_user_id'])
-            surcharge_text = f" (+{surcharge_percent}% Mahngebühr)" if surcharge_percent > 0 else ""
-
-            embed = discord.Embed(
-                title=f"{reminder_number}. Mahnung",
-                description=f"Die Rechnung `{invoice_id}` ist überfällig!",
-                color=COLOR_WARNING if reminder_number < 3 else COLOR_ERROR,
-                timestamp=get_now()
-            )
-            embed.add_field(name="__Rechnungsinformationen__", value=f"> <:6224mail:1473009484753277130> - `{invoice_id}`\n> <:7549member:1473009494794698794> - {customer['rp_name']}\n> <:2533warning:1473009451647762515> - {reminder_number}. Mahnung", inline=False)
-            embed.add_field(name="__Zahlungsinformationen__", value=f"> Ursprünglicher Betrag: `{invoice_data['original_betrag']:,.2f} €`\n> <:912926arrow:1473009547282092124> Aktueller Betrag: **`{invoice_data['betrag']:,.2f} €`**{surcharge_text}", inline=False)
-            embed.set_footer(text="Bitte begleichen Sie den Betrag umgehend • Copyright © InsuranceGuard v2", icon_url="https://images-ext-1.discordapp.net/external/apH8DmRAkI4ThoO_8isatg__epwxlBRj4YKfqu5DB2E/%3Fsize%3D4096/https/cdn.discordapp.com/avatars/1452736308077133935/f059c923cd5a8e10650f706126df6549.png?format=webp&quality=lossless&width=309&height=309")
+async def send_reminder(action):
+    """Sendet eine Mahnung samt Log-Eintrag; gibt False zurück, wenn Channel oder Akte fehlen"""
+    invoice_id, invoice_data, channel, customer = action.invoice_id, action.invoice, action.channel, action.customer
+    reminder_number, surcharge_percent = action.step, action.surcharge
+    if not channel or not customer:
+        logger.warning(f"Mahnung {reminder_number} für {invoice_id} übersprungen: Channel oder Kundenakte nicht gefunden")
+        return False
+    customer_user = channel.guild.get_member(customer.discord_user_id)
+    surcharge_text = f" (+{surcharge_percent}% Mahngebühr)" if surcharge_percent > 0 else ""
 
-            if customer_user:
-                await channel.send(f"{customer_user.mention}", embed=embed)
-            else:
-                await channel.send(embed=embed)
+    embed = discord.Embed(
+        title=f"{reminder_number}. Mahnung",
+        description=f"Die Rechnung `{invoice_id}` ist überfällig!",
+        color=COLOR_WARNING if reminder_number < 3 else COLOR_ERROR,
+        timestamp=get_now()
+    )
+    embed.add_field(name="__Rechnungsinformationen__", value=f"> <:6224mail:1473009484753277130> - `{invoice_id}`\n> <:7549member:1473009494794698794> - {customer.rp_name}\n> <:2533warning:1473009451647762515> - {reminder_number}. Mahnung", inline=False)
+    embed.add_field(name="__Zahlungsinformationen__", value=f"> Ursprünglicher Betrag: `{invoice_data.original_betrag:,.2f} €`\n> <:912926arrow:1473009547282092124> Aktueller Betrag: **`{action.betrag:,.2f} €`**{surcharge_text}", inline=False)
+    embed.set_footer(text="Bitte begleichen Sie den Betrag umgehend • Copyright © InsuranceGuard v2", icon_url="https://images-ext-1.discordapp.net/external/apH8DmRAkI4ThoO_8isatg__epwxlBRj4YKfqu5DB2E/%3Fsize%3D4096/https/cdn.discordapp.com/avatars/1452736308077133935/f059c923cd5a8e10650f706126df6549.png?format=webp&quality=lossless&width=309&height=309")
 
-            log_embed = discord.Embed(
-                title=f"{reminder_number}. Mahnung versendet!",
-                color=COLOR_WARNING if reminder_number < 3 else COLOR_ERROR,
-                timestamp=get_now()
-            )
-            log_embed.add_field(name="<:6224mail:1473009484753277130> Rechnungsnummer", value=f"> `{invoice_id}`", inline=False)
-            log_embed.add_field(name="<:7549member:1473009494794698794> Versicherungsnehmer", value=f"> {customer['rp_name']}\n> `{invoice_data['customer_id']}`", inline=False)
-            log_embed.add_field(name="<:2533warning:1473009451647762515> Mahnstufe", value=f"> {reminder_number}. Mahnung", inline=False)
-            log_embed.add_field(name="<:9654dollar:1473009529414357053> Beträge", value=f"> Ursprungsbetrag: `{invoice_data['original_betrag']:,.2f} €`\n> <:912926arrow:1473009547282092124> Neuer Betrag: **`{invoice_data['betrag']:,.2f} €`**\n> Mahngebühr: {f'+{surcharge_percent}%' if surcharge_percent > 0 else 'Keine'}", inline=False)
-            log_embed.add_field(name="<:1041searchthreads:1473009441552203889> Channel", value=f"> {channel.mention}", inline=False)
-            log_embed.add_field(name="<:1158refresh:1473009444077178993> Zeitstempel", value=f"> {get_now().strftime('%d.%m.%Y, %H:%M:%S Uhr')}", inline=False)
-            log_embed.set_footer(text="Copyright © InsuranceGuard v2", icon_url="https://images-ext-1.discordapp.net/external/apH8DmRAkI4ThoO_8isatg__epwxlBRj4YKfqu5DB2E/%3Fsize%3D4096/https/cdn.discordapp.com/avatars/1452736308077133935/f059c923cd5a8e10650f706126df6549.png?format=webp&quality=lossless&width=309&height=309")
-            await send_to_log_channel(guild, log_embed)
-
-            add_log_entry(f"MAHNUNG_{reminder_number}", 0, {
-                "invoice_id": invoice_id,
-                "customer_id": invoice_data['customer_id'],
-                "customer_name": customer['rp_name'],
-                "surcharge": surcharge_percent,
-                "original_betrag": invoice_data['original_betrag'],
-                "neuer_betrag": invoice_data['betrag'],
-                "channel_id": invoice_data['channel_id']
-            })
-            break
+    if customer_user:
+        await transport.send(channel, content=customer_user.mention, embed=embed)
+    else:
+        await transport.send(channel, embed=embed)
 
-    except Exception as e:
-        logger.error(f"Fehler beim Senden der Mahnung: {e}", exc_info=True)
+    log_embed = discord.Embed(
+        title=f"{reminder_number}. Mahnung versendet!",
+        color=COLOR_WARNING if reminder_number < 3 else COLOR_ERROR,
+        timestamp=get_now()
+    )
+    log_embed.add_field(name="<:6224mail:1473009484753277130> Rechnungsnummer", value=f"> `{invoice_id}`", inline=False)
+    log_embed.add_field(name="<:7549member:1473009494794698794> Versicherungsnehmer", value=f"> {customer.rp_name}\n> `{invoice_data.customer_id}`", inline=False)
+    log_embed.add_field(name="<:2533warning:1473009451647762515> Mahnstufe", value=f"> {reminder_number}. Mahnung", inline=False)
+    log_embed.add_field(name="<:9654dollar:1473009529414357053> Beträge", value=f"> Ursprungsbetrag: `{invoice_data.original_betrag:,.2f} €`\n> <:912926arrow:1473009547282092124> Neuer Betrag: **`{action.betrag:,.2f} €`**\n> Mahngebühr: {f'+{surcharge_percent}%' if surcharge_percent > 0 else 'Keine'}", inline=False)
+    log_embed.add_field(name="<:1041searchthreads:1473009441552203889> Channel", value=f"> {channel.mention}", inline=False)
+    log_embed.add_field(name="<:1158refresh:1473009444077178993> Zeitstempel", value=f"> {get_now().strftime('%d.%m.%Y, %H:%M:%S Uhr')}", inline=False)
+    log_embed.set_footer(text="Copyright © InsuranceGuard v2", icon_url="https://images-ext-1.discordapp.net/external/apH8DmRAkI4ThoO_8isatg__epwxlBRj4YKfqu5DB2E/%3Fsize%3D4096/https/cdn.discordapp.com/avatars/1452736308077133935/f059c923cd5a8e10650f706126df6549.png?format=webp&quality=lossless&width=309&height=309")
+    await send_to_log_channel(channel.guild, log_embed)
+    return True
 
 # Ticket-System Views
 class KundenkontaktView(discord.ui.View):
@@ -1840,11 +2415,11 @@ class TicketModal(discord.ui.Modal, title="Kundenkontakt-Anfrage"):
                 await interaction.followup.send(embed=error_embed, ephemeral=True)
                 return
 
-            customer_user = guild.get_member(customer['discord_user_id'])
+            customer_user = guild.get_member(customer.discord_user_id)
             overwrites = {
                 guild.default_role: discord.PermissionOverwrite(read_messages=False),
-                guild.get_role(MITARBEITER_ROLE_ID): discord.PermissionOverwrite(read_messages=True, send_messages=True),
-                guild.get_role(LEITUNGSEBENE_ROLE_ID): discord.PermissionOverwrite(read_messages=True, send_messages=True),
+                role_registry.by_id(guild, MITARBEITER_ROLE_ID): discord.PermissionOverwrite(read_messages=True, send_messages=True),
+                role_registry.by_id(guild, LEITUNGSEBENE_ROLE_ID): discord.PermissionOverwrite(read_messages=True, send_messages=True),
                 interaction.user: discord.PermissionOverwrite(read_messages=True, send_messages=True)
             }
             if customer_user:
@@ -1852,7 +2427,7 @@ class TicketModal(discord.ui.Modal, title="Kundenkontakt-Anfrage"):
 
             ticket_channel = await category.create_text_channel(
                 name=f"kontakt-{customer_id.lower()}",
-                topic=f"Kundenkontakt: {customer['rp_name']} | {customer_id}",
+                topic=f"Kundenkontakt: {customer.rp_name} | {customer_id}",
                 overwrites=overwrites
             )
 
@@ -1863,10 +2438,10 @@ class TicketModal(discord.ui.Modal, title="Kundenkontakt-Anfrage"):
                 timestamp=get_now()
             )
             embed.add_field(name="__Ticketinformationen__", value=f"> <:1158refresh:1473009444077178993> - {get_now().strftime('%d.%m.%Y • %H:%M')}\n> <:4189search:1473009466902315048> - `{customer_id}`", inline=False)
-            embed.add_field(name="__Beteiligte Personen__", value=f"> <:7549member:1473009494794698794> Mitarbeiter: {interaction.user.mention}\n> <:7549member:1473009494794698794> Versicherungsnehmer: {customer['rp_name']}", inline=False)
+            embed.add_field(name="__Beteiligte Personen__", value=f"> <:7549member:1473009494794698794> Mitarbeiter: {interaction.user.mention}\n> <:7549member:1473009494794698794> Versicherungsnehmer: {customer.rp_name}", inline=False)
             embed.add_field(name="__Anlass der Kontaktaufnahme__", value=self.reason.value, inline=False)
-            insurance_info = "\n".join(f"> ▸ {ins}" for ins in customer['versicherungen'])
-            embed.add_field(name="__Kundeninformationen__", value=f"{insurance_info}\n> <:9654dollar:1473009529414357053> Monatsbeitrag: `{customer['total_monthly_price']:,.2f} €`\n> <:8312card:1473009505041256501> Kartennummer: `{customer['hbpay_nummer']}`\n> <:9847public:1473009530962055291> Economy-ID: `{customer['economy_id']}`", inline=False)
+            insurance_info = "\n".join(f"> ▸ {ins}" for ins in customer.versicherungen)
+            embed.add_field(name="__Kundeninformationen__", value=f"{insurance_info}\n> <:9654dollar:1473009529414357053> Monatsbeitrag: `{customer.total_monthly_price:,.2f} €`\n> <:8312card:1473009505041256501> Kartennummer: `{customer.hbpay_nummer}`\n> <:9847public:1473009530962055291> Economy-ID: `{customer.economy_id}`", inline=False)
             embed.set_footer(text="Nutzen Sie den Button unten, um dieses Ticket zu schließen • Copyright © InsuranceGuard v2", icon_url="https://images-ext-1.discordapp.net/external/apH8DmRAkI4ThoO_8isatg__epwxlBRj4YKfqu5DB2E/%3Fsize%3D4096/https/cdn.discordapp.com/avatars/1452736308077133935/f059c923cd5a8e10650f706126df6549.png?format=webp&quality=lossless&width=309&height=309")
 
             close_view = TicketCloseView(ticket_channel.id, customer_id)
@@ -1877,7 +2452,7 @@ class TicketModal(discord.ui.Modal, title="Kundenkontakt-Anfrage"):
 
             add_log_entry("TICKET_ERSTELLT", interaction.user.id, {
                 "customer_id": customer_id,
-                "customer_name": customer['rp_name'],
+                "customer_name": customer.rp_name,
                 "channel_id": ticket_channel.id,
                 "channel_name": ticket_channel.name,
                 "reason": self.reason.value[:100]
@@ -1889,7 +2464,7 @@ class TicketModal(discord.ui.Modal, title="Kundenkontakt-Anfrage"):
                 timestamp=get_now()
             )
             log_embed.add_field(name="<:4748ticket:1473009472422154311> Ticket-Channel", value=f"> {ticket_channel.mention}", inline=False)
-            log_embed.add_field(name="<:7549member:1473009494794698794> Versicherungsnehmer", value=f"> {customer['rp_name']}\n> `{customer_id}`", inline=False)
+            log_embed.add_field(name="<:7549member:1473009494794698794> Versicherungsnehmer", value=f"> {customer.rp_name}\n> `{customer_id}`", inline=False)
             log_embed.add_field(name="<:7549member:1473009494794698794> Erstellt von", value=f"> {interaction.user.mention}\n> - `{interaction.user.name}`\n> - `{interaction.user.id}`", inline=False)
             log_embed.add_field(name="<:1158refresh:1473009444077178993> Zeitstempel", value=f"> {get_now().strftime('%d.%m.%Y, %H:%M:%S Uhr')}", inline=False)
             log_embed.set_footer(text=f"Copyright © InsuranceGuard v2")
@@ -1979,17 +2554,17 @@ class SchadensmeldungModal(discord.ui.Modal, title="Schadensmeldung einreichen")
 
             overwrites = {
                 guild.default_role: discord.PermissionOverwrite(read_messages=False),
-                guild.get_role(MITARBEITER_ROLE_ID): discord.PermissionOverwrite(read_messages=True, send_messages=True),
-                guild.get_role(LEITUNGSEBENE_ROLE_ID): discord.PermissionOverwrite(read_messages=True, send_messages=True),
+                role_registry.by_id(guild, MITARBEITER_ROLE_ID): discord.PermissionOverwrite(read_messages=True, send_messages=True),
+                role_registry.by_id(guild, LEITUNGSEBENE_ROLE_ID): discord.PermissionOverwrite(read_messages=True, send_messages=True),
                 interaction.user: discord.PermissionOverwrite(read_messages=True, send_messages=True)
             }
-            customer_user = guild.get_member(customer['discord_user_id'])
+            customer_user = guild.get_member(customer.discord_user_id)
             if customer_user:
                 overwrites[customer_user] = discord.PermissionOverwrite(read_messages=True, send_messages=True)
 
             ticket_channel = await category.create_text_channel(
                 name=f"schaden-{customer_id.lower()}",
-                topic=f"Schadensmeldung: {customer['rp_name']} | {customer_id}",
+                topic=f"Schadensmeldung: {customer.rp_name} | {customer_id}",
                 overwrites=overwrites
             )
 
@@ -1999,7 +2574,7 @@ class SchadensmeldungModal(discord.ui.Modal, title="Schadensmeldung einreichen")
                 color=COLOR_DAMAGE,
                 timestamp=get_now()
             )
-            embed.add_field(name="__Schadensfallinformationen__", value=f"> <:7549member:1473009494794698794> Kunde: {customer['rp_name']} (`{customer_id}`)\n> <:7549member:1473009494794698794> Gemeldet von: {interaction.user.mention}", inline=False)
+            embed.add_field(name="__Schadensfallinformationen__", value=f"> <:7549member:1473009494794698794> Kunde: {customer.rp_name} (`{customer_id}`)\n> <:7549member:1473009494794698794> Gemeldet von: {interaction.user.mention}", inline=False)
             embed.add_field(name="__Beteiligte Personen__", value=f"> <:7549member:1473009494794698794> Geschädigter: {self.geschaedigter.value}\n> <:7549member:1473009494794698794> Täter: {self.taeter.value}", inline=False)
             embed.add_field(name="__Beschreibung__", value=self.beschreibung.value, inline=False)
             embed.add_field(name="__Nachweis__", value=f"> {self.rechnung.value}", inline=False)
@@ -2317,7 +2892,8 @@ async def show_logs(interaction: discord.Interaction, anzahl: int = 10):
     await interaction.response.defer(ephemeral=True)
 
     try:
-        if not data['logs']:
+        recent_logs = await asyncio.to_thread(activity_log.tail, anzahl)
+        if not recent_logs:
             info_embed = discord.Embed(
                 title="Keine Logs vorhanden!",
                 description="Es sind noch keine Aktivitäten protokolliert worden.",
@@ -2326,7 +2902,6 @@ async def show_logs(interaction: discord.Interaction, anzahl: int = 10):
             await interaction.followup.send(embed=info_embed, ephemeral=True)
             return
 
-        recent_logs = data['logs'][-anzahl:]
         recent_logs.reverse()
 
         embed = discord.Embed(
@@ -2348,6 +2923,8 @@ async def show_logs(interaction: discord.Interaction, anzahl: int = 10):
             "TICKET_GESCHLOSSEN": "<:4748ticket:1473009472422154311>",
             "SCHADENSMELDUNG_ERSTELLT": "<:4748ticket:1473009472422154311>",
             "AKTE_ARCHIVIERT": "<:1041searchthreads:1473009441552203889>",
+            "ARCHIV_AUSGELAGERT": "<:1041searchthreads:1473009441552203889>",
+            "ZEITPUNKT_WIEDERHERGESTELLT": "<:1158refresh:1473009444077178993>",
             "AUSZAHLUNG_EINGEREICHT": "💰",
             "AUSZAHLUNG_BESTAETIGT": "✅",
             "AUSZAHLUNG_ABGELEHNT": "❌",
@@ -2366,6 +2943,8 @@ async def show_logs(interaction: discord.Interaction, anzahl: int = 10):
             "TICKET_GESCHLOSSEN": "Ticket geschlossen",
             "SCHADENSMELDUNG_ERSTELLT": "Schadensmeldung eingereicht",
             "AKTE_ARCHIVIERT": "Akte archiviert",
+            "ARCHIV_AUSGELAGERT": "Archiv ausgelagert",
+            "ZEITPUNKT_WIEDERHERGESTELLT": "Zeitpunkt wiederhergestellt",
             "AUSZAHLUNG_EINGEREICHT": "Auszahlungsantrag eingereicht",
             "AUSZAHLUNG_BESTAETIGT": "Auszahlung bestätigt",
             "AUSZAHLUNG_ABGELEHNT": "Auszahlung abgelehnt",
@@ -2439,7 +3018,9 @@ def home():
 
 @app.route('/health')
 def health():
-    return {"status": "healthy", "bot": bot.user.name if bot.user else "starting"}
+    return {"status": "healthy", "bot": bot.user.name if bot.user else "starting", "data_generation": store.generation, "ready_after_seconds": _ready_after, "dunning_scheduled": len(dunning),
+            "dunning_last_run": _last_dunning_report.as_dict() if _last_dunning_report else None, "log_queue": log_queue.metrics(),
+            "delivery": transport.metrics()}
 
 def run():
     port = int(os.environ.get('PORT', 8080))
@@ -0,0 +1,260 @@
+import asyncio
+import logging
+import random
+import time
+from collections import deque
+
+logger = logging.getLogger('InsuranceBot')
+
+# Discord: höchstens 10 Embeds und 6000 Zeichen Embed-Text je Nachricht
+MAX_EMBEDS = 10
+MAX_EMBED_CHARS = 6000
+# Nachrichten je Kanal und Zeitfenster (Sekunden); Discord erlaubt derzeit 5 je 5 s
+RATE = 5
+PER = 5.0
+MAX_PENDING = 1000
+MAX_ATTEMPTS = 5
+MAX_BACKOFF = 60.0
+
+
+def _retryable(error):
+    """Zeitüberschreitungen, Netzwerkfehler, 429 und 5xx lohnen einen neuen Versuch, andere 4xx nicht"""
+    status = getattr(error, "status", None)
+    return status is None or status == 429 or status >= 500
+
+
+class _Lane:
+    """Warteschlange, Drosselung und Sender-Task eines Ziels (Rate-Limit-Bucket: ein Kanal)"""
+
+    def __init__(self, destination, rate):
+        self.destination = destination
+        self.pending = deque()
+        self.wakeup = asyncio.Event()
+        self.sent_at = deque(maxlen=rate)
+        self.paused_until = 0.0
+        self.task = None
+
+
+class OutboundQueue:
+    """Versendet Embeds im Hintergrund, gebündelt zu Nachrichten mit bis zu 10 Embeds.
+
+    ``put`` kehrt sofort zurück; je Ziel läuft ein Sender-Task, der höchstens
+    ``rate`` Nachrichten je ``per`` Sekunden schickt. Während er wartet,
+    sammeln sich weitere Embeds an und gehen mit der nächsten Nachricht raus.
+    Fehlgeschlagene Nachrichten werden mit exponentiellem Backoff wiederholt,
+    bei 429 mindestens für die von Discord genannte Wartezeit. Ist eine
+    Warteschlange voll, werden die ältesten Embeds verworfen.
+
+    ``deliver(ziel, embeds)`` ist die eigentliche Sendefunktion (``channel.send``).
+    """
+
+    def __init__(self, deliver, rate=RATE, per=PER, max_pending=MAX_PENDING, max_attempts=MAX_ATTEMPTS):
+        self._deliver = deliver
+        self.rate = rate
+        self.per = per
+        self.max_pending = max_pending
+        self.max_attempts = max_attempts
+        self._lanes = {}
+        self._latencies = deque(maxlen=200)
+        self.sent_messages = 0
+        self.sent_embeds = 0
+        self.retries = 0
+        self.rate_limited = 0
+        self.dropped = 0
+        self.last_error = None
+        self._in_flight = 0
+
+    def put(self, key, destination, embed):
+        """Reiht ein Embed für ``destination`` ein; ``key`` ist die Kanal-ID. Muss im Event-Loop aufgerufen werden."""
+        lane = self._lanes.get(key)
+        if lane is None:
+            lane = self._lanes[key] = _Lane(destination, self.rate)
+        lane.destination = destination
+        if len(lane.pending) >= self.max_pending:
+            lane.pending.popleft()
+            self.dropped += 1
+        lane.pending.append((embed, time.monotonic()))
+        lane.wakeup.set()
+        if lane.task is None or lane.task.done():
+            lane.task = asyncio.create_task(self._run(key, lane))
+
+    def pending(self):
+        """Noch nicht zugestellte Embeds, einschließlich des gerade gesendeten Stapels"""
+        return sum(len(lane.pending) for lane in list(self._lanes.values())) + self._in_flight
+
+    def metrics(self):
+        """Kennzahlen für /health: Warteschlangentiefe, Durchsatz, Fehler und Latenz (Einreihen bis Zustellung).
+
+        Wird auch aus dem Flask-Thread aufgerufen; Kopien per ``list`` vermeiden
+        Fehler durch gleichzeitige Änderungen im Event-Loop.
+        """
+        now = time.monotonic()
+        heads = [lane.pending[0][1] for lane in list(self._lanes.values()) if lane.pending]
+        oldest = min(heads, default=None)
+        latencies = sorted(self._latencies)
+        return {
+            "pending": self.pending(),
+            "oldest_pending_seconds": round(now - oldest, 3) if oldest is not None else None,
+            "sent_messages": self.sent_messages,
+            "sent_embeds": self.sent_embeds,
+            "retries": self.retries,
+            "rate_limited": self.rate_limited,
+            "dropped": self.dropped,
+            "latency_ms": {
+                "avg": round(sum(latencies) / len(latencies) * 1000, 1),
+                "p95": round(latencies[int(len(latencies) * 0.95)] * 1000, 1),
+                "max": round(latencies[-1] * 1000, 1),
+            } if latencies else None,
+            "last_error": self.last_error,
+        }
+
+    def _take_batch(self, lane):
+        batch = []
+        chars = 0
+        while lane.pending and len(batch) < MAX_EMBEDS:
+            embed, enqueued = lane.pending[0]
+            size = len(embed)
+            if batch and chars + size > MAX_EMBED_CHARS:
+                break
+            lane.pending.popleft()
+            batch.append((embed, enqueued))
+            chars += size
+        return batch
+
+    async def _throttle(self, lane):
+        while True:
+            now = time.monotonic()
+            wait = lane.paused_until - now
+            if len(lane.sent_at) == self.rate:
+                wait = max(wait, lane.sent_at[0] + self.per - now)
+            if wait <= 0:
+                return
+            await asyncio.sleep(wait)
+
+    async def _run(self, key, lane):
+        attempt = 0
+        while True:
+            if not lane.pending:
+                lane.wakeup.clear()
+                try:
+                    await asyncio.wait_for(lane.wakeup.wait(), 300)
+                except asyncio.TimeoutError:
+                    if not lane.pending:
+                        # Untätige Ziele geben ihren Task frei; ``put`` startet bei Bedarf einen neuen
+                        if self._lanes.get(key) is lane:
+                            del self._lanes[key]
+                        return
+                continue
+            await self._throttle(lane)
+            batch = self._take_batch(lane)
+            lane.sent_at.append(time.monotonic())
+            self._in_flight += len(batch)
+            try:
+                await self._deliver(lane.destination, [embed for embed, _ in batch])
+            except Exception as e:
+                self._in_flight -= len(batch)
+                self.last_error = f"{type(e).__name__}: {e}"
+                attempt += 1
+                if not _retryable(e) or attempt >= self.max_attempts:
+                    self.dropped += len(batch)
+                    logger.error(f"Fehler beim Senden an Kanal {key}, {len(batch)} Embeds verworfen: {e}")
+                    attempt = 0
+                    continue
+                # Der Stapel geht beim nächsten Versuch als Erstes raus
+                lane.pending.extendleft(reversed(batch))
+                self.retries += 1
+                delay = min(MAX_BACKOFF, 2 ** (attempt - 1)) * (0.5 + random.random() / 2)
+                if getattr(e, "status", None) == 429:
+                    self.rate_limited += 1
+                    delay = max(delay, getattr(e, "retry_after", 0) or 0)
+                lane.paused_until = time.monotonic() + delay
+                logger.warning(f"Senden an Kanal {key} fehlgeschlagen (Versuch {attempt}), neuer Versuch in {delay:.1f} s: {e}")
+                continue
+            self._in_flight -= len(batch)
+            attempt = 0
+            delivered = time.monotonic()
+            self._latencies.extend(delivered - enqueued for _, enqueued in batch)
+            self.sent_messages += 1
+            self.sent_embeds += len(batch)
+
+
+# Nach einem Fehler beim Anlegen (z.B. fehlende Berechtigung "Webhooks verwalten") erst später erneut versuchen
+WEBHOOK_RETRY = 3600
+
+
+class WebhookTransport:
+    """Sendet über einen zwischengespeicherten Webhook je Kanal statt über den Bot-Endpunkt.
+
+    Webhooks haben eigene Rate-Limits; Log- und Rechnungsnachrichten
+    konkurrieren so nicht mit den Interaktionsantworten des Bots. Der Webhook
+    wird beim ersten Versand gesucht (gleicher Name, eigener Token) oder
+    angelegt. Gibt es keinen (Berechtigung, Kanaltyp) oder schlägt der Versand
+    fehl, wird mit ``channel.send`` gesendet; bei 401/403/404 wird der
+    Webhook verworfen und beim nächsten Mal neu gesucht.
+
+    ``profile()`` liefert Name und Avatar, unter denen gepostet wird.
+    """
+
+    def __init__(self, name, profile=dict, enabled=True):
+        self.name = name
+        self.profile = profile
+        self.enabled = enabled
+        self._webhooks = {}
+        self._unavailable = {}
+        self._locks = {}
+        self.webhook_sends = 0
+        self.channel_sends = 0
+        self.fallbacks = 0
+
+    async def _webhook(self, channel, create=True):
+        webhook = self._webhooks.get(channel.id)
+        if webhook is not None or self._unavailable.get(channel.id, 0) > time.monotonic():
+            return webhook
+        lock = self._locks.setdefault(channel.id, asyncio.Lock())
+        async with lock:
+            if channel.id in self._webhooks:
+                return self._webhooks[channel.id]
+            try:
+                webhook = next((hook for hook in await channel.webhooks() if hook.name == self.name and hook.token), None)
+                if webhook is None and create:
+                    webhook = await channel.create_webhook(name=self.name, reason="Versand von Logs und Rechnungen")
+            except Exception as e:
+                self._unavailable[channel.id] = time.monotonic() + WEBHOOK_RETRY
+                logger.warning(f"Kein Webhook für Kanal {channel.id}, Versand über den Bot: {e}")
+                return None
+            if webhook is not None:
+                self._webhooks[channel.id] = webhook
+            return webhook
+
+    async def send(self, channel, **kwargs):
+        """Wie ``channel.send``; gibt die gesendete Nachricht zurück"""
+        webhook = await self._webhook(channel) if self.enabled else None
+        if webhook is not None:
+            try:
+                message = await webhook.send(wait=True, **self.profile(), **kwargs)
+                self.webhook_sends += 1
+                return message
+            except Exception as e:
+                if getattr(e, "status", None) in (401, 403, 404):
+                    self._webhooks.pop(channel.id, None)
+                self.fallbacks += 1
+                logger.warning(f"Versand über Webhook in Kanal {channel.id} fehlgeschlagen, sende über den Bot: {e}")
+        self.channel_sends += 1
+        return await channel.send(**kwargs)
+
+    async def edit(self, channel, message, **kwargs):
+        """Bearbeitet eine Nachricht; über den Webhook gesendete Nachrichten kann nur dieser ändern"""
+        if message.webhook_id:
+            webhook = await self._webhook(channel, create=False)
+            if webhook is not None and webhook.id == message.webhook_id:
+                return await webhook.edit_message(message.id, **kwargs)
+        return await message.edit(**kwargs)
+
+    def metrics(self):
+        return {
+            "transport": "webhook" if self.enabled else "channel",
+            "webhooks": len(self._webhooks),
+            "webhook_sends": self.webhook_sends,
+            "channel_sends": self.channel_sends,
+            "fallbacks": self.fallbacks,
+        }
@@ -0,0 +1,221 @@
+import operator
+from dataclasses import MISSING, dataclass, field, fields
+from typing import ClassVar, Optional, Union, get_args, get_origin
+
+# Zulässige gespeicherte Typen je Feldtyp (JSON kennt keinen Unterschied zwischen 1 und 1.0)
+_ACCEPTED_TYPES = {float: (int, float)}
+
+
+def _field_schema(f):
+    """Gibt ``(name, zulässige Typen, Pflichtfeld, darf None sein)`` für ein Feld zurück"""
+    annotation = f.type
+    nullable = f.default is None
+    if get_origin(annotation) is Union:
+        nullable = True
+        annotation = next(arg for arg in get_args(annotation) if arg is not type(None))
+    required = f.default is MISSING and f.default_factory is MISSING
+    return f.name, _ACCEPTED_TYPES.get(annotation, (annotation,)), required, nullable
+
+
+def record(cls):
+    """Macht aus einer Klasse einen Datensatz mit ``__slots__`` und schnellen Codecs"""
+    cls = dataclass(slots=True)(cls)
+    cls._FIELDS = tuple(f.name for f in fields(cls) if f.name != "extra")
+    cls._FIELD_SET = frozenset(cls._FIELDS)
+    # Nur Felder mit Standardwert None dürfen beim Speichern entfallen
+    cls._OMIT_NONE = tuple(f.default is None for f in fields(cls) if f.name != "extra")
+    cls._SCHEMA = tuple(_field_schema(f) for f in fields(cls) if f.name != "extra")
+    cls._values = operator.attrgetter(*cls._FIELDS)
+    return cls
+
+
+class Record:
+    """Gemeinsame Codecs aller Datensätze.
+
+    Gespeichert wird ein flaches dict mit der Schemaversion unter ``_v``;
+    optionale Felder mit dem Wert ``None`` entfallen. Unbekannte Schlüssel landen in
+    ``extra`` und werden beim Speichern unverändert zurückgeschrieben.
+    Ältere Versionen werden beim Laden über ``MIGRATIONS`` angehoben.
+    """
+
+    __slots__ = ()
+    SCHEMA_VERSION: ClassVar[int] = 1
+    # Version -> Funktion, die ein dict dieser Version auf die nächste hebt
+    MIGRATIONS: ClassVar[dict] = {}
+
+    def to_dict(self):
+        result = {"_v": self.SCHEMA_VERSION}
+        for name, value, omit_none in zip(self._FIELDS, self._values(self), self._OMIT_NONE):
+            if value is not None or not omit_none:
+                result[name] = value
+        if self.extra:
+            result.update(self.extra)
+        return result
+
+    @classmethod
+    def migrate(cls, raw):
+        """Hebt ein gespeichertes dict auf die aktuelle Schemaversion"""
+        version = raw.get("_v", 0)
+        while version < cls.SCHEMA_VERSION:
+            raw = cls.MIGRATIONS[version](dict(raw))
+            version += 1
+        return raw
+
+    @classmethod
+    def validate(cls, raw):
+        """Prüft ein gespeichertes dict gegen das Schema und gibt die gefundenen Fehler zurück"""
+        if not isinstance(raw, dict):
+            return [f"Objekt erwartet, {type(raw).__name__} gefunden"]
+        try:
+            raw = cls.migrate(raw)
+        except KeyError as e:
+            return [f"`{e.args[0]}` fehlt"]
+        except TypeError as e:
+            return [f"Migration von Version {raw.get('_v', 0)} fehlgeschlagen: {e}"]
+        errors = []
+        for name, accepted, required, nullable in cls._SCHEMA:
+            if name not in raw:
+                if required:
+                    errors.append(f"`{name}` fehlt")
+                continue
+            value = raw[name]
+            if value is None:
+                if not nullable:
+                    errors.append(f"`{name}` ist leer")
+            elif not isinstance(value, accepted) or (isinstance(value, bool) and bool not in accepted):
+                errors.append(f"`{name}`: {accepted[-1].__name__} erwartet, {type(value).__name__} gefunden")
+        return errors
+
+    @classmethod
+    def from_dict(cls, raw):
+        raw = cls.migrate(raw)
+        known = {}
+        extra = None
+        for name, value in raw.items():
+            if name in cls._FIELD_SET:
+                known[name] = value
+            elif name != "_v":
+                if extra is None:
+                    extra = {}
+                extra[name] = value
+        return cls(**known, extra=extra)
+
+
+def _legacy_customer(raw):
+    raw.setdefault("auszahlungen", {})
+    raw.setdefault("status", "aktiv")
+    return raw
+
+
+@record
+class Customer(Record):
+    rp_name: str
+    hbpay_nummer: str
+    economy_id: str
+    versicherungen: list
+    total_monthly_price: float
+    thread_id: Optional[int]
+    discord_user_id: int
+    created_at: str
+    created_by: int
+    status: str = "aktiv"
+    auszahlungen: dict = field(default_factory=dict)
+    archived_at: Optional[str] = None
+    archived_by: Optional[int] = None
+    extra: Optional[dict] = None
+
+    MIGRATIONS: ClassVar[dict] = {0: _legacy_customer}
+
+
+def _legacy_invoice(raw):
+    # Rechnungen aus der Zeit vor der Steueraufschlüsselung
+    raw.setdefault("betrag_netto", raw["betrag"])
+    raw.setdefault("steuer", 0.0)
+    raw.setdefault("original_betrag", raw["betrag"])
+    raw.setdefault("reminder_count", 0)
+    return raw
+
+
+@record
+class Invoice(Record):
+    customer_id: str
+    betrag: float
+    betrag_netto: float
+    steuer: float
+    original_betrag: float
+    message_id: int
+    channel_id: int
+    due_date: str
+    created_at: str
+    created_by: int
+    paid: bool = False
+    reminder_count: int = 0
+    paid_by: Optional[int] = None
+    paid_at: Optional[str] = None
+    archived: Optional[bool] = None
+    extra: Optional[dict] = None
+
+    MIGRATIONS: ClassVar[dict] = {0: _legacy_invoice}
+
+
+def _unchanged(raw):
+    return raw
+
+
+@record
+class PendingAuszahlung(Record):
+    customer_id: str
+    versicherung: str
+    betrag: float
+    requester_id: int
+    message_id: int
+    channel_id: int
+    created_at: str
+    beschreibung: str = ""
+    status: str = "ausstehend"
+    bestaetigt_von: Optional[int] = None
+    bestaetigt_am: Optional[str] = None
+    auszahlungs_link: Optional[str] = None
+    abgelehnt_von: Optional[int] = None
+    abgelehnt_am: Optional[str] = None
+    extra: Optional[dict] = None
+
+    MIGRATIONS: ClassVar[dict] = {0: _unchanged}
+
+
+# Sammlung -> Datensatzklasse; Sammlungen ohne Eintrag bleiben einfache dicts
+RECORD_TYPES = {
+    "customers": Customer,
+    "invoices": Invoice,
+    "pending_auszahlungen": PendingAuszahlung,
+}
+
+
+def is_hot(collection, record):
+    """Prüft, ob ein Datensatz zu einem offenen Vorgang gehört und beim Start sofort geladen wird"""
+    if collection == "invoices":
+        return not record.paid
+    if collection == "pending_auszahlungen":
+        return record.status == "ausstehend"
+    return False
+
+
+def encode_record(value):
+    """Gibt die speicherbare dict-Form eines Datensatzes zurück"""
+    return value.to_dict() if isinstance(value, Record) else value
+
+
+def validate_record(collection, raw):
+    """Prüft ein gespeichertes dict der Sammlung; Sammlungen ohne Datensatzklasse brauchen nur ein Objekt"""
+    cls = RECORD_TYPES.get(collection)
+    if cls is None:
+        return [] if isinstance(raw, dict) else [f"Objekt erwartet, {type(raw).__name__} gefunden"]
+    return cls.validate(raw)
+
+
+def decode_record(collection, raw):
+    """Erzeugt aus einem gespeicherten dict den Datensatz der Sammlung"""
+    cls = RECORD_TYPES.get(collection)
+    if cls is None or isinstance(raw, Record):
+        return raw
+    return cls.from_dict(raw)
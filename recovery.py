@@ -0,0 +1,189 @@
+"""Wiederherstellung: Point-in-Time-Recovery und geprüftes Einspielen hochgeladener Dateien.
+
+Aufruf ohne laufenden Bot:
+``python recovery.py "2024-12-01 14:30" [--backups backups] [--history history] [-o datei]``
+Der Zeitpunkt gilt in deutscher Zeit. Die erzeugte Datei kann per ``/reload``
+eingespielt werden.
+"""
+import argparse
+import io
+import json
+import time
+from dataclasses import dataclass, field
+from datetime import datetime
+
+import pytz
+
+from backups import BackupChain
+from logstore import ActivityLog
+from records import decode_record, encode_record, validate_record
+from serializers import PRETTY_JSON
+from storage import DICT_COLLECTIONS, apply_entry
+
+GERMANY_TZ = pytz.timezone('Europe/Berlin')
+
+
+def choose_base(chain, until):
+    """Gibt das neueste Backup mit bekannter Generation zurück, das vor ``until`` (Unix-Zeit) entstanden ist"""
+    candidates = [entry for entry in chain.entries if entry.get("generation") is not None and entry["created"] <= until]
+    return max(candidates, key=lambda entry: entry["created"], default=None)
+
+
+def recover(chain, history, until):
+    """Stellt den Bestand zum Zeitpunkt ``until`` (Unix-Zeit) her.
+
+    Gibt ``(data, info)`` zurück; ``info`` enthält das verwendete Backup, die
+    Zahl der eingespielten Änderungen, die erreichte Generation und die Zahl
+    der Änderungen, die im Änderungsprotokoll fehlen (``missing``).
+
+    Das Protokoll wird erst nach dem Bestand geschrieben; bricht der Bot
+    dazwischen ab, fehlt dort eine Generation. Das ist kein Grund abzubrechen:
+    die folgenden Einträge enthalten jeweils den vollständigen Datensatz, es
+    fehlt nur der Zwischenstand der ausgelassenen Änderungen.
+    """
+    base = choose_base(chain, until)
+    if base is None:
+        raise ValueError("Vor diesem Zeitpunkt gibt es kein verwendbares Backup")
+    data = chain.restore(base["name"])
+    generation = data.get("_meta", {}).get("generation", base["generation"])
+    # Änderungen zwischen Planung und Abschluss eines Backups können etwas älter sein als ``created``
+    since = time.strftime("%Y-%m-%d", time.gmtime(base["created"] - 86400))
+    applied = 0
+    missing = 0
+    for entry in history.entries(since):
+        if entry["g"] <= generation:
+            continue
+        if entry["t"] > until:
+            break
+        missing += entry["g"] - generation - 1
+        if entry["op"] == "replace":
+            raise ValueError(
+                f"Der Bestand wurde am {entry['timestamp'][:16]} (UTC) vollständig ersetzt; "
+                "wähle einen Zeitpunkt davor oder nach dem nächsten Backup"
+            )
+        apply_entry(data, entry)
+        generation = entry["g"]
+        applied += 1
+    data["_meta"] = {"generation": generation}
+    return data, {"base": base["name"], "applied": applied, "generation": generation, "missing": missing}
+
+
+def parse_time(text):
+    """Liest ``TT.MM.JJJJ HH:MM`` oder ``JJJJ-MM-TT HH:MM`` (deutsche Zeit) als Unix-Zeit"""
+    for pattern in ("%d.%m.%Y %H:%M", "%Y-%m-%d %H:%M", "%d.%m.%Y %H:%M:%S", "%Y-%m-%d %H:%M:%S"):
+        try:
+            return GERMANY_TZ.localize(datetime.strptime(text.strip(), pattern)).timestamp()
+        except ValueError:
+            continue
+    raise ValueError(f"Unbekanntes Zeitformat: {text} (erwartet TT.MM.JJJJ HH:MM)")
+
+
+@dataclass
+class StagedReload:
+    """Geprüfter, noch nicht eingespielter Datenbestand aus ``/reload``.
+
+    ``summary`` enthält je Sammlung die Zahl neuer, entfernter und geänderter
+    Datensätze gegenüber dem Stand der Generation ``generation``.
+    """
+
+    data: dict
+    generation: int
+    summary: dict = field(default_factory=dict)
+    errors: list = field(default_factory=list)
+    error_count: int = 0
+
+
+def validate_dataset(raw, max_errors=20):
+    """Prüft einen hochgeladenen Bestand gegen das Schema; gibt ``(fehler, anzahl)`` zurück"""
+    if not isinstance(raw, dict) or "customers" not in raw or "invoices" not in raw:
+        raise ValueError("Die Datei enthält keine Kundendaten (`customers` und `invoices` fehlen)")
+    errors = []
+    count = 0
+    for name in DICT_COLLECTIONS:
+        collection = raw.get(name, {})
+        if not isinstance(collection, dict):
+            problems = [(name, f"Objekt erwartet, {type(collection).__name__} gefunden")]
+        else:
+            problems = ((f"{name}/{key}", problem) for key, value in collection.items() for problem in validate_record(name, value))
+        for where, problem in problems:
+            count += 1
+            if len(errors) < max_errors:
+                errors.append(f"{where}: {problem}")
+    return errors, count
+
+
+def diff_summary(live, incoming, archive=None):
+    """Zählt je Sammlung neue, entfernte und geänderte Datensätze.
+
+    Beide Seiten werden vor dem Vergleich auf die aktuelle Schemaversion
+    gebracht, damit ältere Exporte nicht als vollständig geändert gelten.
+    Neue Schlüssel, die im kalten Archiv liegen, zählen als ``archiv``.
+    """
+    summary = {}
+    for name in DICT_COLLECTIONS:
+        before = live.get(name, {})
+        after = incoming.get(name, {})
+        added = after.keys() - before.keys()
+        archived = archive.view(name) if archive else None
+        restored = sum(1 for key in added if key in archived) if archived else 0
+        changed = sum(
+            1 for key in after.keys() & before.keys()
+            if encode_record(decode_record(name, after[key])) != encode_record(decode_record(name, before[key]))
+        )
+        summary[name] = {
+            "neu": len(added) - restored,
+            "archiv": restored,
+            "entfernt": len(before.keys() - after.keys()),
+            "geändert": changed,
+        }
+    return summary
+
+
+def read_upload(f):
+    """Liest eine hochgeladene JSON-Datei aus einem binären Dateiobjekt"""
+    text = io.TextIOWrapper(f, encoding='utf-8')
+    try:
+        return json.load(text)
+    finally:
+        text.detach()
+
+
+def stage_reload(incoming, store, archive=None):
+    """Prüft einen hochgeladenen Bestand und vergleicht ihn mit dem dauerhaft gespeicherten Stand.
+
+    Läuft in einem Worker-Thread; ``store`` muss vorher verdichtet und
+    dauerhaft geschrieben sein, damit ``load_durable`` dem Live-Bestand entspricht.
+    """
+    errors, error_count = validate_dataset(incoming)
+    staged = StagedReload(incoming, store.generation, errors=errors, error_count=error_count)
+    if error_count:
+        return staged
+    live = store.load_durable()
+    staged.generation = live.pop("_meta", {}).get("generation", store.generation)
+    staged.summary = diff_summary(live, incoming, archive)
+    # Datensätze schon hier dekodieren, damit der Event-Loop beim Einspielen nur noch tauscht
+    for name in DICT_COLLECTIONS:
+        if name in incoming:
+            incoming[name] = {key: decode_record(name, value) for key, value in incoming[name].items()}
+    return staged
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Stand von InsuranceGuard zu einem Zeitpunkt wiederherstellen")
+    parser.add_argument("zeitpunkt", help="z.B. \"01.12.2024 14:30\" (deutsche Zeit)")
+    parser.add_argument("--backups", default="backups", help="Backup-Verzeichnis")
+    parser.add_argument("--history", default="history", help="Verzeichnis des Änderungsprotokolls")
+    parser.add_argument("-o", "--output", default="insurance_data.recovered.json")
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    data, info = recover(BackupChain(args.backups, None, adopt=False), ActivityLog(args.history, name="history"), parse_time(args.zeitpunkt))
+    PRETTY_JSON.dump(args.output, data)
+    print(f"{info['base']} + {info['applied']} Änderungen -> Generation {info['generation']} "
+          f"({time.perf_counter() - started:.2f} s), geschrieben nach {args.output}")
+    if info["missing"]:
+        print(f"Warnung: {info['missing']} Änderungen fehlen im Änderungsprotokoll und wurden übersprungen")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,44 @@
+class RoleRegistry:
+    """Rollen je Server nach Name (Versicherungsrollen) und ID (Mitarbeiterrollen).
+
+    Aufgebaut wird je Server mit einem Durchlauf über ``guild.roles`` beim
+    ersten Zugriff; danach ist jede Auflösung ein Dict-Zugriff statt einer
+    linearen Suche mit ``discord.utils.get``. Betrifft ein Gateway-Ereignis
+    (Rolle angelegt, umbenannt, gelöscht) eine verfolgte Rolle, wird der Stand
+    des Servers verworfen und beim nächsten Zugriff neu aufgebaut. Bei
+    doppelten Namen gilt wie bei ``discord.utils.get`` die erste Rolle in
+    ``guild.roles``.
+    """
+
+    def __init__(self, names=(), ids=()):
+        self.names = frozenset(names)
+        self.ids = frozenset(ids)
+        self._guilds = {}
+
+    def _entry(self, guild):
+        entry = self._guilds.get(guild.id)
+        if entry is None:
+            by_name = {}
+            by_id = {}
+            for role in guild.roles:
+                if role.name in self.names:
+                    by_name.setdefault(role.name, role)
+                if role.id in self.ids:
+                    by_id[role.id] = role
+            entry = self._guilds[guild.id] = (by_name, by_id)
+        return entry
+
+    def by_name(self, guild, name):
+        return self._entry(guild)[0].get(name)
+
+    def by_id(self, guild, role_id):
+        return self._entry(guild)[1].get(role_id)
+
+    def has_any(self, member, *role_ids):
+        """Prüft, ob ``member`` eine der Rollen hat; sucht in den Rollen-IDs des Mitglieds, ohne ``member.roles`` aufzubauen"""
+        return any(member.get_role(role_id) is not None for role_id in role_ids if self.by_id(member.guild, role_id) is not None)
+
+    def changed(self, role, before=None):
+        """Für ``on_guild_role_create/update/delete``: verwirft den Stand des Servers, wenn eine verfolgte Rolle betroffen ist"""
+        if role.name in self.names or role.id in self.ids or (before is not None and before.name in self.names):
+            self._guilds.pop(role.guild.id, None)
@@ -0,0 +1,303 @@
+import gzip
+import io
+import json
+import lzma
+import marshal
+import os
+import struct
+from collections.abc import Mapping
+
+from records import encode_record
+
+
+class SnapshotFormat:
+    """Dateiformat für Snapshots, Backups und Exporte.
+
+    Ein Snapshot besteht aus Teilen ``(name, fragmente, wert)``: Sammlungen
+    liefern ein dict ``key -> Fragment`` mit bereits kodierten Datensätzen
+    (``encode_fragment``), einfache Werte wie ``_meta`` stehen in ``wert``.
+    So lassen sich die Fragmente zwischen zwei Snapshots wiederverwenden;
+    ``write`` fügt sie nur noch zusammen und kann in einem eigenen Thread laufen.
+
+    Formate mit ``indexable = True`` liefern aus ``write`` die Byte-Bereiche
+    aller Fragmente (``{name: {key: (offset, länge)}}``, bei einfachen Werten
+    ``{name: (offset, länge)}``). Damit lassen sich einzelne Datensätze später
+    direkt aus der Datei lesen (``decode_fragment``).
+    """
+
+    name = None
+    suffix = None
+    indexable = False
+
+    def encode_fragment(self, key, value):
+        raise NotImplementedError
+
+    def decode_fragment(self, raw):
+        """Gibt ``(key, wert)`` für die Bytes eines Fragments zurück"""
+        raise NotImplementedError
+
+    def decode_value(self, raw):
+        """Dekodiert die Bytes eines einfachen Werts"""
+        raise NotImplementedError
+
+    def raw_fragment(self, raw):
+        """Wandelt die Bytes eines Fragments aus der Datei zurück in ein wiederverwendbares Fragment"""
+        return raw
+
+    def write(self, f, parts):
+        """Schreibt die Teile in die binär geöffnete Datei ``f`` und gibt ggf. die Byte-Bereiche zurück"""
+        raise NotImplementedError
+
+    def read(self, f):
+        raise NotImplementedError
+
+    def parts(self, data):
+        """Zerlegt einen Datenbestand aus dicts (oder Datensätzen) in Teile"""
+        result = []
+        for name, value in data.items():
+            if isinstance(value, Mapping):
+                fragments = {key: self.encode_fragment(key, encode_record(record)) for key, record in value.items()}
+                result.append((name, fragments, None))
+            else:
+                result.append((name, None, value))
+        return result
+
+    def dump(self, path, data):
+        """Schreibt einen Datenbestand atomar nach ``path``"""
+        self.write_parts(path, self.parts(data))
+
+    def write_parts(self, path, parts):
+        tmp_path = path + ".tmp"
+        with open(tmp_path, 'wb') as f:
+            spans = self.write(f, parts)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+        return spans
+
+    def load(self, path):
+        with open(path, 'rb') as f:
+            return self.read(f)
+
+
+class PrettyJson(SnapshotFormat):
+    """Eingerücktes JSON für Menschen (Exporte, ``/reload``)"""
+
+    name = "json-pretty"
+    suffix = ".json"
+
+    def encode_fragment(self, key, value):
+        encoded = json.dumps(value, indent=4, ensure_ascii=False).replace("\n", "\n        ")
+        return f"        {json.dumps(key, ensure_ascii=False)}: {encoded}"
+
+    def write(self, f, parts):
+        out = io.TextIOWrapper(f, encoding='utf-8', write_through=True)
+        out.write("{")
+        for index, (name, fragments, value) in enumerate(parts):
+            out.write(",\n    " if index else "\n    ")
+            out.write(json.dumps(name) + ": ")
+            if fragments is None:
+                out.write(json.dumps(value, ensure_ascii=False))
+            elif fragments:
+                out.write("{\n")
+                out.write(",\n".join(fragments.values()))
+                out.write("\n    }")
+            else:
+                out.write("{}")
+        out.write("\n}")
+        out.detach()
+
+    def read(self, f):
+        return json.load(f)
+
+
+class CompactJson(SnapshotFormat):
+    """Minifiziertes JSON ohne Einrückung; optional komprimiert.
+
+    Kodiert wird mit ``ensure_ascii``, damit Zeichen- und Byte-Offsets übereinstimmen.
+    """
+
+    name = "json"
+    suffix = ".json"
+    indexable = True
+
+    def encode_fragment(self, key, value):
+        return json.dumps(key) + ":" + json.dumps(value, separators=(',', ':'))
+
+    def decode_fragment(self, raw):
+        return next(iter(json.loads(b"{" + raw + b"}").items()))
+
+    def decode_value(self, raw):
+        return json.loads(raw)
+
+    def raw_fragment(self, raw):
+        return raw.decode('ascii')
+
+    def open_write(self, f):
+        return f
+
+    def open_read(self, f):
+        return f
+
+    def write(self, f, parts):
+        pieces = ["{"]
+        position = 1
+        spans = {}
+        for index, (name, fragments, value) in enumerate(parts):
+            head = ("," if index else "") + json.dumps(name) + ":"
+            pieces.append(head)
+            position += len(head)
+            if fragments is None:
+                body = json.dumps(value, separators=(',', ':'))
+                spans[name] = (position, len(body))
+                pieces.append(body)
+                position += len(body)
+                continue
+            collection_spans = spans[name] = {}
+            pieces.append("{")
+            position += 1
+            for number, (key, fragment) in enumerate(fragments.items()):
+                if number:
+                    pieces.append(",")
+                    position += 1
+                collection_spans[key] = (position, len(fragment))
+                pieces.append(fragment)
+                position += len(fragment)
+            pieces.append("}")
+            position += 1
+        pieces.append("}")
+        out = self.open_write(f)
+        out.write("".join(pieces).encode('utf-8'))
+        if out is not f:
+            out.close()
+        return spans if self.indexable else None
+
+    def read(self, f):
+        return json.load(self.open_read(f))
+
+
+class GzipJson(CompactJson):
+    name = "json.gz"
+    suffix = ".json.gz"
+    indexable = False
+    level = 6
+
+    def open_write(self, f):
+        # Ohne Dateiname und Zeitstempel im Kopf: gleicher Inhalt ergibt dieselben Bytes
+        return gzip.GzipFile(filename='', fileobj=f, mode='wb', compresslevel=self.level, mtime=0)
+
+    def open_read(self, f):
+        return gzip.GzipFile(fileobj=f, mode='rb')
+
+
+class LzmaJson(CompactJson):
+    name = "json.xz"
+    suffix = ".json.xz"
+    indexable = False
+    preset = 1
+
+    def open_write(self, f):
+        return lzma.LZMAFile(f, 'wb', preset=self.preset)
+
+    def open_read(self, f):
+        return lzma.LZMAFile(f, 'rb')
+
+
+class MarshalFormat(SnapshotFormat):
+    """Binärformat auf Basis von ``marshal`` (nur für diesen Bot, nicht versionsstabil über Python-Versionen).
+
+    Aufbau: Kopfzeile, dann je Teil ein Rahmen ``(name, anzahl)`` gefolgt von
+    ``anzahl`` Rahmen ``(key, wert)``; bei einfachen Werten ist ``anzahl == -1``
+    und es folgt ein Rahmen mit dem Wert. Jeder Rahmen ist ein mit seiner
+    Länge (4 Byte) versehenes ``marshal``-Objekt.
+    """
+
+    name = "marshal"
+    suffix = ".marshal"
+    indexable = True
+    header = b"IGSNAP1\n"
+    _length = struct.Struct("<I")
+
+    def _frame(self, value):
+        encoded = marshal.dumps(value)
+        return self._length.pack(len(encoded)) + encoded
+
+    def encode_fragment(self, key, value):
+        return self._frame((key, value))
+
+    def decode_fragment(self, raw):
+        return marshal.loads(raw[4:])
+
+    def decode_value(self, raw):
+        return marshal.loads(raw[4:])
+
+    def write(self, f, parts):
+        chunks = [self.header]
+        position = len(self.header)
+        spans = {}
+        for name, fragments, value in parts:
+            if fragments is None:
+                head = self._frame((name, -1))
+                body = self._frame(value)
+                spans[name] = (position + len(head), len(body))
+                chunks += (head, body)
+                position += len(head) + len(body)
+                continue
+            head = self._frame((name, len(fragments)))
+            chunks.append(head)
+            position += len(head)
+            collection_spans = spans[name] = {}
+            for key, fragment in fragments.items():
+                collection_spans[key] = (position, len(fragment))
+                chunks.append(fragment)
+                position += len(fragment)
+        f.write(b"".join(chunks))
+        return spans
+
+    def read(self, f):
+        buffer = f.read()
+        if not buffer.startswith(self.header):
+            raise ValueError("Keine gültige Snapshot-Datei (marshal)")
+        view = memoryview(buffer)
+        offset = len(self.header)
+        unpack = self._length.unpack_from
+        loads = marshal.loads
+
+        def frame():
+            nonlocal offset
+            (length,) = unpack(buffer, offset)
+            offset += 4 + length
+            return loads(view[offset - length:offset])
+
+        data = {}
+        while offset < len(buffer):
+            name, count = frame()
+            if count == -1:
+                data[name] = frame()
+                continue
+            collection = data[name] = {}
+            for _ in range(count):
+                key, value = frame()
+                collection[key] = value
+        return data
+
+
+PRETTY_JSON = PrettyJson()
+
+FORMATS = {fmt.name: fmt for fmt in (PRETTY_JSON, CompactJson(), GzipJson(), LzmaJson(), MarshalFormat())}
+
+
+def get_format(name):
+    try:
+        return FORMATS[name]
+    except KeyError:
+        raise ValueError(f"Unbekanntes Snapshot-Format: {name} (verfügbar: {', '.join(FORMATS)})") from None
+
+
+def format_for_path(path):
+    """Bestimmt das Format einer vorhandenen Datei anhand ihrer Endung"""
+    for name in ("json.gz", "json.xz", "marshal"):
+        if path.endswith(FORMATS[name].suffix):
+            return FORMATS[name]
+    # Eingerücktes und kompaktes JSON werden gleich gelesen
+    return FORMATS["json"]
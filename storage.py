@@ -0,0 +1,1162 @@
+import asyncio
+import json
+import marshal
+import math
+import mmap
+import os
+import logging
+import shutil
+import sqlite3
+import threading
+import time
+from array import array
+from collections import OrderedDict
+from collections.abc import MutableMapping
+from datetime import datetime, timezone
+
+from records import encode_record, decode_record, is_hot
+from serializers import PRETTY_JSON, format_for_path
+
+DICT_COLLECTIONS = ("customers", "invoices", "pending_auszahlungen", "schadensmeldungen")
+# Sammlungen, deren offene Vorgänge (``is_hot``) beim Start sofort geladen werden
+HOT_COLLECTIONS = ("invoices", "pending_auszahlungen")
+
+logger = logging.getLogger('InsuranceBot')
+
+
+def empty_data():
+    """Gibt eine leere Datenstruktur zurück"""
+    return {"customers": {}, "invoices": {}, "pending_auszahlungen": {}, "schadensmeldungen": {}}
+
+
+def apply_entry(data, entry):
+    """Wendet einen einzelnen Journal-Eintrag auf die Daten an"""
+    op = entry["op"]
+    collection = entry["c"]
+    if op == "put":
+        data.setdefault(collection, {})[entry["k"]] = entry["v"]
+    elif op == "del":
+        data.get(collection, {}).pop(entry["k"], None)
+    elif op == "add":
+        # Nur noch beim Einspielen alter Journale mit Protokolleinträgen
+        data.setdefault(collection, []).append(entry["v"])
+    else:
+        raise ValueError(f"Unbekannte Journal-Operation: {op}")
+
+
+class TrackedDict(MutableMapping):
+    """Dict-artige Sammlung, die geänderte Schlüssel in ``dirty`` vormerkt.
+
+    In-Place-Änderungen an einem Datensatz werden über ``Storage.prepare``
+    gemeldet, das den Datensatz erneut zuweist und ihn damit markiert.
+
+    Ist ein ``fallback`` (z.B. das kalte Archiv) gesetzt, finden Zugriffe per
+    Schlüssel auch dort abgelegte Datensätze; Iteration und ``len`` umfassen
+    nur den heißen Bestand.
+    """
+
+    def __init__(self, items=None, fallback=None):
+        self._items = dict(items or {})
+        self.dirty = set(self._items)
+        self.fallback = fallback
+
+    def __getitem__(self, key):
+        try:
+            return self._items[key]
+        except KeyError:
+            value = self.fallback.get(key) if self.fallback is not None else None
+            if value is None:
+                raise
+            return value
+
+    def __setitem__(self, key, value):
+        self._items[key] = value
+        self.dirty.add(key)
+
+    def __delitem__(self, key):
+        del self._items[key]
+        self.dirty.add(key)
+
+    def __contains__(self, key):
+        return key in self._items or (self.fallback is not None and key in self.fallback)
+
+    def __iter__(self):
+        return iter(self._items)
+
+    def __len__(self):
+        return len(self._items)
+
+    def get(self, key, default=None):
+        try:
+            return self[key]
+        except KeyError:
+            return default
+
+    def get_hot(self, key):
+        """Wie ``get``, aber ohne Fallback auf das Archiv"""
+        return self._items.get(key)
+
+    def pop(self, key, *default):
+        # Entfernt nur aus dem heißen Bestand
+        self.dirty.add(key)
+        return self._items.pop(key, *default)
+
+    def items(self):
+        return self._items.items()
+
+    def values(self):
+        return self._items.values()
+
+    def loaded_items(self):
+        """Datensätze, die bereits im Speicher liegen, ohne weitere nachzuladen (offene Vorgänge sind immer dabei)"""
+        return self._items.items()
+
+    def take_dirty(self):
+        dirty, self.dirty = self.dirty, set()
+        return dirty
+
+    def __repr__(self):
+        return f"TrackedDict({self._items!r})"
+
+
+class SnapshotReader:
+    """Liest einzelne Fragmente über ihren Byte-Bereich aus einer Snapshot-Datei.
+
+    Die Datei bleibt per ``mmap`` geöffnet; wird der Snapshot später ersetzt,
+    liest der Reader weiterhin die ursprüngliche Datei.
+    """
+
+    def __init__(self, path, snapshot_format):
+        self.format = snapshot_format
+        self._file = open(path, 'rb')
+        self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+
+    def _read(self, span):
+        offset, length = span
+        return self._map[offset:offset + length]
+
+    def fragment(self, span):
+        return self.format.decode_fragment(self._read(span))
+
+    def value(self, span):
+        return self.format.decode_value(self._read(span))
+
+    def raw_fragment(self, span):
+        return self.format.raw_fragment(self._read(span))
+
+    def close(self):
+        self._map.close()
+        self._file.close()
+
+
+class LazyCollection(TrackedDict):
+    """TrackedDict über einem Snapshot, dessen Datensätze erst beim ersten Zugriff dekodiert werden.
+
+    ``_spans`` ordnet jedem noch nicht geladenen Schlüssel seine Position in
+    ``offsets``/``lengths`` (Byte-Bereich im Snapshot) zu. Zugriffe per
+    Schlüssel laden nur den einen Datensatz, ``items()`` und ``values()``
+    laden alle. Geladene, unveränderte Datensätze gelten nicht als ``dirty``.
+    """
+
+    def __init__(self, name, reader, keys, offsets, lengths, fallback=None):
+        super().__init__(None, fallback)
+        self.name = name
+        self._reader = reader
+        self._spans = dict(zip(keys, range(len(keys))))
+        self._offsets = offsets
+        self._lengths = lengths
+
+    def _span(self, position):
+        return self._offsets[position], self._lengths[position]
+
+    def _load(self, key):
+        _, raw = self._reader.fragment(self._span(self._spans.pop(key)))
+        value = self._items[key] = decode_record(self.name, raw)
+        return value
+
+    def __getitem__(self, key):
+        if key in self._spans:
+            return self._load(key)
+        return super().__getitem__(key)
+
+    def __setitem__(self, key, value):
+        self._spans.pop(key, None)
+        super().__setitem__(key, value)
+
+    def __delitem__(self, key):
+        if key in self._spans:
+            self._load(key)
+        super().__delitem__(key)
+
+    def __contains__(self, key):
+        return key in self._spans or super().__contains__(key)
+
+    def get_hot(self, key):
+        if key in self._spans:
+            return self._load(key)
+        return self._items.get(key)
+
+    def __iter__(self):
+        return iter([*self._items, *self._spans])
+
+    def __len__(self):
+        return len(self._items) + len(self._spans)
+
+    def pop(self, key, *default):
+        if key in self._spans:
+            self._load(key)
+        return super().pop(key, *default)
+
+    def load_all(self):
+        for key in list(self._spans):
+            self._load(key)
+
+    def items(self):
+        self.load_all()
+        return self._items.items()
+
+    def values(self):
+        self.load_all()
+        return self._items.values()
+
+    def raw_fragments(self):
+        """Gibt die unveränderten Fragmente der noch nicht geladenen Datensätze zurück"""
+        return {key: self._reader.raw_fragment(self._span(position)) for key, position in self._spans.items()}
+
+    def __repr__(self):
+        return f"LazyCollection({self.name!r}, geladen={len(self._items)}, offen={len(self._spans)})"
+
+
+def track_collections(data, cold_archive=None):
+    """Ersetzt die dict-Sammlungen in ``data`` durch TrackedDicts mit Datensatzobjekten"""
+    for name in DICT_COLLECTIONS:
+        fallback = cold_archive.view(name) if cold_archive else None
+        collection = data.get(name, {})
+        if isinstance(collection, LazyCollection):
+            # Aus dem Journal eingespielte Datensätze liegen noch als dict vor
+            collection._items = {key: decode_record(name, value) for key, value in collection._items.items()}
+            collection.fallback = fallback
+            continue
+        records = {key: decode_record(name, value) for key, value in collection.items()}
+        data[name] = TrackedDict(records, fallback)
+    return data
+
+
+class SnapshotEncoder:
+    """Kodiert Snapshots inkrementell.
+
+    Die kodierte Form jedes Datensatzes wird zwischengespeichert; beim nächsten
+    Snapshot werden nur die als ``dirty`` markierten Datensätze neu kodiert.
+    ``encode`` liefert die Teile für ``SnapshotFormat.write``, das erst der
+    Schreib-Thread aufruft.
+    """
+
+    def __init__(self, snapshot_format=PRETTY_JSON):
+        self.format = snapshot_format
+        self._records = {}
+        self._owners = {}
+
+    def _encode_record(self, key, value):
+        return self.format.encode_fragment(key, encode_record(value))
+
+    def _collection_fragments(self, name, collection):
+        if not isinstance(collection, TrackedDict):
+            return {key: self._encode_record(key, value) for key, value in collection.items()}
+        cache = self._records.get(name)
+        if cache is None or self._owners.get(name) is not collection:
+            collection.take_dirty()
+            cache = {key: self._encode_record(key, value) for key, value in collection._items.items()}
+            if isinstance(collection, LazyCollection):
+                cache.update(collection.raw_fragments())
+            self._records[name] = cache
+            self._owners[name] = collection
+        else:
+            for key in collection.take_dirty():
+                # Nur der heiße Bestand gehört in den Snapshot, nicht das Archiv dahinter
+                if key in collection._items:
+                    cache[key] = self._encode_record(key, collection._items[key])
+                else:
+                    cache.pop(key, None)
+        return dict(cache)
+
+    def encode(self, data):
+        """Gibt eine Liste von ``(name, Fragmente, Wert)`` zurück"""
+        parts = []
+        for name, collection in data.items():
+            if isinstance(collection, MutableMapping):
+                parts.append((name, self._collection_fragments(name, collection), None))
+            else:
+                parts.append((name, None, collection))
+        return parts
+
+
+class ChangeTracker:
+    """Merkt sich die seit ``since`` geänderten Schlüssel je Sammlung (für differenzielle Backups).
+
+    Nach ``invalidate`` (z.B. beim Ersetzen des gesamten Bestands) ist die
+    Liste unvollständig, bis ``reset`` sie neu beginnt.
+    """
+
+    def __init__(self, generation):
+        self.reset(generation)
+
+    def reset(self, generation):
+        self.since = generation
+        self.keys = {}
+        self.complete = True
+
+    def add(self, collection, key):
+        self.keys.setdefault(collection, set()).add(key)
+
+    def invalidate(self):
+        self.complete = False
+        self.keys = {}
+
+    def count(self):
+        return sum(len(keys) for keys in self.keys.values())
+
+
+class Storage:
+    """Gemeinsame Schnittstelle aller Speicher-Backends.
+
+    ``load()`` liefert das ``data``-Objekt, auf das die Befehle zugreifen.
+    Jede Änderung wird in zwei Schritten verarbeitet: ``prepare`` läuft im
+    Event-Loop, aktualisiert den In-Memory-Stand und liefert einen fertig
+    kodierten Eintrag; ``write_batch`` schreibt beliebig viele solcher
+    Einträge auf die Platte und darf in einem eigenen Thread laufen.
+
+    ``generation`` zählt jede Änderung monoton hoch und wird mit dem Bestand
+    gespeichert; Änderungen lassen sich damit in O(1) erkennen.
+
+    Das Aktivitätsprotokoll gehört nicht zum Bestand: ``prepare_log``-Einträge
+    laufen durch denselben Schreib-Thread, landen aber im ``activity_log``.
+    Abgeschlossene Datensätze liegen im ``cold_archive`` und werden von den
+    Sammlungen bei Zugriffen per Schlüssel transparent nachgeladen.
+
+    Nach ``track_changes()`` vermerkt ``changes`` jeden geänderten Schlüssel.
+    Ist ``history`` gesetzt, schreiben ``prepare_change`` und
+    ``prepare_replace`` jede Änderung zusätzlich mit Zeitstempel und
+    Generation in dieses Änderungsprotokoll (Point-in-Time-Recovery).
+    """
+
+    files = ()
+    generation = 0
+    activity_log = None
+    cold_archive = None
+    history = None
+    changes = None
+
+    def exists(self):
+        return any(os.path.exists(path) for path in self.files)
+
+    def load(self):
+        raise NotImplementedError
+
+    def prepare(self, op, collection, key=None, value=None):
+        """Bereitet eine Änderung (``put`` oder ``del``) vor und gibt den zu schreibenden Eintrag zurück"""
+        raise NotImplementedError
+
+    def track_changes(self):
+        """Beginnt, geänderte Schlüssel ab dem aktuellen Stand in ``changes`` zu sammeln"""
+        self.changes = ChangeTracker(self.generation)
+        return self.changes
+
+    def _track(self, collection, key):
+        if self.changes is not None:
+            self.changes.add(collection, key)
+
+    def prepare_log(self, entry):
+        """Bereitet einen Eintrag für das Aktivitätsprotokoll vor (ändert ``generation`` nicht)"""
+        return ("activity", self.activity_log.encode(entry))
+
+    def _history_entry(self, change):
+        now = time.time()
+        entry = {"timestamp": datetime.fromtimestamp(now, timezone.utc).isoformat(), "t": now, "g": self.generation}
+        entry.update(change)
+        return ("history", self.history.encode(entry))
+
+    def prepare_change(self, op, collection, key=None, value=None):
+        """Wie ``prepare``, gibt aber eine Liste samt Eintrag für das Änderungsprotokoll zurück"""
+        entries = [self.prepare(op, collection, key, value)]
+        if self.history is not None:
+            change = {"op": op, "c": collection, "k": key}
+            if op == "put":
+                change["v"] = encode_record(value)
+            entries.append(self._history_entry(change))
+        return entries
+
+    def prepare_replace(self, new_data):
+        """Wie ``replace_entry``; im Änderungsprotokoll wird der Austausch nur markiert"""
+        entries = [self.replace_entry(new_data)]
+        if self.history is not None:
+            entries.append(self._history_entry({"op": "replace"}))
+        return entries
+
+    def migrate_logs(self):
+        """Verschiebt Protokolleinträge aus älteren Datenbeständen ins Aktivitätsprotokoll"""
+        return 0
+
+    def _split_logs(self, entries):
+        """Trennt Aktivitäts- und Änderungsprotokoll eines Batches von den übrigen Einträgen"""
+        pending = {}
+        remaining = []
+        for entry in entries:
+            if entry[0] in ("activity", "history"):
+                pending.setdefault(entry[0], []).append(entry[1])
+            else:
+                remaining.append(entry)
+        return pending, remaining
+
+    def _write_logs(self, pending):
+        """Schreibt die Protokollzeilen aus ``_split_logs``.
+
+        Erst nach dem Bestand aufrufen: schlägt das Schreiben des Bestands fehl,
+        wiederholt der ``PersistenceWorker`` den ganzen Batch, und bereits
+        geschriebene Zeilen stünden dann doppelt im Änderungsprotokoll.
+        """
+        logs = {"activity": self.activity_log, "history": self.history}
+        for kind, lines in pending.items():
+            logs[kind].write(lines)
+
+    def snapshot_entry(self):
+        """Erfasst einen konsistenten Stand für die Verdichtung"""
+        raise NotImplementedError
+
+    def replace_entry(self, new_data):
+        """Ersetzt den gesamten Bestand im Speicher und gibt den zu schreibenden Eintrag zurück"""
+        raise NotImplementedError
+
+    def write_batch(self, entries):
+        """Schreibt vorbereitete Einträge in einem Durchgang"""
+        raise NotImplementedError
+
+    def preload(self):
+        """Lädt offene Vorgänge in den Speicher; nach ``replace`` erst aufrufen, wenn der neue Bestand geschrieben ist"""
+
+    def needs_compaction(self):
+        return False
+
+    def load_durable(self):
+        """Liest den zuletzt dauerhaft geschriebenen Stand als dicts; darf in einem Worker-Thread laufen"""
+        raise NotImplementedError
+
+    def export(self, path, snapshot_format):
+        """Exportiert den zuletzt dauerhaft geschriebenen Stand im angegebenen Format"""
+        snapshot_format.dump(path, self.load_durable())
+
+    def export_json(self, path):
+        """Exportiert den zuletzt dauerhaft geschriebenen Stand als lesbares JSON"""
+        self.export(path, PRETTY_JSON)
+
+    def close(self):
+        for log in (self.activity_log, self.history, self.cold_archive):
+            if log:
+                log.close()
+
+    # Synchrone Varianten für Werkzeuge ohne Persistenz-Thread
+    def put(self, collection, key, value):
+        self.write_batch(self.prepare_change("put", collection, key, value))
+
+    def delete(self, collection, key):
+        self.write_batch(self.prepare_change("del", collection, key))
+
+    def log(self, entry):
+        self.write_batch([self.prepare_log(entry)])
+
+    def compact(self):
+        self.write_batch([self.snapshot_entry()])
+
+    def replace(self, new_data):
+        self.write_batch(self.prepare_replace(new_data))
+        self.preload()
+        return self.data
+
+
+class JournalStore(Storage):
+    """Snapshot-Datei plus Write-Ahead-Journal.
+
+    Jede Änderung wird als kleiner Eintrag an das Journal angehängt, die Kosten
+    einer Änderung hängen also nur von ihrer eigenen Größe ab. Nach
+    ``compact_threshold`` Einträgen wird das Journal in den Snapshot verdichtet.
+
+    Fehlt ``snapshot_path`` (z.B. nach einem Wechsel des Formats), wird die
+    erste vorhandene Datei aus ``fallback_paths`` geladen.
+
+    Mit ``lazy`` (und einem indizierbaren Format) wird neben jedem Snapshot ein
+    Index ``<snapshot>.idx`` mit den Byte-Bereichen aller Datensätze
+    geschrieben. Beim Start wird dann nur dieser Index gelesen; Datensätze
+    werden beim ersten Zugriff dekodiert, offene Vorgänge (``is_hot``) sofort.
+    Der Index ist nur ein Cache: passt er nicht zum Snapshot, wird vollständig
+    geladen.
+    """
+
+    def __init__(self, snapshot_path, journal_path, compact_threshold=1000, activity_log=None, cold_archive=None,
+                 snapshot_format=PRETTY_JSON, fallback_paths=(), lazy=True, history=None):
+        self.snapshot_path = snapshot_path
+        self.journal_path = journal_path
+        self.index_path = snapshot_path + ".idx"
+        self.lazy = lazy and snapshot_format.indexable
+        self.fallback_paths = tuple(path for path in fallback_paths if path != snapshot_path)
+        self.files = (snapshot_path, journal_path, *self.fallback_paths)
+        self.compact_threshold = compact_threshold
+        self.pending = 0
+        self.data = None
+        self.format = snapshot_format
+        self.encoder = SnapshotEncoder(snapshot_format)
+        self.activity_log = activity_log
+        self.cold_archive = cold_archive
+        self.history = history
+        self._journal = None
+        self._readers = []
+
+    def load(self):
+        started = time.perf_counter()
+        source = self.snapshot_path
+        if not os.path.exists(source):
+            source = next((path for path in self.fallback_paths if os.path.exists(path)), None)
+        data = self._open_lazy() if source == self.snapshot_path else None
+        mode = "lazy" if data is not None else "vollständig"
+        if data is None:
+            data = format_for_path(source).load(source) if source else empty_data()
+        for key, value in empty_data().items():
+            data.setdefault(key, value)
+        self.generation = data.pop("_meta", {}).get("generation", 0)
+        self.pending = self._replay(data)
+        if self.pending:
+            logger.info(f"{self.pending} Journal-Einträge wiederhergestellt")
+        self._journal = open(self.journal_path, 'a', encoding='utf-8')
+        self.data = track_collections(data, self.cold_archive)
+        logger.info(f"Bestand in {(time.perf_counter() - started) * 1000:.0f} ms geladen ({mode})")
+        if source and source != self.snapshot_path:
+            logger.info(f"Snapshot aus {source} übernommen, schreibe {self.snapshot_path} ({self.format.name})")
+            self.compact()
+        return self.data
+
+    def _open_lazy(self):
+        """Öffnet den Snapshot über seinen Index; gibt ``None`` zurück, wenn kein passender Index vorliegt"""
+        if not self.lazy or not os.path.exists(self.index_path):
+            return None
+        reader = None
+        try:
+            with open(self.index_path, 'rb') as f:
+                index = marshal.load(f)
+            if index["format"] != self.format.name or index["size"] != os.path.getsize(self.snapshot_path):
+                raise ValueError("Index gehört zu einem anderen Snapshot")
+            reader = SnapshotReader(self.snapshot_path, self.format)
+            data = {name: reader.value(span) for name, span in index["values"].items()}
+            if data["_meta"].get("generation") != index["generation"]:
+                raise ValueError("Index gehört zu einem anderen Snapshot")
+        except (OSError, EOFError, ValueError, TypeError, KeyError) as e:
+            logger.warning(f"Index {self.index_path} nicht verwendbar, lade vollständig: {e}")
+            if reader:
+                reader.close()
+            return None
+        self._readers.append(reader)
+        for name, (keys, offsets, lengths) in index["collections"].items():
+            collection = data[name] = LazyCollection(name, reader, keys, array('q', offsets), array('q', lengths))
+            for key in index["hot"].get(name, ()):
+                collection.get(key)
+        return data
+
+    def _replay(self, data):
+        """Spielt das Journal über den Snapshot ein und schneidet einen unvollständigen Rest ab"""
+        if not os.path.exists(self.journal_path):
+            return 0
+        count = 0
+        valid_size = 0
+        with open(self.journal_path, 'rb') as f:
+            for line in f:
+                if not line.endswith(b"\n"):
+                    break
+                try:
+                    entry = json.loads(line)
+                except json.JSONDecodeError:
+                    break
+                valid_size += len(line)
+                # Bereits im Snapshot enthaltene Einträge (Absturz während der Verdichtung) überspringen
+                generation = entry.get("g", self.generation + 1)
+                if generation <= self.generation:
+                    continue
+                apply_entry(data, entry)
+                self.generation = generation
+                count += 1
+        if valid_size != os.path.getsize(self.journal_path):
+            logger.warning(f"Unvollständiger Journal-Eintrag bei Byte {valid_size} verworfen")
+            with open(self.journal_path, 'r+b') as f:
+                f.truncate(valid_size)
+        return count
+
+    def prepare(self, op, collection, key=None, value=None):
+        self.generation += 1
+        self._track(collection, key)
+        entry = {"g": self.generation, "op": op, "c": collection, "k": key}
+        if op == "put":
+            self.data.setdefault(collection, TrackedDict())[key] = value
+            entry["v"] = encode_record(value)
+        elif op == "del":
+            self.data.setdefault(collection, TrackedDict()).pop(key, None)
+        else:
+            raise ValueError(f"Unbekannte Operation: {op}")
+        self.pending += 1
+        return ("line", json.dumps(entry, ensure_ascii=False, separators=(',', ':')) + "\n")
+
+    def migrate_logs(self):
+        logs = self.data.pop("logs", None) or []
+        if logs:
+            self.activity_log.migrate(logs)
+            self.compact()
+        return len(logs)
+
+    def snapshot_entry(self):
+        self.pending = 0
+        parts = self.encoder.encode(self.data) + [("_meta", None, {"generation": self.generation})]
+        index = None
+        if self.lazy:
+            # Nicht geladene Datensätze waren schon beim Start nicht offen und sind seither unverändert
+            hot = {
+                name: [key for key, value in self.data[name]._items.items() if is_hot(name, value)]
+                for name in HOT_COLLECTIONS
+            }
+            index = {"generation": self.generation, "hot": hot}
+        return ("snapshot", parts, index)
+
+    def replace_entry(self, new_data):
+        new_data.pop("_meta", None)
+        new_data.pop("logs", None)
+        for key, value in empty_data().items():
+            new_data.setdefault(key, value)
+        self.data = track_collections(new_data, self.cold_archive)
+        self.generation += 1
+        if self.changes is not None:
+            self.changes.invalidate()
+        return self.snapshot_entry()
+
+    def write_batch(self, entries):
+        logs, entries = self._split_logs(entries)
+        lines = []
+        for entry in entries:
+            if entry[0] == "line":
+                lines.append(entry[1])
+                continue
+            self._write_lines(lines)
+            lines = []
+            self._write_snapshot(*entry[1:])
+        self._write_lines(lines)
+        self._write_logs(logs)
+
+    def _write_lines(self, lines):
+        if lines:
+            self._journal.write("".join(lines))
+            self._journal.flush()
+
+    def _write_snapshot(self, parts, index=None):
+        spans = self.format.write_parts(self.snapshot_path, parts)
+        self._journal.truncate(0)
+        self._journal.seek(0)
+        if index is not None and spans is not None:
+            self._write_index(index, spans)
+
+    def _write_index(self, index, spans):
+        """Schreibt den Index: je Sammlung Schlüssel plus Offsets und Längen als gepackte Arrays"""
+        index = dict(index, format=self.format.name, size=os.path.getsize(self.snapshot_path), collections={}, values={})
+        for name, collection_spans in spans.items():
+            if not isinstance(collection_spans, dict):
+                index["values"][name] = collection_spans
+                continue
+            offsets = array('q', (offset for offset, _ in collection_spans.values()))
+            lengths = array('q', (length for _, length in collection_spans.values()))
+            index["collections"][name] = (list(collection_spans), offsets.tobytes(), lengths.tobytes())
+        with open(self.index_path + ".tmp", 'wb') as f:
+            marshal.dump(index, f)
+        os.replace(self.index_path + ".tmp", self.index_path)
+
+    def needs_compaction(self):
+        return self.pending >= self.compact_threshold
+
+    def load_durable(self):
+        # Änderungen nach dem letzten Snapshot stehen nur im Journal; vorher ``compact`` abwarten
+        return self.format.load(self.snapshot_path)
+
+    def export(self, path, snapshot_format):
+        if os.path.abspath(path) == os.path.abspath(self.snapshot_path):
+            return
+        if snapshot_format is self.format:
+            shutil.copyfile(self.snapshot_path, path)
+        else:
+            super().export(path, snapshot_format)
+
+    def close(self):
+        super().close()
+        if self._journal:
+            self._journal.close()
+            self._journal = None
+        for reader in self._readers:
+            reader.close()
+        self._readers = []
+
+
+# Zusätzlich indizierte Spalten je Tabelle; der vollständige Datensatz liegt als JSON in ``value``
+SQLITE_TABLES = {
+    "customers": ("discord_user_id", "status"),
+    "invoices": ("customer_id", "paid", "due_date"),
+    "pending_auszahlungen": ("customer_id", "status"),
+    "schadensmeldungen": ("customer_id",),
+}
+# Bedingung für offene Vorgänge, die beim Start in den Cache geladen werden
+SQLITE_HOT = {
+    "invoices": "paid = 0",
+    "pending_auszahlungen": "status = 'ausstehend'",
+}
+# Zuletzt genutzte Datensätze je Tabelle im Cache; offene Vorgänge und ungeschriebene Änderungen kommen hinzu
+SQLITE_CACHE_SIZE = 10000
+
+class SqliteCollection(MutableMapping):
+    """Dict-artige Sicht auf eine Tabelle.
+
+    Datensätze werden erst beim Zugriff geladen und danach zwischengespeichert,
+    damit In-Place-Änderungen bis zum nächsten ``put`` erhalten bleiben.
+    Wie beim Journal-Backend wird erst über ``Storage.prepare`` persistiert;
+    ``fallback`` verhält sich wie bei ``TrackedDict``.
+
+    Der Cache ist ein LRU-Cache mit etwa ``cache_size`` Einträgen. Verdrängt
+    werden nur Datensätze, deren Änderungen geschrieben sind (``written()``
+    liefert die zuletzt geschriebene Generation, ``mark`` die einer Änderung)
+    und die nicht zu einem offenen Vorgang gehören; offene Vorgänge bleiben
+    für ``loaded_items`` immer im Speicher.
+    """
+
+    def __init__(self, conn, table, fallback=None, written=None, cache_size=SQLITE_CACHE_SIZE):
+        self._conn = conn
+        self._table = table
+        self._cache = OrderedDict()
+        self._removed = set()
+        # Schlüssel mit noch nicht geschriebener Änderung -> Generation (unbekannt bis ``mark``)
+        self._pending = {}
+        self._written = written or (lambda: 0)
+        self.cache_size = cache_size
+        self._trim_at = cache_size
+        self.fallback = fallback
+
+    def __getitem__(self, key):
+        try:
+            value = self._cache[key]
+        except KeyError:
+            pass
+        else:
+            self._cache.move_to_end(key)
+            return value
+        row = None
+        if key not in self._removed:
+            row = self._conn.execute(f"SELECT value FROM {self._table} WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            value = self.fallback.get(key) if self.fallback is not None else None
+            if value is None:
+                raise KeyError(key)
+            return value
+        value = decode_record(self._table, json.loads(row[0]))
+        self._cache[key] = value
+        self._trim()
+        return value
+
+    def __setitem__(self, key, value):
+        self._cache[key] = value
+        self._cache.move_to_end(key)
+        self._removed.discard(key)
+        self._pending[key] = math.inf
+        self._trim()
+
+    def __delitem__(self, key):
+        if key not in self:
+            raise KeyError(key)
+        self._cache.pop(key, None)
+        self._removed.add(key)
+        self._pending[key] = math.inf
+
+    def mark(self, key, generation):
+        """Vermerkt die Generation, mit der die letzte Änderung von ``key`` geschrieben wird"""
+        if key in self._pending:
+            self._pending[key] = generation
+
+    def _settle(self):
+        """Vergisst geschriebene Änderungen; die Datenbank liefert für diese Schlüssel nun denselben Stand"""
+        if not self._pending:
+            return
+        written = self._written()
+        for key in [key for key, generation in self._pending.items() if generation <= written]:
+            del self._pending[key]
+            self._removed.discard(key)
+
+    def _trim(self):
+        if len(self._cache) <= self._trim_at:
+            return
+        self._settle()
+        excess = len(self._cache) - self.cache_size
+        evict = []
+        for key, value in self._cache.items():
+            if len(evict) >= excess:
+                break
+            if key not in self._pending and not is_hot(self._table, value):
+                evict.append(key)
+        for key in evict:
+            del self._cache[key]
+        # Erst nach weiteren Einträgen erneut prüfen, auch wenn viele offene Vorgänge im Cache bleiben
+        self._trim_at = max(self.cache_size, len(self._cache)) + self.cache_size // 10
+
+    def __contains__(self, key):
+        if key in self._cache or (key not in self._removed and self._stored(key)):
+            return True
+        return self.fallback is not None and key in self.fallback
+
+    def __iter__(self):
+        keys = [row[0] for row in self._conn.execute(f"SELECT key FROM {self._table}")]
+        stored = set(keys)
+        # Beide Listen vorab bilden; während der Iteration kann der Cache Einträge verdrängen
+        keys = [key for key in keys if key not in self._removed] + [key for key in self._cache if key not in stored]
+        yield from keys
+
+    def __len__(self):
+        self._settle()
+        count = self._conn.execute(f"SELECT COUNT(*) FROM {self._table}").fetchone()[0]
+        # Noch nicht geschriebene Änderungen: gelöschte Zeilen abziehen, neue Datensätze hinzuzählen
+        for key in self._pending:
+            stored = self._stored(key)
+            if key in self._removed:
+                count -= stored
+            elif not stored:
+                count += 1
+        return count
+
+    def get_hot(self, key):
+        """Wie ``get``, aber ohne Fallback auf das Archiv"""
+        fallback, self.fallback = self.fallback, None
+        try:
+            return self.get(key)
+        finally:
+            self.fallback = fallback
+
+    def loaded_items(self):
+        """Datensätze, die bereits im Cache liegen (nach ``preload`` mindestens die offenen Vorgänge)"""
+        return self._cache.items()
+
+    def preload(self, condition):
+        """Lädt alle Datensätze, die ``condition`` erfüllen, in den Cache"""
+        rows = self._conn.execute(f"SELECT key, value FROM {self._table} WHERE {condition}")
+        for key, raw in rows:
+            self._cache.setdefault(key, decode_record(self._table, json.loads(raw)))
+
+    def _stored(self, key):
+        return self._conn.execute(f"SELECT 1 FROM {self._table} WHERE key = ?", (key,)).fetchone() is not None
+
+
+class SqliteStore(Storage):
+    """SQLite-Backend (WAL-Modus) mit einer Tabelle je Sammlung.
+
+    Jeder Befehl schreibt nur die Zeilen, die er ändert. Beim Start werden nur
+    offene Vorgänge (``SQLITE_HOT``) vorgeladen; existiert noch keine Datenbank,
+    wird ``import_path`` einmalig importiert. Die JSON-Datei bleibt als Import-/Exportformat erhalten.
+    Gelesen wird über eine eigene Verbindung, geschrieben über ``_writer``.
+    """
+
+    def __init__(self, db_path, import_path=None, activity_log=None, cold_archive=None, history=None):
+        self.db_path = db_path
+        self.import_path = import_path
+        self.files = (db_path, import_path) if import_path else (db_path,)
+        self.activity_log = activity_log
+        self.cold_archive = cold_archive
+        self.history = history
+        self.data = None
+        # Zuletzt in die Datenbank geschriebene Generation (vom Schreib-Thread gesetzt)
+        self.written_generation = 0
+        self._imported_logs = []
+        self._conn = None
+        self._writer = None
+
+    def _connect(self):
+        conn = sqlite3.connect(self.db_path, isolation_level=None, check_same_thread=False)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        for table, columns in SQLITE_TABLES.items():
+            extra = "".join(f", {column}" for column in columns)
+            conn.execute(f"CREATE TABLE IF NOT EXISTS {table} (key TEXT PRIMARY KEY{extra}, value TEXT NOT NULL)")
+            for column in columns:
+                conn.execute(f"CREATE INDEX IF NOT EXISTS idx_{table}_{column} ON {table}({column})")
+        conn.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value)")
+        return conn
+
+    def _view(self):
+        return {
+            table: SqliteCollection(self._conn, table, self.cold_archive.view(table) if self.cold_archive else None,
+                                    written=lambda: self.written_generation)
+            for table in SQLITE_TABLES
+        }
+
+    def load(self):
+        fresh = not os.path.exists(self.db_path)
+        self._writer = self._connect()
+        self._conn = self._connect()
+        self.data = self._view()
+        row = self._conn.execute("SELECT value FROM meta WHERE key = 'generation'").fetchone()
+        self.generation = self.written_generation = row[0] if row else 0
+        if fresh and self.import_path and os.path.exists(self.import_path):
+            imported = format_for_path(self.import_path).load(self.import_path)
+            self.generation = imported.pop("_meta", {}).get("generation", 0)
+            self._imported_logs = imported.pop("logs", [])
+            self._write_all(imported)
+            logger.info(f"{self.import_path} in die SQLite-Datenbank importiert")
+        self.preload()
+        return self.data
+
+    def preload(self):
+        for table, condition in SQLITE_HOT.items():
+            self.data[table].preload(condition)
+
+    def _row(self, collection, key, value):
+        value = encode_record(value)
+        columns = SQLITE_TABLES[collection]
+        return (key, *(value.get(column) for column in columns), json.dumps(value, ensure_ascii=False))
+
+    def _upsert_sql(self, collection):
+        columns = ("key", *SQLITE_TABLES[collection], "value")
+        placeholders = ", ".join("?" for _ in columns)
+        return f"INSERT OR REPLACE INTO {collection} ({', '.join(columns)}) VALUES ({placeholders})"
+
+    def prepare(self, op, collection, key=None, value=None):
+        if op not in ("put", "del"):
+            raise ValueError(f"Unbekannte Operation: {op}")
+        self.generation += 1
+        self._track(collection, key)
+        if op == "put":
+            self.data[collection][key] = value
+            self.data[collection].mark(key, self.generation)
+            return ("sql", self._upsert_sql(collection), self._row(collection, key, value), self.generation)
+        self.data[collection].pop(key, None)
+        self.data[collection].mark(key, self.generation)
+        return ("sql", f"DELETE FROM {collection} WHERE key = ?", (key,), self.generation)
+
+    def migrate_logs(self):
+        logs, self._imported_logs = self._imported_logs, []
+        has_table = self._conn.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'logs'").fetchone()
+        if has_table:
+            logs += [json.loads(raw) for (raw,) in self._conn.execute("SELECT value FROM logs ORDER BY id")]
+        if logs:
+            self.activity_log.migrate(logs)
+        if has_table:
+            self._writer.execute("DROP TABLE logs")
+        return len(logs)
+
+    def snapshot_entry(self):
+        return ("checkpoint", self.generation)
+
+    def replace_entry(self, new_data):
+        new_data.pop("_meta", None)
+        new_data.pop("logs", None)
+        # Die neuen Sichten lesen erst nach ``write_batch`` den neuen Bestand; danach ``preload`` aufrufen
+        self.data = self._view()
+        self.generation += 1
+        if self.changes is not None:
+            self.changes.invalidate()
+        return ("replace", new_data, self.generation)
+
+    def write_batch(self, entries):
+        logs, entries = self._split_logs(entries)
+        if entries:
+            self._write_rows(entries)
+        self._write_logs(logs)
+
+    def _write_rows(self, entries):
+        checkpoint = False
+        self._writer.execute("BEGIN")
+        try:
+            for entry in entries:
+                if entry[0] == "sql":
+                    self._writer.execute(entry[1], entry[2])
+                elif entry[0] == "replace":
+                    self._replace_rows(entry[1])
+                else:
+                    checkpoint = True
+            generation = max(entry[-1] for entry in entries)
+            self._writer.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('generation', ?)", (generation,))
+            self._writer.execute("COMMIT")
+        except Exception:
+            self._writer.execute("ROLLBACK")
+            raise
+        self.written_generation = generation
+        if checkpoint:
+            self._writer.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+
+    def _replace_rows(self, new_data):
+        for collection in SQLITE_TABLES:
+            self._writer.execute(f"DELETE FROM {collection}")
+            self._writer.executemany(
+                self._upsert_sql(collection),
+                (self._row(collection, key, value) for key, value in new_data.get(collection, {}).items())
+            )
+
+    def _write_all(self, new_data):
+        self.write_batch([("replace", new_data, self.generation)])
+
+    def load_durable(self):
+        # Eigene Verbindung, damit das Lesen in einem Worker-Thread laufen kann
+        conn = sqlite3.connect(self.db_path)
+        try:
+            exported = {}
+            for collection in SQLITE_TABLES:
+                rows = conn.execute(f"SELECT key, value FROM {collection}")
+                exported[collection] = {key: json.loads(raw) for key, raw in rows}
+            row = conn.execute("SELECT value FROM meta WHERE key = 'generation'").fetchone()
+            exported["_meta"] = {"generation": row[0] if row else 0}
+        finally:
+            conn.close()
+        return exported
+
+    def close(self):
+        super().close()
+        for conn in (self._conn, self._writer):
+            if conn:
+                conn.close()
+        self._conn = None
+        self._writer = None
+
+
+class PersistenceWorker:
+    """Schreibt vorbereitete Änderungen in einem eigenen Thread (Group Commit).
+
+    Alle Änderungen, die innerhalb von ``window`` Sekunden nach der ersten
+    eintreffen, werden in einem einzigen Schreibvorgang zusammengefasst. Die
+    Befehle blockieren dadurch nie auf Platten-I/O; wer einen dauerhaft
+    gespeicherten Stand braucht, wartet mit ``await durable()`` darauf.
+    Schlägt das Schreiben vorübergehend fehl, wird der Batch wiederholt und
+    ``durable()`` wartet weiter; nur bei anderen Fehlern und beim Beenden
+    erhalten die Wartenden die Ausnahme.
+    """
+
+    def __init__(self, storage, window=0.05):
+        self.storage = storage
+        self.window = window
+        self._cond = threading.Condition()
+        self._entries = []
+        self._submitted = 0
+        self._written = 0
+        self._waiters = []
+        self._closed = False
+        self._thread = threading.Thread(target=self._run, name="persistence", daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def _submit(self, *entries):
+        with self._cond:
+            self._entries.extend(entries)
+            self._submitted += len(entries)
+            self._cond.notify()
+
+    def put(self, collection, key, value):
+        self._submit(*self.storage.prepare_change("put", collection, key, value))
+
+    def delete(self, collection, key):
+        self._submit(*self.storage.prepare_change("del", collection, key))
+
+    def log(self, entry):
+        self._submit(self.storage.prepare_log(entry))
+
+    def needs_compaction(self):
+        return self.storage.needs_compaction()
+
+    def compact(self):
+        self._submit(self.storage.snapshot_entry())
+
+    def replace(self, new_data):
+        """Ersetzt den gesamten Bestand; vor dem Weiterarbeiten auf ``durable()`` warten"""
+        self._submit(*self.storage.prepare_replace(new_data))
+        return self.storage.data
+
+    async def replace_durable(self, new_data):
+        """Wie ``replace``, wartet aber, bis der neue Bestand geschrieben ist, und lädt dann die offenen Vorgänge vor"""
+        data = self.replace(new_data)
+        await self.durable()
+        self.storage.preload()
+        return data
+
+    def durable(self):
+        """Gibt ein Future zurück, das erfüllt ist, sobald alle bisherigen Änderungen geschrieben sind"""
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        with self._cond:
+            if self._written >= self._submitted:
+                future.set_result(None)
+            else:
+                self._waiters.append((self._submitted, loop, future))
+        return future
+
+    def flush(self, timeout=None):
+        """Blockiert, bis alle bisherigen Änderungen geschrieben sind"""
+        with self._cond:
+            target = self._submitted
+            return self._cond.wait_for(lambda: self._written >= target, timeout)
+
+    def close(self):
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+        if self._thread.is_alive():
+            self._thread.join()
+        self.storage.close()
+
+    def _run(self):
+        while True:
+            with self._cond:
+                self._cond.wait_for(lambda: self._entries or self._closed)
+                if self._closed and not self._entries:
+                    return
+            if not self._closed:
+                time.sleep(self.window)
+            with self._cond:
+                batch, self._entries = self._entries, []
+                target = self._written + len(batch)
+            try:
+                self.storage.write_batch(batch)
+            except Exception as e:
+                with self._cond:
+                    if self._closed:
+                        # Beim Beenden nicht endlos wiederholen; Wartende erfahren, dass nichts geschrieben wurde
+                        logger.error(f"Fehler beim Schreiben von {len(batch) + len(self._entries)} Änderungen beim Beenden, "
+                                     f"sie gehen verloren: {e}", exc_info=True)
+                        self._entries = []
+                        self._resolve(self._submitted, e)
+                        return
+                    logger.error(f"Fehler beim Schreiben von {len(batch)} Änderungen, neuer Versuch folgt: {e}", exc_info=True)
+                    self._entries[:0] = batch
+                    # Vorübergehende Fehler (Platte voll, Datenbank gesperrt): Wartende bleiben bis zum
+                    # erfolgreichen Versuch stehen; bei anderen Fehlern würde auch ein neuer Versuch scheitern
+                    if not _transient(e):
+                        self._resolve(target, e)
+                time.sleep(1.0)
+                continue
+            with self._cond:
+                self._written = target
+                self._resolve(target)
+                self._cond.notify_all()
+
+    def _resolve(self, target, error=None):
+        remaining = []
+        for seq, loop, future in self._waiters:
+            if seq > target:
+                remaining.append((seq, loop, future))
+            elif error is None:
+                loop.call_soon_threadsafe(_set_future, future, None)
+            else:
+                loop.call_soon_threadsafe(_set_future, future, error)
+        self._waiters = remaining
+
+
+def _transient(error):
+    return isinstance(error, (OSError, sqlite3.OperationalError))
+
+
+def _set_future(future, error):
+    if future.done():
+        return
+    if error is None:
+        future.set_result(None)
+    else:
+        future.set_exception(error)